@@ -0,0 +1,168 @@
+import argparse
+import glob
+import html
+import json
+import os
+import re
+import sys
+import sysconfig
+
+import numpy as np
+import tiktoken
+
+from src.utils.token_estimator import CARACTERISTICAS, calibrar, extraer_caracteristicas
+"""
+Calibra los coeficientes de `src/utils/token_estimator.py` contra tokenizers reales y mide su error.
+
+Reúne textos reales que suelen estar disponibles sin red, agrupados por idioma o escritura:
+
+- inglés: los temas de ayuda de Python (`pydoc_data.topics`) y la ayuda de GnuPG;
+- español: la documentación de este repositorio y la ayuda de GnuPG;
+- otras lenguas europeas (alemán, francés, italiano, portugués): la ayuda de GnuPG y las traducciones de
+  la base de datos MIME de freedesktop;
+- chino, japonés y coreano: los textos de prueba de `test/cjkencodings` de CPython, la ayuda de GnuPG y
+  las traducciones MIME;
+- cirílico (ruso, ucraniano, búlgaro): la ayuda de GnuPG y las traducciones MIME;
+- código: módulos de la biblioteca estándar y de este repositorio.
+
+Las fuentes que no existen en la máquina se omiten. Cada fuente se divide en muestras de unos 2 KB; las
+muestras pares se usan para calibrar y las impares para medir el error (solo las de al menos
+`TOKENS_MINIMOS_PRUEBA` tokens).
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.calibrate_estimator                      # cl100k_base y o200k_base
+    python -m benchmarks.calibrate_estimator --encodings cl100k_base -o calibracion.json
+"""
+
+TAMANO_MUESTRA = 2000
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_STDLIB = sysconfig.get_paths()["stdlib"]
+AYUDA_GNUPG = "/usr/share/gnupg/help.{}.txt"
+MIME_FREEDESKTOP = "/usr/share/mime/packages/freedesktop.org.xml"
+IDIOMAS_EUROPEOS = ("de", "fr", "it", "pt")
+IDIOMAS_MIME = {"es": ("es",), "eu": IDIOMAS_EUROPEOS, "zh": ("zh_CN", "zh_TW"), "ja": ("ja",), "ko": ("ko",),
+                "ru": ("ru", "uk", "bg")}
+# Las muestras de prueba más cortas no cuentan para el error: en ellas pesa más el redondeo que el modelo.
+TOKENS_MINIMOS_PRUEBA = 100
+
+
+def _leer(ruta):
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return ""
+
+
+def _traducciones_mime(idiomas):
+    contenido = _leer(MIME_FREEDESKTOP)
+    patron = re.compile(r'<comment xml:lang="(?:{})">(.*?)</comment>'.format("|".join(idiomas)))
+    return "\n".join(html.unescape(texto) for texto in patron.findall(contenido))
+
+
+def fuentes():
+    """
+    Devuelve {idioma o escritura: [textos]} con las fuentes disponibles en esta máquina.
+    """
+    from pydoc_data.topics import topics
+
+    cjk = os.path.join(DIRECTORIO_STDLIB, "test", "cjkencodings", "{}-utf8.txt")
+    textos = {
+        "en": ["\n\n".join(topics.values()), _leer(AYUDA_GNUPG.replace(".{}", ""))],
+        "es": [_leer(ruta) for ruta in [os.path.join(RAIZ_REPOSITORIO, "README.md"),
+                                        *sorted(glob.glob(os.path.join(RAIZ_REPOSITORIO, "docs", "*.md")))]]
+              + [_leer(AYUDA_GNUPG.format("es"))],
+        "eu": [_leer(AYUDA_GNUPG.format(idioma)) for idioma in IDIOMAS_EUROPEOS],
+        "zh": [_leer(AYUDA_GNUPG.format("zh_CN")), _leer(AYUDA_GNUPG.format("zh_TW")),
+               _leer(cjk.format("gb18030")), _leer(cjk.format("big5"))],
+        "ja": [_leer(AYUDA_GNUPG.format("ja")), _leer(cjk.format("euc_jp")), _leer(cjk.format("euc_jisx0213"))],
+        "ko": [_leer(cjk.format("euc_kr")), _leer(cjk.format("cp949"))],
+        "ru": [_leer(AYUDA_GNUPG.format("ru"))],
+        "code": [_leer(ruta) for ruta in sorted(glob.glob(os.path.join(DIRECTORIO_STDLIB, "json", "*.py")))
+                 + sorted(glob.glob(os.path.join(DIRECTORIO_STDLIB, "asyncio", "base_*.py")))
+                 + sorted(glob.glob(os.path.join(RAIZ_REPOSITORIO, "calculators", "*.py")))],
+    }
+    for idioma, codigos in IDIOMAS_MIME.items():
+        textos[idioma].append(_traducciones_mime(codigos))
+    return {idioma: [texto for texto in lista if texto.strip()] for idioma, lista in textos.items()}
+
+
+def muestras(texto, tamano=TAMANO_MUESTRA):
+    # Trozos de unos `tamano` bytes, cortados en un salto de línea o un espacio cuando es posible.
+    inicio = 0
+    while inicio < len(texto):
+        ventana = texto[inicio:inicio + tamano]
+        fin = inicio + max(1, tamano * len(ventana) // len(ventana.encode("utf-8")))
+        if fin < len(texto):
+            corte = max(texto.rfind("\n", inicio, fin), texto.rfind(" ", inicio, fin))
+            fin = corte if corte > inicio else fin
+        trozo = texto[inicio:fin]
+        if trozo.strip():
+            yield trozo
+        inicio = fin
+
+
+def _estimacion_por_palabras(texto):
+    # La estimación anterior de los analizadores, para comparar.
+    return len(texto.split()) * 0.75
+
+
+def calibrar_encoding(nombre, por_idioma):
+    encoding = tiktoken.get_encoding(nombre)
+    entrenamiento, conteos = [], []
+    for lista in por_idioma.values():
+        for i, muestra in enumerate(lista):
+            if i % 2 == 0:
+                entrenamiento.append(muestra)
+                conteos.append(len(encoding.encode_ordinary(muestra)))
+    coeficientes = calibrar(entrenamiento, conteos)
+    vector = np.array([coeficientes[nombre] for nombre in CARACTERISTICAS])
+
+    errores = {}
+    for idioma, lista in por_idioma.items():
+        prueba = [muestra for i, muestra in enumerate(lista) if i % 2 == 1
+                  and len(encoding.encode_ordinary(muestra)) >= TOKENS_MINIMOS_PRUEBA]
+        if not prueba:
+            continue
+        reales = np.array([len(encoding.encode_ordinary(muestra)) for muestra in prueba], dtype=np.float64)
+        estimados = np.array([round(float(extraer_caracteristicas(muestra) @ vector)) for muestra in prueba])
+        palabras = np.array([_estimacion_por_palabras(muestra) for muestra in prueba])
+        relativo = np.abs(estimados - reales) / np.maximum(reales, 1)
+        errores[idioma] = {
+            "muestras": len(prueba),
+            "error_medio": float(relativo.mean()),
+            "error_maximo": float(relativo.max()),
+            "error_medio_por_palabras": float((np.abs(palabras - reales) / np.maximum(reales, 1)).mean()),
+        }
+    return coeficientes, errores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.calibrate_estimator")
+    parser.add_argument("--encodings", default="cl100k_base,o200k_base")
+    parser.add_argument("-o", "--salida", help="Escribe coeficientes y errores en este archivo JSON.")
+    args = parser.parse_args(argv)
+
+    por_idioma = {idioma: [muestra for texto in textos for muestra in muestras(texto)]
+                  for idioma, textos in fuentes().items()}
+    por_idioma = {idioma: lista for idioma, lista in por_idioma.items() if lista}
+    print("Muestras: " + ", ".join(f"{idioma}={len(lista)}" for idioma, lista in por_idioma.items()), file=sys.stderr)
+
+    resultado = {}
+    for nombre in args.encodings.split(","):
+        coeficientes, errores = calibrar_encoding(nombre, por_idioma)
+        resultado[nombre] = {"coeficientes": coeficientes, "errores": errores}
+        print(f"{nombre}:")
+        print(f"    {json.dumps(coeficientes)}")
+        for idioma, error in errores.items():
+            print(f"    {idioma:<5} error medio {error['error_medio']:6.1%}  máximo {error['error_maximo']:6.1%}"
+                  f"  (por palabras: {error['error_medio_por_palabras']:6.1%}, {error['muestras']} muestras)")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import argparse
+import os
+import subprocess
+import sys
+"""
+Presupuesto del tiempo de importación de los módulos del paquete.
+
+La CLI y las invocaciones cortas (una función serverless, un script que estima una petición) pagan la
+importación en cada llamada, así que las dependencias pesadas (numpy, pandas, tiktoken, streamlit, plotly,
+transformers...) se importan donde se usan y no al importar los módulos que solo las necesitan a veces.
+
+Cada grupo de `PRESUPUESTOS` se importa en un intérprete nuevo con `python -X importtime` y se suma el tiempo
+acumulado de los módulos que carga (sin los que ya carga el intérprete al arrancar). Se toma el mínimo de
+varias repeticiones para quitar ruido. Un grupo falla si supera su presupuesto o si carga alguno de sus
+módulos prohibidos, que es la comprobación que no depende de la máquina.
+
+Los presupuestos se fijaron en una máquina donde los módulos de `REFERENCIA` (solo biblioteca estándar) tardan
+`REFERENCIA_MS`. Con `--escalar` se miden también en la máquina actual y, si tardan más, los presupuestos crecen en
+la misma proporción; así los tests pueden comprobar los tiempos en máquinas más lentas.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.import_time                      # comprueba los presupuestos
+    python -m benchmarks.import_time --escalar            # ajustados a la velocidad de esta máquina
+    python -m benchmarks.import_time --modulos calculators.batch --detalle 15
+"""
+
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPETICIONES = 5
+# Módulos de la biblioteca estándar que se importan para medir la velocidad de la máquina, y lo que tardan en la
+# máquina en la que se fijaron los presupuestos.
+REFERENCIA = ("argparse", "dataclasses", "decimal", "email.message", "json")
+REFERENCIA_MS = 40
+# {grupo: (módulos que se importan juntos, presupuesto en milisegundos, módulos que no deben cargarse)}
+PRESUPUESTOS = {
+    "calculadoras": (
+        ("calculators.token_costs", "calculators.energy_estimation", "calculators.results"),
+        40,
+        ("numpy", "pandas", "tiktoken", "json"),
+    ),
+    "cli": (
+        ("calculators.cli",),
+        300,
+        ("asyncio", "tiktoken", "pandas", "streamlit", "plotly", "transformers", "qwen_tokenizer", "sqlite3",
+         "multiprocessing", "importlib.metadata"),
+    ),
+    "visualizaciones": (
+        ("src.utils.visualizations",),
+        1000,
+        ("streamlit", "plotly.express"),
+    ),
+}
+
+
+def parsear_importtime(texto):
+    """
+    Lee la salida de `python -X importtime` (en la salida de errores).
+
+    Returns:
+        list[tuple[str, int, int]]: (módulo, profundidad, microsegundos acumulados) de cada línea, en orden.
+    """
+    entradas = []
+    for linea in texto.splitlines():
+        if not linea.startswith("import time:"):
+            continue
+        partes = linea[len("import time:"):].split("|")
+        if len(partes) != 3 or not partes[1].strip().isdigit():
+            continue  # La cabecera ("self [us] | cumulative | imported package").
+        nombre = partes[2].rstrip()
+        profundidad = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        entradas.append((nombre.strip(), profundidad, int(partes[1])))
+    return entradas
+
+
+def _ejecutar_importtime(codigo):
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=RAIZ_REPOSITORIO,
+                             capture_output=True, text=True)
+    if proceso.returncode != 0:
+        raise RuntimeError(f"Falló la importación ({codigo}):\n{proceso.stderr[-2000:]}")
+    return parsear_importtime(proceso.stderr)
+
+
+def medir_importacion(modulos, repeticiones=REPETICIONES):
+    """
+    Importa `modulos` en un intérprete nuevo `repeticiones` veces.
+
+    Returns:
+        tuple[float, list[tuple[str, int, int]]]: (milisegundos de la repetición más rápida, sus entradas de
+        `parsear_importtime` sin los módulos que el intérprete carga al arrancar).
+    """
+    arranque = {nombre for nombre, _, _ in _ejecutar_importtime("pass")}
+    mejor = None
+    for _ in range(max(repeticiones, 1)):
+        entradas = [entrada for entrada in _ejecutar_importtime("import " + ", ".join(modulos))
+                    if entrada[0] not in arranque]
+        # Solo los módulos de primer nivel: su tiempo acumulado ya incluye el de los que importan.
+        microsegundos = sum(acumulado for _, profundidad, acumulado in entradas if profundidad == 0)
+        if mejor is None or microsegundos < mejor[0]:
+            mejor = (microsegundos, entradas)
+    return mejor[0] / 1000, mejor[1]
+
+
+def cargados(entradas, prohibidos):
+    """
+    Devuelve los módulos de `prohibidos` (o sus submódulos) que aparecen en `entradas`.
+    """
+    nombres = {nombre for nombre, _, _ in entradas}
+    return sorted(prohibido for prohibido in prohibidos
+                  if prohibido in nombres or any(nombre.startswith(prohibido + ".") for nombre in nombres))
+
+
+def escala_maquina(repeticiones=REPETICIONES):
+    """
+    Devuelve cuántas veces más lenta es esta máquina que la de referencia al importar `REFERENCIA` (como mínimo 1).
+    """
+    milisegundos, _ = medir_importacion(REFERENCIA, repeticiones)
+    return max(1.0, milisegundos / REFERENCIA_MS)
+
+
+def comprobar(presupuestos=PRESUPUESTOS, repeticiones=REPETICIONES, escalar=False):
+    """
+    Mide cada grupo de `presupuestos`. Con `escalar`, los presupuestos se multiplican por `escala_maquina()`.
+
+    Returns:
+        dict: {grupo: {"milisegundos", "presupuesto_ms", "prohibidos_cargados", "excedido"}}.
+    """
+    escala = escala_maquina(repeticiones) if escalar else 1.0
+    resultados = {}
+    for grupo, (modulos, presupuesto_ms, prohibidos) in presupuestos.items():
+        milisegundos, entradas = medir_importacion(modulos, repeticiones)
+        prohibidos_cargados = cargados(entradas, prohibidos)
+        presupuesto_ms = round(presupuesto_ms * escala, 1)
+        resultados[grupo] = {
+            "milisegundos": round(milisegundos, 1),
+            "presupuesto_ms": presupuesto_ms,
+            "prohibidos_cargados": prohibidos_cargados,
+            "excedido": milisegundos > presupuesto_ms or bool(prohibidos_cargados),
+        }
+    return resultados
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time",
+                                     description="Comprueba el presupuesto de tiempo de importación.")
+    parser.add_argument("--modulos", type=lambda valor: [m for m in valor.split(",") if m],
+                        help="Mide estos módulos (separados por comas) en lugar de los grupos con presupuesto.")
+    parser.add_argument("--detalle", type=int, default=0, metavar="N",
+                        help="Muestra además los N módulos con más tiempo acumulado.")
+    parser.add_argument("--escalar", action="store_true",
+                        help="Ajusta los presupuestos a la velocidad de esta máquina (ver REFERENCIA).")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    return parser
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    if args.modulos:
+        milisegundos, entradas = medir_importacion(args.modulos, args.repeticiones)
+        print(f"{', '.join(args.modulos)}: {milisegundos:.1f} ms")
+        for nombre, profundidad, acumulado in sorted(entradas, key=lambda e: -e[2])[:args.detalle]:
+            print(f"  {acumulado / 1000:9.1f} ms  {'  ' * profundidad}{nombre}")
+        return 0
+    resultados = comprobar(repeticiones=args.repeticiones, escalar=args.escalar)
+    for grupo, resultado in resultados.items():
+        estado = "EXCEDIDO" if resultado["excedido"] else "ok"
+        prohibidos = ", ".join(resultado["prohibidos_cargados"])
+        print(f"{grupo:16} {resultado['milisegundos']:9.1f} ms / {resultado['presupuesto_ms']:6} ms  {estado}"
+              + (f"  (carga {prohibidos})" if prohibidos else ""))
+    return 1 if any(resultado["excedido"] for resultado in resultados.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+
+from benchmarks.corpus import SCRIPTS, dividir_en_registros, generar_texto
+from calculators.cost_engine import calcular_costos_por_fila
+from calculators.energy_estimation import estimar_gasto_energetico, estimar_gasto_energetico_vectorizado
+from calculators.token_costs import calcular_costo_tokens_numerico
+from src.analyzers.registry import ANALIZADORES, funciones_proveedor, precargar_tokenizers
+from src.utils import token_cache
+from calculators.catalog import obtener_catalogo
+from src.utils.tokenizers import contar_tokens
+"""
+Benchmarks de rendimiento de los contadores de tokens y de las calculadoras de costo y energía.
+
+Mide la latencia y el rendimiento (tokens o filas por segundo) de:
+
+- `contar_tokens` y cada `contar_tokens_*` / `contar_tokens_*_batch` de `src/analyzers/`, con textos de
+  100 B a 100 MB en inglés, español, chino y código (`benchmarks/corpus.py`);
+- `calcular_costo_tokens_numerico`, `calcular_costos_por_fila`, `estimar_gasto_energetico` y su versión
+  vectorizada, con 1 a 1.000.000 de filas.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.run_benchmarks                      # perfil rápido, compara con la referencia
+    python -m benchmarks.run_benchmarks --perfil completo    # incluye 100 MB y 1.000.000 de filas
+    python -m benchmarks.run_benchmarks --casos openai,google --scripts zh
+    python -m benchmarks.run_benchmarks --guardar-referencia # actualiza benchmarks/baselines.json
+
+Si algún caso rinde más de `--umbral` por debajo de la referencia, el comando termina con código 1.
+Las referencias dependen de la máquina y de las librerías instaladas (un analizador sin `transformers`
+mide su estimación por clases de caracteres, `src.utils.token_estimator`): se guardan con el entorno en que
+se midieron y se avisa si no coincide. Hay que volver a guardarlas cuando cambia lo que mide un caso.
+La caché persistente de conteos se desactiva durante las mediciones.
+"""
+
+RUTA_REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+UMBRAL_REGRESION = 0.25
+REPETICIONES = 5
+# Segundos mínimos de cada repetición: las llamadas rápidas se repiten hasta llenarlos.
+TIEMPO_MINIMO_REPETICION = 0.05
+# Si la primera llamada tarda más que esto, se mide una sola repetición más.
+TIEMPO_LLAMADA_LARGA = 2.0
+MODELO_CONTAR_TOKENS = "gpt-4o"
+PERFILES = {
+    "rapido": {"tamanos": (100, 10_000, 1_000_000), "filas": (1, 1_000, 100_000)},
+    "completo": {"tamanos": (100, 10_000, 1_000_000, 100_000_000), "filas": (1, 1_000, 100_000, 1_000_000)},
+}
+UNIDADES_TAMANO = {"B": 1, "KB": 1_000, "MB": 1_000_000}
+PAQUETES_ENTORNO = ("tiktoken", "transformers", "qwen-tokenizer", "numpy")
+
+
+@dataclass(frozen=True, slots=True)
+class Caso:
+    """
+    Una función medida. `funcion(entrada)` devuelve las unidades procesadas (tokens o filas).
+    `entrada` es "texto", "registros" (lista de textos) o "filas" (arreglos de modelo y tokens).
+    """
+    nombre: str
+    entrada: str
+    funcion: object
+
+
+def parsear_tamano(valor):
+    """
+    Convierte "100B", "10KB", "1MB" o "100" (bytes) en un número de bytes.
+    """
+    valor = valor.strip().upper()
+    for unidad in sorted(UNIDADES_TAMANO, key=len, reverse=True):
+        if valor.endswith(unidad):
+            return int(float(valor[:-len(unidad)]) * UNIDADES_TAMANO[unidad])
+    return int(valor)
+
+
+def formatear_tamano(tamano):
+    for unidad in ("MB", "KB"):
+        if tamano >= UNIDADES_TAMANO[unidad] and tamano % UNIDADES_TAMANO[unidad] == 0:
+            return f"{tamano // UNIDADES_TAMANO[unidad]}{unidad}"
+    return f"{tamano}B"
+
+
+def _modelo_de_proveedor(catalogo, proveedor):
+    # Primer modelo del catálogo que usa el analizador del proveedor.
+    for modelo in catalogo.modelos:
+        tokenizer = catalogo.tokenizer(modelo)
+        if tokenizer is not None and tokenizer.proveedor == proveedor:
+            return tokenizer.modelo_tokenizer
+    return None
+
+
+def casos_conteo(catalogo):
+    casos = [Caso(f"contar_tokens[{MODELO_CONTAR_TOKENS}]", "texto",
+                  lambda texto: contar_tokens(texto, MODELO_CONTAR_TOKENS))]
+    for proveedor, (_, nombre_contar, nombre_batch, _) in ANALIZADORES.items():
+        modelo = _modelo_de_proveedor(catalogo, proveedor)
+        if modelo is None:
+            continue
+        contar, contar_batch, recibe_modelo, _ = funciones_proveedor(proveedor)
+        argumentos = (modelo,) if recibe_modelo else ()
+        casos.append(Caso(f"{nombre_contar}[{modelo}]", "texto",
+                          lambda texto, contar=contar, argumentos=argumentos: contar(texto, *argumentos)))
+        casos.append(Caso(f"{nombre_batch}[{modelo}]", "registros",
+                          lambda textos, contar_batch=contar_batch, argumentos=argumentos:
+                          int(contar_batch(textos, *argumentos).sum())))
+    return casos
+
+
+def casos_calculo(catalogo):
+    precios = catalogo.precios
+    matriz = catalogo.matriz_precios
+    indice = catalogo.indice_energia
+
+    def costo_por_fila(filas):
+        modelos, entrada, salida = filas
+        for modelo, tokens_entrada, tokens_salida in zip(modelos, entrada, salida):
+            calcular_costo_tokens_numerico(tokens_entrada, tokens_salida, modelo, precios)
+        return len(modelos)
+
+    def costo_vectorizado(filas):
+        modelos, entrada, salida = filas
+        return len(calcular_costos_por_fila(entrada, salida, modelos, matriz).costo_total)
+
+    def energia_por_fila(filas):
+        modelos, entrada, salida = filas
+        for modelo, tokens_entrada, tokens_salida in zip(modelos, entrada, salida):
+            estimar_gasto_energetico(modelo, tokens_entrada + tokens_salida, indice)
+        return len(modelos)
+
+    def energia_vectorizada(filas):
+        modelos, entrada, salida = filas
+        electricidad, _ = estimar_gasto_energetico_vectorizado(modelos, [a + b for a, b in zip(entrada, salida)], indice)
+        return len(electricidad)
+
+    return [
+        Caso("calcular_costo_tokens_numerico", "filas", costo_por_fila),
+        Caso("calcular_costos_por_fila", "filas", costo_vectorizado),
+        Caso("estimar_gasto_energetico", "filas", energia_por_fila),
+        Caso("estimar_gasto_energetico_vectorizado", "filas", energia_vectorizada),
+    ]
+
+
+def generar_filas(catalogo, cantidad, semilla=0):
+    # Filas sintéticas (modelo, tokens de entrada, tokens de salida) repartidas entre los modelos del catálogo.
+    aleatorio = random.Random(semilla)
+    modelos = [aleatorio.choice(catalogo.modelos) for _ in range(cantidad)]
+    entrada = [aleatorio.randint(10, 8000) for _ in range(cantidad)]
+    salida = [aleatorio.randint(10, 2000) for _ in range(cantidad)]
+    return modelos, entrada, salida
+
+
+def medir(funcion, entrada, repeticiones=REPETICIONES, tiempo_minimo=TIEMPO_MINIMO_REPETICION):
+    """
+    Mide `funcion(entrada)`. La primera llamada sirve de calentamiento y para calibrar cuántas llamadas
+    hacen falta por repetición.
+
+    Returns:
+        dict: unidades, latencia mediana y mínima por llamada (s), unidades por segundo (con la latencia
+        mínima, la menos afectada por el ruido) y número de llamadas medidas.
+    """
+    inicio = time.perf_counter()
+    unidades = funcion(entrada)
+    primera = time.perf_counter() - inicio
+    if primera >= TIEMPO_LLAMADA_LARGA:
+        repeticiones = 1
+    llamadas = max(1, int(tiempo_minimo / max(primera, 1e-9)))
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            funcion(entrada)
+        latencias.append((time.perf_counter() - inicio) / llamadas)
+    minima = min(latencias)
+    return {
+        "unidades": unidades,
+        "latencia_mediana_s": statistics.median(latencias),
+        "latencia_min_s": minima,
+        "unidades_por_segundo": unidades / minima if minima else 0.0,
+        "llamadas": llamadas * repeticiones,
+    }
+
+
+def _coincide(caso, filtros):
+    return not filtros or any(filtro in caso.nombre for filtro in filtros)
+
+
+def ejecutar(tamanos, filas, scripts=SCRIPTS, filtros=(), repeticiones=REPETICIONES, progreso=None):
+    """
+    Ejecuta los benchmarks seleccionados.
+
+    Args:
+        tamanos (iterable[int]): Tamaños de texto en bytes.
+        filas (iterable[int]): Número de filas para las calculadoras.
+        scripts (iterable[str], opcional): Sistemas de escritura de `benchmarks.corpus.SCRIPTS`.
+        filtros (iterable[str], opcional): Solo los casos cuyo nombre contiene alguno de estos textos.
+        repeticiones (int, opcional): Repeticiones de cada medida.
+        progreso (file, opcional): Si se indica, se escribe una línea por caso medido.
+
+    Returns:
+        dict: {id del caso: medida}, con ids "funcion|script|tamaño" o "funcion|filas|cantidad".
+    """
+    token_cache.desactivar_cache_tokens()
+    os.environ.pop(token_cache.VARIABLE_RUTA_CACHE, None)
+    catalogo = obtener_catalogo()
+    precargar_tokenizers(catalogo)
+
+    resultados = {}
+
+    def registrar(identificador, medida):
+        resultados[identificador] = medida
+        if progreso is not None:
+            progreso.write(f"{identificador}: {medida['unidades_por_segundo']:,.0f}/s\n")
+            progreso.flush()
+
+    conteo = [caso for caso in casos_conteo(catalogo) if _coincide(caso, filtros)]
+    for script in scripts:
+        for tamano in tamanos:
+            if not conteo:
+                break
+            texto = generar_texto(script, tamano)
+            registros = dividir_en_registros(texto)
+            bytes_texto = len(texto.encode("utf-8"))
+            for caso in conteo:
+                medida = medir(caso.funcion, texto if caso.entrada == "texto" else registros, repeticiones)
+                medida["bytes"] = bytes_texto
+                medida["mb_por_segundo"] = bytes_texto / 1e6 / medida["latencia_min_s"] if medida["latencia_min_s"] else 0.0
+                registrar(f"{caso.nombre}|{script}|{formatear_tamano(tamano)}", medida)
+            del texto, registros
+
+    calculo = [caso for caso in casos_calculo(catalogo) if _coincide(caso, filtros)]
+    for cantidad in filas if calculo else ():
+        datos = generar_filas(catalogo, cantidad)
+        for caso in calculo:
+            registrar(f"{caso.nombre}|filas|{cantidad}", medir(caso.funcion, datos, repeticiones))
+    return resultados
+
+
+def entorno():
+    """
+    Describe la máquina y las versiones de las librerías que determinan los resultados.
+    """
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "paquetes": {paquete: token_cache.version_paquete(paquete) for paquete in PAQUETES_ENTORNO},
+    }
+
+
+def comparar(resultados, referencia, umbral=UMBRAL_REGRESION):
+    """
+    Compara cada caso con la referencia.
+
+    Returns:
+        list[dict]: Para cada caso presente en ambos: id, unidades por segundo actuales y de referencia,
+        cociente (actual / referencia) y si es una regresión (cociente < 1 - umbral).
+    """
+    comparacion = []
+    for identificador, medida in resultados.items():
+        base = referencia.get(identificador)
+        if not base or not base.get("unidades_por_segundo"):
+            continue
+        cociente = medida["unidades_por_segundo"] / base["unidades_por_segundo"]
+        comparacion.append({
+            "caso": identificador,
+            "actual": medida["unidades_por_segundo"],
+            "referencia": base["unidades_por_segundo"],
+            "cociente": cociente,
+            "regresion": cociente < 1 - umbral,
+        })
+    return comparacion
+
+
+def cargar_referencia(ruta=RUTA_REFERENCIA):
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_referencia(resultados, ruta=RUTA_REFERENCIA):
+    # Se conservan los casos de la referencia anterior que no se han vuelto a medir.
+    anterior = cargar_referencia(ruta) or {}
+    casos = dict(anterior.get("resultados", {}))
+    casos.update(resultados)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"entorno": entorno(), "resultados": dict(sorted(casos.items()))}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def _imprimir_tabla(resultados, comparacion, salida):
+    cocientes = {fila["caso"]: fila for fila in comparacion}
+    salida.write(f"{'caso':<64} {'latencia':>12} {'unidades/s':>15} {'MB/s':>9} {'vs ref.':>8}\n")
+    for identificador, medida in resultados.items():
+        mb = f"{medida['mb_por_segundo']:.2f}" if "mb_por_segundo" in medida else "-"
+        fila = cocientes.get(identificador)
+        relativo = "-" if fila is None else f"{fila['cociente']:.2f}x" + (" !" if fila["regresion"] else "")
+        salida.write(
+            f"{identificador:<64} {medida['latencia_mediana_s'] * 1e3:>10.3f}ms "
+            f"{medida['unidades_por_segundo']:>15,.0f} {mb:>9} {relativo:>8}\n"
+        )
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_benchmarks",
+                                     description="Benchmarks de los contadores de tokens y las calculadoras.")
+    parser.add_argument("--perfil", choices=PERFILES, default="rapido")
+    parser.add_argument("--tamanos", help="Tamaños de texto separados por comas (ej. 100B,10KB,1MB,100MB).")
+    parser.add_argument("--filas", help="Filas para las calculadoras, separadas por comas (ej. 1,1000).")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help=f"Entre {', '.join(SCRIPTS)}.")
+    parser.add_argument("--casos", default="", help="Solo los casos cuyo nombre contiene alguno de estos textos.")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--referencia", default=RUTA_REFERENCIA, help="Archivo JSON con los resultados de referencia.")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_REGRESION,
+                        help="Caída máxima de rendimiento tolerada respecto a la referencia (0.25 = 25%%).")
+    parser.add_argument("--guardar-referencia", action="store_true",
+                        help="Guarda los resultados como nueva referencia en lugar de compararlos.")
+    parser.add_argument("-o", "--salida", help="Escribe los resultados y la comparación en este archivo JSON.")
+    return parser
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    perfil = PERFILES[args.perfil]
+    tamanos = [parsear_tamano(valor) for valor in args.tamanos.split(",")] if args.tamanos else perfil["tamanos"]
+    filas = [int(valor) for valor in args.filas.split(",")] if args.filas else perfil["filas"]
+    scripts = [script for script in args.scripts.split(",") if script]
+    filtros = [filtro for filtro in args.casos.split(",") if filtro]
+
+    resultados = ejecutar(tamanos, filas, scripts, filtros, args.repeticiones, progreso=sys.stderr)
+    if args.guardar_referencia:
+        guardar_referencia(resultados, args.referencia)
+        _imprimir_tabla(resultados, [], sys.stdout)
+        print(f"Referencia guardada en {args.referencia}", file=sys.stderr)
+        return 0
+
+    referencia = cargar_referencia(args.referencia)
+    comparacion = []
+    if referencia is None:
+        print(f"Advertencia: No hay referencia en {args.referencia}; no se comprueban regresiones.", file=sys.stderr)
+    else:
+        if referencia.get("entorno") != entorno():
+            print("Advertencia: La referencia se midió en otro entorno; las diferencias pueden no ser regresiones.",
+                  file=sys.stderr)
+        comparacion = comparar(resultados, referencia.get("resultados", {}), args.umbral)
+    _imprimir_tabla(resultados, comparacion, sys.stdout)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"entorno": entorno(), "resultados": resultados, "comparacion": comparacion},
+                      f, ensure_ascii=False, indent=2)
+    regresiones = [fila for fila in comparacion if fila["regresion"]]
+    for fila in regresiones:
+        print(f"Regresión: {fila['caso']} rinde {fila['cociente']:.2f}x la referencia", file=sys.stderr)
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,419 @@
+import csv
+import json
+import sys
+
+import numpy as np
+
+from calculators import columnar
+from calculators.energy_estimation import INTENSIDAD_CARBONO_PROMEDIO, estimar_gasto_energetico
+from calculators.parallel import EstadisticasTrabajadores, mapear_en_procesos
+from calculators.results import ResultadoModelo, columnas_resultados
+from calculators.token_costs import calcular_costo_tokens_numerico
+from src.analyzers.registry import (ConteoDeduplicado, contar_tokens_modelo_archivo, contar_tokens_modelo_batch,
+                                    precargar_encodings)
+from calculators.catalog import obtener_catalogo
+from src.utils.metrics import METRICAS, activar_metricas, extraer_instantanea, medir, metricas_activas
+from src.utils.tokenizers import iterar_bloques
+"""
+Procesamiento por lotes de registros de uso (prompt / respuesta / modelo) leídos de JSONL, CSV, Parquet o Arrow.
+
+Todo el recorrido es una cadena de generadores: los registros se leen de uno en uno, se agrupan en
+bloques de `TAMANO_BLOQUE` filas para contar los tokens con las funciones por lotes de cada
+analizador, y cada fila enriquecida se escribe en cuanto está lista. La memoria usada depende del
+tamaño del bloque, no del tamaño del archivo. Los formatos columnares se leen y escriben con
+`calculators.columnar`.
+"""
+
+TAMANO_BLOQUE = 1000
+COLUMNA_REGISTRO_MODELO = "modelo"
+COLUMNA_REGISTRO_ENTRADA = "prompt"
+COLUMNA_REGISTRO_SALIDA = "respuesta"
+COLUMNA_REGISTRO_SISTEMA = "sistema"
+FORMATOS = ("jsonl", "csv") + columnar.FORMATOS_COLUMNARES
+
+
+def detectar_formato(ruta, formato=None):
+    """
+    Devuelve el formato indicado o, si es None, el que corresponde a la extensión de `ruta` ("jsonl" por defecto).
+    """
+    if formato:
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido: {formato}. Usa uno de {FORMATOS}")
+        return formato
+    if str(ruta).lower().endswith(".csv"):
+        return "csv"
+    return columnar.formato_por_extension(ruta) or "jsonl"
+
+
+def leer_jsonl(archivo):
+    for numero, linea in enumerate(archivo, start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        registro = json.loads(linea)
+        if not isinstance(registro, dict):
+            raise ValueError(f"Línea {numero}: se esperaba un objeto JSON")
+        yield registro
+
+
+def leer_csv(archivo):
+    yield from csv.DictReader(archivo)
+
+
+def leer_registros(archivo, formato):
+    return leer_csv(archivo) if formato == "csv" else leer_jsonl(archivo)
+
+
+class TotalesAcumulados:
+    """
+    Totales de todas las filas procesadas hasta el momento, en total y por modelo.
+    """
+    __slots__ = ("filas", "filas_sin_precio", "tokens_entrada", "tokens_salida", "costo_total",
+                 "electricidad_kwh", "agua_litros", "co2_kg", "por_modelo", "moneda", "deduplicacion",
+                 "tokens_prefijo", "costo_prefijo")
+
+    def __init__(self, moneda="USD"):
+        self.moneda = moneda
+        self.filas = 0
+        self.filas_sin_precio = 0
+        self.tokens_entrada = 0
+        self.tokens_salida = 0
+        self.costo_total = 0.0
+        self.electricidad_kwh = 0.0
+        self.agua_litros = 0.0
+        self.co2_kg = 0.0
+        self.tokens_prefijo = 0
+        self.costo_prefijo = 0.0
+        self.por_modelo = {}
+        # ConteoDeduplicado del recorrido, si lo hay, para informar de su ratio junto a los totales.
+        self.deduplicacion = None
+
+    def agregar(self, resultado):
+        self.filas += 1
+        self.tokens_entrada += resultado.tokens_entrada
+        self.tokens_salida += resultado.tokens_salida
+        self.costo_total += resultado.costo_total
+        self.electricidad_kwh += resultado.electricidad_kwh
+        self.agua_litros += resultado.agua_litros
+        self.co2_kg += resultado.co2_kg
+        self.tokens_prefijo += resultado.tokens_prefijo
+        self.costo_prefijo += resultado.costo_prefijo
+        modelo = self.por_modelo.setdefault(resultado.modelo, {"filas": 0, "costo_total": 0.0, "costo_prefijo": 0.0})
+        modelo["filas"] += 1
+        modelo["costo_total"] += resultado.costo_total
+        modelo["costo_prefijo"] += resultado.costo_prefijo
+
+    def agregar_sin_precio(self):
+        self.filas += 1
+        self.filas_sin_precio += 1
+
+    def a_dict(self):
+        datos = {
+            "filas": self.filas,
+            "filas_sin_precio": self.filas_sin_precio,
+            "tokens_entrada": self.tokens_entrada,
+            "tokens_salida": self.tokens_salida,
+            f"costo_total_{self.moneda}": self.costo_total,
+            "electricidad_kwh": self.electricidad_kwh,
+            "agua_litros": self.agua_litros,
+            "co2_kg": self.co2_kg,
+            "por_modelo": self.por_modelo,
+        }
+        if self.deduplicacion is not None:
+            datos["deduplicacion"] = self.deduplicacion.a_dict()
+        if self.deduplicacion is not None or self.tokens_prefijo:
+            # Cuánto del gasto es el prompt de sistema o el prefijo que se repite entre peticiones.
+            datos["prefijo_repetido"] = {
+                "tokens": self.tokens_prefijo,
+                f"costo_{self.moneda}": self.costo_prefijo,
+                "fraccion_costo": self.costo_prefijo / self.costo_total if self.costo_total else 0.0,
+            }
+        return datos
+
+
+def _texto(valor):
+    return valor if isinstance(valor, str) else ("" if valor is None else str(valor))
+
+
+def _agrupar_por_modelo(modelos):
+    # {modelo: posiciones de sus filas en el bloque}, en orden de primera aparición.
+    filas_por_modelo = {}
+    for i, modelo in enumerate(modelos):
+        filas_por_modelo.setdefault(modelo, []).append(i)
+    return filas_por_modelo
+
+
+def _contar_archivos(registros, filas_por_modelo, columna, catalogo, num_hilos=None):
+    # Como `_contar_bloque`, pero `columna` tiene rutas de archivos; una celda vacía cuenta 0 tokens.
+    conteos = [None] * len(registros)
+    for modelo, filas in filas_por_modelo.items():
+        if catalogo.tokenizer(modelo) is None:
+            continue
+        for i in filas:
+            ruta = _texto(registros[i].get(columna))
+            conteos[i] = contar_tokens_modelo_archivo(ruta, modelo, catalogo, num_hilos) if ruta else 0
+    return conteos
+
+
+def _contar_bloque(registros, filas_por_modelo, columna, catalogo, num_hilos=None, textos_en_archivos=False,
+                   deduplicacion=None):
+    # Cuenta los textos de `columna` con una llamada por lotes por modelo. None para modelos sin tokenizer.
+    # Devuelve (conteos, tokens del prefijo repetido de cada texto); sin `deduplicacion` los prefijos son 0.
+    prefijos = [0] * len(registros)
+    if textos_en_archivos:
+        return _contar_archivos(registros, filas_por_modelo, columna, catalogo, num_hilos), prefijos
+    conteos = [None] * len(registros)
+    for modelo, filas in filas_por_modelo.items():
+        textos = [_texto(registros[i].get(columna)) for i in filas]
+        if deduplicacion is not None:
+            resultado = deduplicacion.contar_con_prefijos(textos, modelo, catalogo, num_hilos, columna)
+        else:
+            resultado = contar_tokens_modelo_batch(textos, modelo, catalogo, num_hilos)
+            resultado = None if resultado is None else (resultado, np.zeros(len(textos), dtype=np.int64))
+        if resultado is None:
+            continue
+        for i, conteo, prefijo in zip(filas, resultado[0].tolist(), resultado[1].tolist()):
+            conteos[i] = conteo
+            prefijos[i] = prefijo
+    return conteos, prefijos
+
+
+def enriquecer_bloque(bloque, columna_modelo=COLUMNA_REGISTRO_MODELO, columna_entrada=COLUMNA_REGISTRO_ENTRADA,
+                      columna_salida=COLUMNA_REGISTRO_SALIDA, modelo_por_defecto=None, moneda="USD", num_hilos=None,
+                      textos_en_archivos=False, deduplicacion=None, columna_sistema=COLUMNA_REGISTRO_SISTEMA):
+    """
+    Enriquece un bloque de registros. Devuelve una lista de (fila, ResultadoModelo o None), en el orden del bloque.
+    Las filas con un modelo que no está en el catálogo llevan los valores numéricos en None.
+    Con `textos_en_archivos`, las columnas de entrada y salida tienen rutas de archivos de texto UTF-8 cuyo
+    contenido se cuenta por memory map (ver `src.analyzers.registry.contar_tokens_modelo_archivo`); las rutas
+    relativas se resuelven desde el directorio de trabajo.
+    Con un `deduplicacion` (ConteoDeduplicado), los textos repetidos y los prefijos compartidos se tokenizan una
+    sola vez por tokenizer, también entre bloques.
+
+    Si los registros tienen `columna_sistema`, su texto es el prompt de sistema: se cuenta aparte (como un
+    mensaje más) y se suma a los tokens de entrada. El ResultadoModelo de cada fila lleva en `tokens_prefijo` y
+    `costo_prefijo` los tokens del prompt de sistema más los del prefijo del prompt que se repite entre
+    peticiones (según `deduplicacion`), y su costo con la tarifa de entrada.
+    """
+    # Se consulta el catálogo en cada bloque para que los cambios de precios se apliquen sin reiniciar.
+    catalogo = obtener_catalogo()
+    columnas = columnas_resultados(moneda)
+    omitidas = {columna_modelo, columna_entrada, columna_salida, columna_sistema}
+    modelos = [_texto(registro.get(columna_modelo) or modelo_por_defecto) for registro in bloque]
+    filas_por_modelo = _agrupar_por_modelo(modelos)
+    tokens_entrada, tokens_prefijo = _contar_bloque(bloque, filas_por_modelo, columna_entrada, catalogo, num_hilos,
+                                                    textos_en_archivos, deduplicacion)
+    tokens_salida, _ = _contar_bloque(bloque, filas_por_modelo, columna_salida, catalogo, num_hilos, textos_en_archivos,
+                                      deduplicacion)
+    if columna_sistema and any(registro.get(columna_sistema) for registro in bloque):
+        tokens_sistema, _ = _contar_bloque(bloque, filas_por_modelo, columna_sistema, catalogo, num_hilos,
+                                           textos_en_archivos, deduplicacion)
+        for i, sistema in enumerate(tokens_sistema):
+            if sistema and tokens_entrada[i] is not None:
+                tokens_entrada[i] += sistema
+                tokens_prefijo[i] += sistema
+
+    # Precio y energía se calculan por modelo para que la instrumentación los mida por separado.
+    resultados = [None] * len(bloque)
+    for modelo, filas in filas_por_modelo.items():
+        costos = {}
+        with medir("precio", unidades=len(filas), modelo=modelo):
+            for i in filas:
+                if tokens_entrada[i] is not None and tokens_salida[i] is not None:
+                    costos[i] = calcular_costo_tokens_numerico(tokens_entrada[i], tokens_salida[i], modelo, catalogo.precios)
+        with medir("energia", unidades=len(filas), modelo=modelo):
+            for i, costo in costos.items():
+                if costo is None:
+                    continue
+                electricidad, agua = estimar_gasto_energetico(modelo, tokens_entrada[i] + tokens_salida[i],
+                                                              catalogo.indice_energia)
+                costo_prefijo = 0.0
+                if tokens_prefijo[i]:
+                    costo_prefijo = calcular_costo_tokens_numerico(tokens_prefijo[i], 0, modelo, catalogo.precios).costo_entrada
+                resultados[i] = ResultadoModelo(
+                    modelo, tokens_entrada[i], tokens_salida[i], costo.costo_entrada, costo.costo_salida,
+                    costo.costo_total, electricidad, agua, electricidad * INTENSIDAD_CARBONO_PROMEDIO, moneda,
+                    tokens_prefijo[i], costo_prefijo,
+                )
+
+    enriquecidas = []
+    for registro, modelo, resultado in zip(bloque, modelos, resultados):
+        fila = {campo: valor for campo, valor in registro.items() if campo not in omitidas}
+        if resultado is None:
+            fila.update(dict.fromkeys(columnas))
+            fila[columnas[0]] = modelo
+        else:
+            fila.update(resultado.a_fila())
+        enriquecidas.append((fila, resultado))
+    return enriquecidas
+
+
+# Memoria de deduplicación de cada proceso trabajador; se conserva entre los bloques que procesa.
+_DEDUPLICACION_TRABAJADOR = None
+
+
+def _enriquecer_bloque_en_trabajador(tarea):
+    # Punto de entrada de los procesos trabajadores: tiktoken usa un solo hilo, el paralelismo son los procesos.
+    # Las métricas y las cifras de deduplicación del bloque se devuelven con el resultado para sumarlas en el
+    # proceso principal.
+    global _DEDUPLICACION_TRABAJADOR
+    bloque, opciones, con_metricas, deduplicar = tarea
+    if con_metricas:
+        activar_metricas()
+    if not deduplicar:
+        return enriquecer_bloque(bloque, num_hilos=1, **opciones), extraer_instantanea(), None
+    if _DEDUPLICACION_TRABAJADOR is None:
+        _DEDUPLICACION_TRABAJADOR = ConteoDeduplicado()
+    deduplicacion = _DEDUPLICACION_TRABAJADOR
+    antes = deduplicacion.cifras()
+    enriquecidas = enriquecer_bloque(bloque, num_hilos=1, deduplicacion=deduplicacion, **opciones)
+    return enriquecidas, extraer_instantanea(), tuple(b - a for a, b in zip(antes, deduplicacion.cifras()))
+
+
+def _precargar_catalogo():
+    # Solo las codificaciones de tiktoken: cargar todos los tokenizers de Hugging Face del catálogo haría que el
+    # arranque dependiera del tamaño del catálogo aunque la entrada solo use modelos de OpenAI.
+    precargar_encodings(obtener_catalogo())
+
+
+def _bloques_en_procesos(bloques, opciones, trabajadores, estadisticas, deduplicacion=None):
+    con_metricas = metricas_activas()
+    tareas = ((bloque, opciones, con_metricas, deduplicacion is not None) for bloque in bloques)
+    resultados = mapear_en_procesos(_enriquecer_bloque_en_trabajador, tareas, trabajadores, precargar=_precargar_catalogo)
+    for pid, segundos, (enriquecidas, instantanea, cifras) in resultados:
+        if instantanea is not None:
+            METRICAS.combinar(instantanea)
+        if cifras is not None:
+            deduplicacion.registrar(*cifras)
+        if estadisticas is not None:
+            tokens = sum(resultado.total_tokens for _, resultado in enriquecidas if resultado is not None)
+            estadisticas.registrar(pid, segundos, len(enriquecidas), tokens)
+        yield enriquecidas
+
+
+def procesar_registros(registros, columna_modelo=COLUMNA_REGISTRO_MODELO, columna_entrada=COLUMNA_REGISTRO_ENTRADA,
+                       columna_salida=COLUMNA_REGISTRO_SALIDA, modelo_por_defecto=None, moneda="USD",
+                       tamano_bloque=TAMANO_BLOQUE, totales=None, trabajadores=1, estadisticas_trabajadores=None,
+                       textos_en_archivos=False, deduplicar=True, columna_sistema=COLUMNA_REGISTRO_SISTEMA):
+    """
+    Enriquece cada registro con tokens, costos, electricidad, agua y CO2.
+
+    Args:
+        registros (iterable[dict]): Registros de uso (p. ej. de `leer_registros`).
+        columna_modelo, columna_entrada, columna_salida (str, opcional): Campos con el modelo, el prompt y la respuesta.
+        columna_sistema (str, opcional): Campo con el prompt de sistema, que se suma a la entrada y se informa
+            aparte en los totales (ver `enriquecer_bloque`). Los registros sin él no tienen prompt de sistema.
+        modelo_por_defecto (str, opcional): Modelo para los registros que no tienen `columna_modelo`.
+        moneda (str, opcional): Moneda de las columnas de costo.
+        tamano_bloque (int, opcional): Filas que se tokenizan juntas.
+        totales (TotalesAcumulados, opcional): Se actualiza con cada fila procesada.
+        trabajadores (int, opcional): Procesos para tokenizar. Con más de 1, los bloques se reparten en un pool
+            de procesos (ver `calculators.parallel`) y el orden de salida se conserva.
+        estadisticas_trabajadores (EstadisticasTrabajadores, opcional): Rendimiento de cada proceso.
+        textos_en_archivos (bool, opcional): Las columnas de entrada y salida tienen rutas de archivos cuyo
+            contenido se cuenta sin cargarlo en memoria (ver `enriquecer_bloque`).
+        deduplicar (bool, opcional): Tokeniza cada texto distinto y cada prefijo compartido una sola vez por
+            tokenizer en todo el recorrido (ver `src.analyzers.registry.ConteoDeduplicado`; con varios procesos, una
+            vez por proceso). Si se pasan `totales`, su `a_dict()` incluye el ratio de deduplicación y el gasto en
+            el prefijo repetido.
+
+    Yields:
+        dict: Los campos del registro (salvo modelo, prompt y respuesta) más las columnas de `columnas_resultados`.
+        Las filas con un modelo que no está en el catálogo llevan los valores numéricos en None.
+    """
+    opciones = {
+        "columna_modelo": columna_modelo, "columna_entrada": columna_entrada, "columna_salida": columna_salida,
+        "modelo_por_defecto": modelo_por_defecto, "moneda": moneda, "textos_en_archivos": textos_en_archivos,
+        "columna_sistema": columna_sistema,
+    }
+    # Con textos en archivos las celdas son rutas: no hay textos repetidos que ahorrar.
+    deduplicacion = ConteoDeduplicado() if deduplicar and not textos_en_archivos else None
+    if totales is not None:
+        totales.deduplicacion = deduplicacion
+    bloques = iterar_bloques(registros, tamano_bloque)
+    if trabajadores > 1:
+        bloques_enriquecidos = _bloques_en_procesos(bloques, opciones, trabajadores, estadisticas_trabajadores,
+                                                    deduplicacion)
+    else:
+        bloques_enriquecidos = (enriquecer_bloque(bloque, deduplicacion=deduplicacion, **opciones) for bloque in bloques)
+
+    for enriquecidas in bloques_enriquecidos:
+        for fila, resultado in enriquecidas:
+            if totales is not None:
+                if resultado is None:
+                    totales.agregar_sin_precio()
+                else:
+                    totales.agregar(resultado)
+            yield fila
+
+
+def escribir_jsonl(filas, archivo):
+    # default=str para los valores que no son JSON, como las fechas de los registros Parquet.
+    for fila in filas:
+        archivo.write(json.dumps(fila, ensure_ascii=False, default=str))
+        archivo.write("\n")
+
+
+def escribir_csv(filas, archivo):
+    # Las columnas se toman de la primera fila; los campos que no estén en ella se ignoran.
+    escritor = None
+    for fila in filas:
+        if escritor is None:
+            escritor = csv.DictWriter(archivo, fieldnames=list(fila), extrasaction="ignore")
+            escritor.writeheader()
+        escritor.writerow(fila)
+
+
+def _con_totales_periodicos(filas, totales, intervalo, salida_totales):
+    for fila in filas:
+        yield fila
+        if intervalo and totales.filas % intervalo == 0:
+            salida_totales.write(json.dumps(totales.a_dict(), ensure_ascii=False) + "\n")
+            salida_totales.flush()
+
+
+def ejecutar_batch(entrada, salida, formato_entrada="jsonl", formato_salida="jsonl", intervalo_totales=0,
+                   salida_totales=None, columnas_conservadas=None, **opciones):
+    """
+    Lee registros de `entrada`, los enriquece y los escribe en `salida` sin cargar el archivo en memoria.
+
+    Args:
+        entrada (file o str): Archivo de texto abierto con los registros, o la ruta del archivo o directorio
+            si el formato es "parquet" o "arrow".
+        salida (file o str): Archivo de texto abierto donde se escriben las filas enriquecidas, o la ruta del
+            archivo si el formato es "parquet" o "arrow".
+        formato_entrada, formato_salida (str, opcional): "jsonl", "csv", "parquet" o "arrow".
+        intervalo_totales (int, opcional): Cada cuántas filas escribir los totales acumulados en `salida_totales` (0 = nunca).
+        salida_totales (file, opcional): Destino de los totales periódicos. Por defecto, la salida de errores.
+        columnas_conservadas (list[str], opcional): Con entrada columnar, columnas que se copian a la salida
+            además de las de resultados (ver `columnar.LectorColumnar`). Las entradas JSONL y CSV conservan todos
+            los campos.
+        **opciones: Argumentos de `procesar_registros` (columnas, modelo_por_defecto, moneda, tamano_bloque,
+            trabajadores, estadisticas_trabajadores, textos_en_archivos, deduplicar).
+
+    Returns:
+        TotalesAcumulados: Los totales de todas las filas.
+    """
+    moneda = opciones.get("moneda", "USD")
+    totales = TotalesAcumulados(moneda)
+    esquema_conservado = None
+    if formato_entrada in columnar.FORMATOS_COLUMNARES:
+        columnas = [
+            opciones.get("columna_modelo", COLUMNA_REGISTRO_MODELO),
+            opciones.get("columna_entrada", COLUMNA_REGISTRO_ENTRADA),
+            opciones.get("columna_salida", COLUMNA_REGISTRO_SALIDA),
+            opciones.get("columna_sistema", COLUMNA_REGISTRO_SISTEMA),
+        ]
+        registros = columnar.LectorColumnar(entrada, formato_entrada, columnas, conservar=columnas_conservadas)
+        esquema_conservado = registros.esquema
+    else:
+        registros = leer_registros(entrada, formato_entrada)
+    filas = procesar_registros(registros, totales=totales, **opciones)
+    filas = _con_totales_periodicos(filas, totales, intervalo_totales, salida_totales or sys.stderr)
+    if formato_salida in columnar.FORMATOS_COLUMNARES:
+        columnar.escribir_columnar(filas, salida, formato_salida, moneda, esquema_conservado)
+    elif formato_salida == "csv":
+        escribir_csv(filas, salida)
+    else:
+        escribir_jsonl(filas, salida)
+    return totales
@@ -0,0 +1,234 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from calculators.cost_engine import MatrizPrecios, compilar_matriz_precios
+from calculators.energy_estimation import IndiceEnergia
+from src.analyzers.registry import ANALIZADORES
+"""
+Este módulo carga el catálogo de modelos (`src/config/model_prices.json`): precios, factores de energía
+y el tokenizer que usa cada modelo.
+
+El archivo se lee y se valida una sola vez por proceso; el resultado es un `Catalogo` inmutable con
+los precios ya compilados en una `MatrizPrecios` y la tabla de energía en un `IndiceEnergia`.
+`obtener_catalogo()` comprueba la fecha de modificación del archivo (como mucho una vez cada
+`INTERVALO_VERIFICACION` segundos) y lo vuelve a cargar si cambió, así que los procesos de larga
+duración ven los precios nuevos sin reiniciarse. Si el archivo nuevo no es válido, se sigue usando
+el catálogo anterior.
+
+Formato del archivo:
+    {
+        "GPT-4": {"entrada": 0.002, "salida": 0.008},
+        ...
+        "energia": {"gpt-4": {"electricidad_por_1k_tokens": 0.25, "agua_por_1k_tokens": 0.9}, ...},
+        "tokenizers": {"GPT-4": {"proveedor": "openai", "modelo_tokenizer": "gpt-4"}, ...}
+    }
+
+Vive en `calculators` porque compila los precios y la energía con `calculators.cost_engine` y
+`calculators.energy_estimation`; de `src` solo usa la lista de proveedores de `src.analyzers.registry`.
+Así `calculators` usa `src.analyzers` y `src.utils`, y estos solo importan `calculators` desde la capa de
+presentación (`src/app.py`, `src/utils/visualizations.py`) y desde los ejemplos `__main__` de los analizadores.
+"""
+
+RUTA_CATALOGO_POR_DEFECTO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "config", "model_prices.json"
+)
+VARIABLE_RUTA_CATALOGO = "CALCULADORA_CATALOGO"
+SECCION_ENERGIA = "energia"
+SECCION_TOKENIZERS = "tokenizers"
+PROVEEDORES = frozenset(ANALIZADORES)
+# Segundos entre comprobaciones de la fecha de modificación del archivo.
+INTERVALO_VERIFICACION = 1.0
+
+
+@dataclass(frozen=True, slots=True)
+class TokenizerModelo:
+    proveedor: str
+    modelo_tokenizer: str
+
+
+@dataclass(frozen=True, slots=True)
+class Catalogo:
+    """
+    Catálogo validado e inmutable.
+
+    Atributos:
+        modelos (tuple[str]): Modelos con precio, en el orden del archivo.
+        precios (Mapping): {modelo: {"entrada": ..., "salida": ...}}, compatible con `calcular_costo_tokens`.
+        energia (Mapping): {clave en minúsculas: {"electricidad_por_1k_tokens": ..., "agua_por_1k_tokens": ...}}.
+        tokenizers (Mapping): {modelo: TokenizerModelo}.
+        matriz_precios (MatrizPrecios): Precios compilados para `calculators.cost_engine`.
+        indice_energia (IndiceEnergia): Tabla de energía compilada.
+        ruta (str): Archivo del que se cargó.
+        mtime_ns (int): Fecha de modificación del archivo al cargarlo.
+    """
+    modelos: tuple
+    precios: MappingProxyType
+    energia: MappingProxyType
+    tokenizers: MappingProxyType
+    matriz_precios: MatrizPrecios
+    indice_energia: IndiceEnergia
+    ruta: str = None
+    mtime_ns: int = 0
+
+    def tokenizer(self, modelo):
+        # TokenizerModelo del modelo, o None si no está en el catálogo.
+        return self.tokenizers.get(modelo)
+
+
+def _es_numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and math.isfinite(valor) and valor >= 0
+
+
+def _validar_tarifas(seccion, nombre, valores, campos):
+    if not isinstance(valores, dict):
+        raise ValueError(f"{seccion}'{nombre}' debe ser un objeto, no {type(valores).__name__}")
+    for campo in campos:
+        if campo not in valores:
+            raise ValueError(f"{seccion}'{nombre}' no tiene el campo '{campo}'")
+        if not _es_numero(valores[campo]):
+            raise ValueError(f"{seccion}'{nombre}'.{campo} debe ser un número >= 0, no {valores[campo]!r}")
+    sobrantes = set(valores) - set(campos)
+    if sobrantes:
+        raise ValueError(f"{seccion}'{nombre}' tiene campos desconocidos: {sorted(sobrantes)}")
+
+
+def validar_catalogo(datos):
+    """
+    Comprueba que `datos` (el JSON ya leído) tiene el formato del catálogo. Lanza ValueError con la
+    ubicación del primer error encontrado.
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("El catálogo debe ser un objeto JSON")
+    modelos = [nombre for nombre in datos if nombre not in (SECCION_ENERGIA, SECCION_TOKENIZERS)]
+    for modelo in modelos:
+        _validar_tarifas("", modelo, datos[modelo], ("entrada", "salida"))
+
+    energia = datos.get(SECCION_ENERGIA, {})
+    if not isinstance(energia, dict):
+        raise ValueError(f"'{SECCION_ENERGIA}' debe ser un objeto")
+    for clave, valores in energia.items():
+        _validar_tarifas(f"{SECCION_ENERGIA}.", clave, valores, ("electricidad_por_1k_tokens", "agua_por_1k_tokens"))
+
+    tokenizers = datos.get(SECCION_TOKENIZERS, {})
+    if not isinstance(tokenizers, dict):
+        raise ValueError(f"'{SECCION_TOKENIZERS}' debe ser un objeto")
+    for modelo, valores in tokenizers.items():
+        if modelo not in datos or modelo in (SECCION_ENERGIA, SECCION_TOKENIZERS):
+            raise ValueError(f"{SECCION_TOKENIZERS}.'{modelo}' no corresponde a ningún modelo con precio")
+        if not isinstance(valores, dict) or set(valores) != {"proveedor", "modelo_tokenizer"}:
+            raise ValueError(f"{SECCION_TOKENIZERS}.'{modelo}' debe tener exactamente 'proveedor' y 'modelo_tokenizer'")
+        if valores["proveedor"] not in PROVEEDORES:
+            raise ValueError(
+                f"{SECCION_TOKENIZERS}.'{modelo}'.proveedor '{valores['proveedor']}' no es uno de {sorted(PROVEEDORES)}"
+            )
+        if not isinstance(valores["modelo_tokenizer"], str) or not valores["modelo_tokenizer"]:
+            raise ValueError(f"{SECCION_TOKENIZERS}.'{modelo}'.modelo_tokenizer debe ser un texto no vacío")
+
+
+def construir_catalogo(datos, ruta=None, mtime_ns=0):
+    """
+    Valida `datos` y construye un Catalogo inmutable a partir de ellos.
+    """
+    validar_catalogo(datos)
+    modelos = tuple(nombre for nombre in datos if nombre not in (SECCION_ENERGIA, SECCION_TOKENIZERS))
+    precios = MappingProxyType({modelo: MappingProxyType(dict(datos[modelo])) for modelo in modelos})
+    energia = MappingProxyType({
+        clave: MappingProxyType(dict(valores)) for clave, valores in datos.get(SECCION_ENERGIA, {}).items()
+    })
+    tokenizers = MappingProxyType({
+        modelo: TokenizerModelo(valores["proveedor"], valores["modelo_tokenizer"])
+        for modelo, valores in datos.get(SECCION_TOKENIZERS, {}).items()
+    })
+    return Catalogo(
+        modelos=modelos,
+        precios=precios,
+        energia=energia,
+        tokenizers=tokenizers,
+        matriz_precios=compilar_matriz_precios(precios, modelos),
+        indice_energia=IndiceEnergia(energia),
+        ruta=ruta,
+        mtime_ns=mtime_ns,
+    )
+
+
+def cargar_catalogo(ruta=None):
+    """
+    Lee, valida y compila el catálogo de `ruta` (por defecto `CALCULADORA_CATALOGO` o
+    `src/config/model_prices.json`). Lanza ValueError si el archivo no es válido.
+    """
+    ruta = ruta or os.environ.get(VARIABLE_RUTA_CATALOGO) or RUTA_CATALOGO_POR_DEFECTO
+    mtime_ns = os.stat(ruta).st_mtime_ns
+    with open(ruta, "r", encoding="utf-8") as f:
+        try:
+            datos = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{ruta} no es un JSON válido: {e}") from e
+    return construir_catalogo(datos, ruta, mtime_ns)
+
+
+class _CatalogoRecargable:
+    # Catálogo de una ruta, recargado cuando cambia la fecha de modificación del archivo.
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.catalogo = cargar_catalogo(ruta)
+        self.ultima_verificacion = time.monotonic()
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        ahora = time.monotonic()
+        if ahora - self.ultima_verificacion < INTERVALO_VERIFICACION:
+            return self.catalogo
+        with self._lock:
+            if ahora - self.ultima_verificacion < INTERVALO_VERIFICACION:
+                return self.catalogo
+            self.ultima_verificacion = ahora
+            try:
+                mtime_ns = os.stat(self.ruta).st_mtime_ns
+            except OSError as e:
+                print(f"Advertencia: No se pudo comprobar el catálogo {self.ruta}: {e}", file=sys.stderr)
+                return self.catalogo
+            if mtime_ns != self.catalogo.mtime_ns:
+                try:
+                    self.catalogo = cargar_catalogo(self.ruta)
+                except (OSError, ValueError) as e:
+                    print(f"Advertencia: No se pudo recargar el catálogo {self.ruta}, se mantiene el anterior: {e}", file=sys.stderr)
+        return self.catalogo
+
+
+_RECARGABLES = {}
+_LOCK_RECARGABLES = threading.Lock()
+
+
+def obtener_catalogo(ruta=None):
+    """
+    Devuelve el catálogo del proceso, cargándolo la primera vez y recargándolo si el archivo cambió.
+
+    Args:
+        ruta (str, opcional): Archivo del catálogo. Por defecto `CALCULADORA_CATALOGO` o `src/config/model_prices.json`.
+
+    Returns:
+        Catalogo: El catálogo vigente.
+    """
+    ruta = os.path.abspath(ruta or os.environ.get(VARIABLE_RUTA_CATALOGO) or RUTA_CATALOGO_POR_DEFECTO)
+    recargable = _RECARGABLES.get(ruta)
+    if recargable is None:
+        with _LOCK_RECARGABLES:
+            recargable = _RECARGABLES.get(ruta)
+            if recargable is None:
+                recargable = _RECARGABLES[ruta] = _CatalogoRecargable(ruta)
+    return recargable.obtener()
+
+
+if __name__ == "__main__":
+    # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
+    catalogo = obtener_catalogo()
+    print(f"{len(catalogo.modelos)} modelos en {catalogo.ruta}")
+    for modelo in catalogo.modelos[:3]:
+        print(f"  {modelo}: {dict(catalogo.precios[modelo])} -> {catalogo.tokenizer(modelo)}")
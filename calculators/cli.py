@@ -0,0 +1,208 @@
+import argparse
+import json
+import sys
+from contextlib import ExitStack
+
+from calculators import batch, columnar, sampling
+from src.utils.metrics import activar_metricas, exportar_json, exportar_prometheus
+"""
+Línea de comandos de la calculadora:
+
+    python -m calculators batch registros.jsonl -o resultados.jsonl
+    python -m calculators batch registros.csv --formato-salida csv --intervalo-totales 100000 > resultados.csv
+    python -m calculators batch exportacion/ --formato-entrada parquet -o resultados.parquet
+    python -m calculators batch corpus.jsonl --muestreo --error-objetivo 0.02 -o estimacion.json
+    python -m calculators serve --port 8765
+
+Las filas enriquecidas se escriben en la salida (por defecto, la salida estándar) y los totales
+acumulados en la salida de errores, para no mezclarlos con las filas. Con `--muestreo` no se escriben
+filas: se procesa una muestra aleatoria del corpus y la salida es la estimación de los totales con sus
+intervalos de confianza (ver `calculators.sampling`).
+"""
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(prog="python -m calculators", description="Calculadora de costo de uso de LLMs.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_batch = subparsers.add_parser("batch", help="Procesa un registro de uso JSONL, CSV, Parquet o Arrow en streaming.")
+    parser_batch.add_argument("entrada", help="Archivo JSONL o CSV ('-' para la entrada estándar), o archivo o directorio "
+                                              "Parquet/Arrow con los registros.")
+    parser_batch.add_argument("-o", "--salida", default="-", help="Archivo de resultados ('-' para la salida estándar).")
+    parser_batch.add_argument("--formato-entrada", choices=batch.FORMATOS, help="Por defecto, según la extensión.")
+    parser_batch.add_argument("--formato-salida", choices=batch.FORMATOS, help="Por defecto, según la extensión.")
+    parser_batch.add_argument("--columna-modelo", default=batch.COLUMNA_REGISTRO_MODELO)
+    parser_batch.add_argument("--columna-entrada", default=batch.COLUMNA_REGISTRO_ENTRADA)
+    parser_batch.add_argument("--columna-salida", default=batch.COLUMNA_REGISTRO_SALIDA)
+    parser_batch.add_argument("--columna-sistema", default=batch.COLUMNA_REGISTRO_SISTEMA,
+                              help="Campo con el prompt de sistema: se suma a la entrada y su gasto se informa con los totales.")
+    parser_batch.add_argument("--conservar", type=lambda valor: [c for c in valor.split(",") if c],
+                              help="Con entrada Parquet/Arrow, columnas separadas por comas que se copian a la salida "
+                                   "(por defecto, timestamp si existe). Solo se leen estas columnas y las de texto.")
+    parser_batch.add_argument("--modelo", help="Modelo para los registros que no indican uno (ej. 'GPT-4o').")
+    parser_batch.add_argument("--textos-en-archivos", action="store_true",
+                              help="Las columnas de prompt y respuesta tienen rutas de archivos de texto UTF-8 (relativas al "
+                                   "directorio actual); se cuenta su contenido por memory map, sin cargarlo en memoria.")
+    parser_batch.add_argument("--moneda", default="USD")
+    parser_batch.add_argument("--tamano-bloque", type=int, default=batch.TAMANO_BLOQUE,
+                              help="Filas que se tokenizan juntas.")
+    parser_batch.add_argument("--intervalo-totales", type=int, default=0,
+                              help="Escribe los totales acumulados cada N filas en la salida de errores.")
+    parser_batch.add_argument("--metricas", metavar="RUTA",
+                              help="Activa la instrumentación y escribe al terminar sus métricas en RUTA: JSON si "
+                                   "termina en .json, formato de texto de Prometheus en otro caso ('-' para la salida de errores).")
+    parser_batch.add_argument("--sin-deduplicar", action="store_true",
+                              help="Tokeniza cada texto aunque ya se haya contado uno idéntico (por defecto, los textos "
+                                   "repetidos se cuentan una vez y el ratio de deduplicación se informa con los totales).")
+    parser_batch.add_argument("--workers", type=int, default=1,
+                              help="Procesos para tokenizar (por defecto 1). Con más de 1 se informa del rendimiento de cada uno.")
+    grupo_muestreo = parser_batch.add_argument_group("muestreo", "Estimación de los totales de corpus muy grandes.")
+    grupo_muestreo.add_argument("--muestreo", action="store_true",
+                                help="Procesa una muestra aleatoria (JSONL, Parquet o Arrow) y escribe en la salida la "
+                                     "estimación JSON de los totales con intervalos de confianza, en lugar de las filas.")
+    grupo_muestreo.add_argument("--error-objetivo", type=float, default=sampling.ERROR_OBJETIVO,
+                                help="Error relativo (semiamplitud del intervalo) de tokens y costo con el que se detiene "
+                                     "el muestreo (por defecto 0.01 = ±1%%).")
+    grupo_muestreo.add_argument("--confianza", type=float, default=sampling.CONFIANZA)
+    grupo_muestreo.add_argument("--tamano-unidad", type=int, default=sampling.TAMANO_UNIDAD,
+                                help="Bytes de cada bloque muestreado de un JSONL.")
+    grupo_muestreo.add_argument("--tiempo-maximo", type=float, help="Segundos tras los que no se muestrea más.")
+    grupo_muestreo.add_argument("--semilla", type=int, help="Semilla del muestreo, para repetir la misma muestra.")
+
+    parser_serve = subparsers.add_parser("serve", help="Inicia el servicio HTTP local de estimación.")
+    parser_serve.add_argument("--host", default="127.0.0.1")
+    parser_serve.add_argument("--port", type=int, default=8765)
+    parser_serve.add_argument("--ventana-ms", type=float, default=5,
+                              help="Milisegundos que se esperan para agrupar peticiones en un lote.")
+    parser_serve.add_argument("--max-lote", type=int, default=256, help="Peticiones máximas por lote.")
+    parser_serve.add_argument("--moneda", default="USD")
+    parser_serve.add_argument("--metricas", action="store_true",
+                              help="Activa la instrumentación (GET /metricas/prometheus y la sección 'instrumentacion' de /metricas).")
+    return parser
+
+
+def _abrir(pila, ruta, modo, formato):
+    # Los formatos columnares se leen y escriben por ruta, con pyarrow.
+    if formato in columnar.FORMATOS_COLUMNARES:
+        if ruta == "-":
+            raise SystemExit(f"El formato {formato} necesita una ruta, no la entrada o salida estándar")
+        return ruta
+    if ruta == "-":
+        return sys.stdin if "r" in modo else sys.stdout
+    return pila.enter_context(open(ruta, modo, encoding="utf-8", newline=""))
+
+
+def comando_batch(args):
+    formato_entrada = batch.detectar_formato(args.entrada, args.formato_entrada)
+    if args.muestreo:
+        return comando_muestreo(args, formato_entrada)
+    formato_salida = batch.detectar_formato(args.salida, args.formato_salida)
+    if args.workers < 1:
+        raise SystemExit("--workers debe ser al menos 1")
+    estadisticas = batch.EstadisticasTrabajadores() if args.workers > 1 else None
+    if args.metricas:
+        activar_metricas()
+    with ExitStack() as pila:
+        totales = batch.ejecutar_batch(
+            _abrir(pila, args.entrada, "r", formato_entrada),
+            _abrir(pila, args.salida, "w", formato_salida),
+            formato_entrada=formato_entrada,
+            formato_salida=formato_salida,
+            intervalo_totales=args.intervalo_totales,
+            columnas_conservadas=args.conservar,
+            columna_modelo=args.columna_modelo,
+            columna_entrada=args.columna_entrada,
+            columna_salida=args.columna_salida,
+            columna_sistema=args.columna_sistema,
+            modelo_por_defecto=args.modelo,
+            moneda=args.moneda,
+            tamano_bloque=args.tamano_bloque,
+            trabajadores=args.workers,
+            estadisticas_trabajadores=estadisticas,
+            textos_en_archivos=args.textos_en_archivos,
+            deduplicar=not args.sin_deduplicar,
+        )
+    sys.stderr.write(json.dumps(totales.a_dict(), ensure_ascii=False) + "\n")
+    if estadisticas is not None:
+        sys.stderr.write(json.dumps(estadisticas.a_dict(), ensure_ascii=False) + "\n")
+    if args.metricas:
+        _escribir_metricas(args.metricas)
+    return 0
+
+
+def comando_muestreo(args, formato_entrada):
+    if not 0 < args.confianza < 1:
+        raise SystemExit("--confianza debe estar entre 0 y 1")
+    if args.metricas:
+        activar_metricas()
+    columnas = [args.columna_modelo, args.columna_entrada, args.columna_salida, args.columna_sistema]
+    try:
+        unidades = sampling.abrir_unidades(args.entrada, formato_entrada, args.tamano_unidad, columnas)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    def progreso(estimacion):
+        errores = {metrica: round(estimacion.error_relativo(metrica), 6) for metrica in sampling.METRICAS_CRITERIO}
+        sys.stderr.write(json.dumps({"unidades_muestreadas": estimacion.unidades_muestreadas,
+                                     "unidades_totales": estimacion.unidades_totales, "errores_relativos": errores}) + "\n")
+        sys.stderr.flush()
+
+    estimacion = sampling.estimar_por_muestreo(
+        unidades,
+        error_objetivo=args.error_objetivo,
+        confianza=args.confianza,
+        semilla=args.semilla,
+        tiempo_maximo=args.tiempo_maximo,
+        progreso=progreso,
+        columna_modelo=args.columna_modelo,
+        columna_entrada=args.columna_entrada,
+        columna_salida=args.columna_salida,
+        columna_sistema=args.columna_sistema,
+        modelo_por_defecto=args.modelo,
+        moneda=args.moneda,
+        textos_en_archivos=args.textos_en_archivos,
+    )
+    texto = json.dumps(estimacion.a_dict(), ensure_ascii=False, indent=2) + "\n"
+    if args.salida == "-":
+        sys.stdout.write(texto)
+    else:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    if args.metricas:
+        _escribir_metricas(args.metricas)
+    return 0
+
+
+def _escribir_metricas(ruta):
+    if ruta.lower().endswith(".json"):
+        texto = json.dumps(exportar_json(), ensure_ascii=False, indent=2) + "\n"
+    else:
+        texto = exportar_prometheus()
+    if ruta == "-":
+        sys.stderr.write(texto)
+        return
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(texto)
+
+
+def comando_serve(args):
+    import asyncio
+
+    from calculators import service
+
+    if args.metricas:
+        activar_metricas()
+    try:
+        asyncio.run(service.servir(args.host, args.port, ventana_ms=args.ventana_ms, max_lote=args.max_lote,
+                                   moneda=args.moneda))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+COMANDOS = {"batch": comando_batch, "serve": comando_serve}
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    return COMANDOS[args.comando](args)
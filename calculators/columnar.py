@@ -0,0 +1,177 @@
+from calculators.results import (
+    COLUMNA_AGUA, COLUMNA_CO2, COLUMNA_ELECTRICIDAD, COLUMNA_MODELO, COLUMNA_TOKENS_ENTRADA, COLUMNA_TOKENS_SALIDA,
+    columna_costo_entrada, columna_costo_salida, columna_costo_total, columnas_resultados,
+)
+"""
+Lectura y escritura de registros de uso en formatos columnares (Parquet y Arrow IPC / Feather) con pyarrow.
+
+- `LectorColumnar` lee de un archivo o de un directorio (dataset) solo las columnas que hacen falta
+  (modelo, prompt, respuesta y las que se conservan, como `timestamp`), lote a lote, sin materializar
+  el resto de columnas ni el archivo completo.
+- `escribir_columnar` escribe las filas enriquecidas con columnas numéricas tipadas (enteros para los
+  tokens, float64 para costos, electricidad, agua y CO2) y los nombres de `calculators.results`, los mismos
+  que esperan las funciones de `src/utils/visualizations.py`.
+
+pyarrow no es una dependencia obligatoria: solo se importa al usar estos formatos.
+"""
+
+FORMATOS_COLUMNARES = ("parquet", "arrow")
+EXTENSIONES_COLUMNARES = {
+    ".parquet": "parquet", ".pq": "parquet",
+    ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow",
+}
+COLUMNA_REGISTRO_FECHA = "timestamp"
+# Filas por lote leído y por grupo de filas escrito. La salida no lleva los textos, así que los grupos pueden ser grandes.
+TAMANO_LOTE = 1000
+FILAS_POR_GRUPO = 64 * 1024
+
+
+def _importar_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Los formatos parquet y arrow necesitan pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def formato_por_extension(ruta):
+    """
+    Devuelve "parquet" o "arrow" según la extensión de `ruta`, o None si no es un formato columnar.
+    """
+    ruta = str(ruta).lower()
+    for extension, formato in EXTENSIONES_COLUMNARES.items():
+        if ruta.endswith(extension):
+            return formato
+    return None
+
+
+class LectorColumnar:
+    """
+    Itera los registros (dict) de un archivo o directorio Parquet/Arrow leyendo solo las columnas necesarias.
+
+    Args:
+        ruta (str): Archivo o directorio del dataset.
+        formato (str): "parquet" o "arrow".
+        columnas (iterable[str]): Columnas que se usan para calcular (modelo, prompt, respuesta). Las que no
+            existen en el dataset se omiten: los registros se tratan como si no tuvieran ese campo.
+        conservar (iterable[str], opcional): Columnas que se copian tal cual a la salida. Deben existir.
+            Por defecto, `timestamp` si el dataset la tiene.
+        tamano_lote (int, opcional): Filas por lote leído.
+
+    Atributos:
+        columnas (list[str]): Columnas que se leen.
+        esquema (pyarrow.Schema): Tipos de las columnas conservadas, para mantenerlos al escribir en formato columnar.
+    """
+
+    def __init__(self, ruta, formato, columnas, conservar=None, tamano_lote=TAMANO_LOTE):
+        pa = _importar_pyarrow()
+        self.dataset = pa.dataset.dataset(ruta, format="parquet" if formato == "parquet" else "ipc")
+        disponibles = set(self.dataset.schema.names)
+        if conservar is None:
+            conservar = [COLUMNA_REGISTRO_FECHA] if COLUMNA_REGISTRO_FECHA in disponibles else []
+        faltantes = [columna for columna in conservar if columna not in disponibles]
+        if faltantes:
+            raise ValueError(f"{ruta} no tiene las columnas {faltantes}")
+        self.columnas = [columna for columna in dict.fromkeys([*columnas, *conservar]) if columna in disponibles]
+        self.esquema = pa.schema([self.dataset.schema.field(columna) for columna in dict.fromkeys(conservar)])
+        self.tamano_lote = tamano_lote
+
+    def __iter__(self):
+        # Con readahead 1 solo hay un fragmento (grupo de filas) y un lote por delante en memoria.
+        lotes = self.dataset.to_batches(
+            columns=self.columnas, batch_size=self.tamano_lote, batch_readahead=1, fragment_readahead=1,
+        )
+        for lote in lotes:
+            yield from lote.to_pylist()
+
+
+def esquema_resultados(moneda="USD"):
+    """
+    Esquema pyarrow de las columnas de `columnas_resultados`: el modelo como texto, los tokens como enteros y el
+    resto como float64.
+    """
+    pa = _importar_pyarrow()
+    tipos = {
+        COLUMNA_MODELO: pa.string(),
+        COLUMNA_TOKENS_ENTRADA: pa.int64(),
+        COLUMNA_TOKENS_SALIDA: pa.int64(),
+        columna_costo_entrada(moneda): pa.float64(),
+        columna_costo_salida(moneda): pa.float64(),
+        columna_costo_total(moneda): pa.float64(),
+        COLUMNA_ELECTRICIDAD: pa.float64(),
+        COLUMNA_AGUA: pa.float64(),
+        COLUMNA_CO2: pa.float64(),
+    }
+    return pa.schema([pa.field(columna, tipos[columna]) for columna in columnas_resultados(moneda)])
+
+
+def _esquema_salida(filas, moneda, esquema_conservado):
+    # Columnas conservadas (las de la primera fila que no son resultados) seguidas de las de resultados.
+    pa = _importar_pyarrow()
+    resultados = esquema_resultados(moneda)
+    campos = []
+    for columna in filas[0]:
+        if columna in resultados.names:
+            continue
+        if esquema_conservado is not None and columna in esquema_conservado.names:
+            campos.append(esquema_conservado.field(columna))
+            continue
+        # Registros de JSONL/CSV: se infiere el tipo del primer grupo; una columna sin valores se guarda como texto.
+        tipo = pa.array([fila.get(columna) for fila in filas]).type
+        campos.append(pa.field(columna, pa.string() if pa.types.is_null(tipo) else tipo))
+    return pa.schema(campos + list(resultados))
+
+
+def escribir_columnar(filas, ruta, formato="parquet", moneda="USD", esquema_conservado=None,
+                      filas_por_grupo=FILAS_POR_GRUPO):
+    """
+    Escribe las filas enriquecidas en un archivo Parquet o Arrow IPC, un grupo de filas cada vez.
+
+    Args:
+        filas (iterable[dict]): Filas de `calculators.batch.procesar_registros`.
+        ruta (str): Archivo de salida.
+        formato (str, opcional): "parquet" o "arrow".
+        moneda (str, opcional): Moneda de las columnas de costo.
+        esquema_conservado (pyarrow.Schema, opcional): Tipos de las columnas conservadas (`LectorColumnar.esquema`).
+            Sin él, se infieren del primer grupo de filas.
+        filas_por_grupo (int, opcional): Filas por grupo de filas (Parquet) o por lote (Arrow).
+    """
+    pa = _importar_pyarrow()
+    escritor = None
+    esquema = None
+    pendientes = []
+
+    def volcar():
+        nonlocal escritor, esquema
+        if escritor is None:
+            esquema = _esquema_salida(pendientes, moneda, esquema_conservado)
+            if formato == "parquet":
+                escritor = pa.parquet.ParquetWriter(ruta, esquema)
+            else:
+                escritor = pa.ipc.new_file(ruta, esquema)
+        # Los campos que no están en el esquema se ignoran, como en la salida CSV.
+        escritor.write_table(pa.Table.from_pylist(pendientes, schema=esquema), filas_por_grupo)
+        pendientes.clear()
+
+    try:
+        for fila in filas:
+            pendientes.append(fila)
+            if len(pendientes) >= filas_por_grupo:
+                volcar()
+        if pendientes:
+            volcar()
+        elif escritor is None:
+            # Sin filas: se escribe un archivo vacío con las columnas de resultados.
+            esquema = pa.schema(list(esquema_conservado or []) + list(esquema_resultados(moneda)))
+            tabla = esquema.empty_table()
+            if formato == "parquet":
+                pa.parquet.write_table(tabla, ruta)
+            else:
+                with pa.ipc.new_file(ruta, esquema) as vacio:
+                    vacio.write_table(tabla)
+    finally:
+        if escritor is not None:
+            escritor.close()
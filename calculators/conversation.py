@@ -0,0 +1,197 @@
+import json
+
+import numpy as np
+
+from calculators.cost_engine import calcular_costos_vectorizado, compilar_matriz_precios
+from calculators.energy_estimation import INTENSIDAD_CARBONO_PROMEDIO
+from calculators.results import ResultadoModelo
+from src.analyzers.registry import contar_tokens_modelo_batch
+from calculators.catalog import obtener_catalogo
+from src.utils.metrics import medir
+"""
+Simulación del costo de una conversación de varios turnos.
+
+En un chat cada llamada al modelo reenvía todo el historial: la entrada del turno k son todos los mensajes
+anteriores a la k-ésima respuesta del asistente y la salida es esa respuesta. Volver a contar el historial en
+cada turno cuesta O(N²) tokenización; aquí cada mensaje se cuenta una sola vez (una llamada por lotes por
+modelo) y la entrada de cada turno sale de la suma acumulada de esos conteos, así que una conversación de
+N mensajes cuesta O(N).
+
+Los mensajes son diccionarios {"rol": ..., "contenido": ...}; también se aceptan las claves "role" y
+"content" de las APIs de chat, y el contenido como lista de partes {"type": "text", "text": ...}.
+"""
+
+ROLES_ASISTENTE = ("assistant", "asistente")
+COLUMNA_TURNO = "Turno"
+
+
+def _contenido(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, list):
+        # Contenido multimodal: solo cuentan las partes de texto.
+        return "".join(parte.get("text", "") if isinstance(parte, dict) else str(parte) for parte in valor)
+    return str(valor)
+
+
+def normalizar_mensajes(mensajes):
+    """
+    Devuelve [(rol, texto)] a partir de una lista de mensajes. Lanza ValueError si alguno no es un objeto con rol.
+    """
+    normalizados = []
+    for numero, mensaje in enumerate(mensajes, start=1):
+        if not isinstance(mensaje, dict):
+            raise ValueError(f"Mensaje {numero}: se esperaba un objeto JSON")
+        rol = mensaje.get("rol", mensaje.get("role"))
+        if not isinstance(rol, str) or not rol:
+            raise ValueError(f"Mensaje {numero}: falta el rol")
+        normalizados.append((rol.lower(), _contenido(mensaje.get("contenido", mensaje.get("content")))))
+    return normalizados
+
+
+def leer_mensajes(texto):
+    """
+    Lee una conversación de un texto JSON: una lista de mensajes, un objeto con la lista en "mensajes" o
+    "messages", o JSONL con un mensaje por línea.
+    """
+    texto = texto.strip()
+    if not texto:
+        return []
+    try:
+        datos = json.loads(texto)
+    except json.JSONDecodeError:
+        datos = [json.loads(linea) for linea in texto.splitlines() if linea.strip()]
+    if isinstance(datos, dict):
+        datos = datos.get("mensajes", datos.get("messages"))
+    if not isinstance(datos, list):
+        raise ValueError("Se esperaba una lista de mensajes")
+    return datos
+
+
+class SimulacionModelo:
+    """
+    Tokens, costos y energía de cada turno de una conversación para un modelo. Cada arreglo tiene forma (T,),
+    con T el número de respuestas del asistente.
+
+    Atributos:
+        modelo (str): Nombre del modelo.
+        moneda (str): Moneda de los costos.
+        mensajes (numpy.ndarray): Posición en la conversación de la respuesta de cada turno.
+        tokens_entrada, tokens_salida (numpy.ndarray): Tokens enviados y generados en cada turno.
+        costo_entrada, costo_salida, costo_total (numpy.ndarray): Costos de cada turno.
+        electricidad_kwh, agua_litros, co2_kg (numpy.ndarray): Energía, agua y CO2 de cada turno.
+    """
+    __slots__ = ("modelo", "moneda", "mensajes", "tokens_entrada", "tokens_salida", "costo_entrada",
+                 "costo_salida", "costo_total", "electricidad_kwh", "agua_litros", "co2_kg")
+
+    def __init__(self, modelo, moneda, mensajes, tokens_entrada, tokens_salida, costos, electricidad, agua):
+        self.modelo = modelo
+        self.moneda = moneda
+        self.mensajes = mensajes
+        self.tokens_entrada = tokens_entrada
+        self.tokens_salida = tokens_salida
+        self.costo_entrada = costos.costo_entrada[:, 0]
+        self.costo_salida = costos.costo_salida[:, 0]
+        self.costo_total = costos.costo_total[:, 0]
+        self.electricidad_kwh = electricidad
+        self.agua_litros = agua
+        self.co2_kg = electricidad * INTENSIDAD_CARBONO_PROMEDIO
+
+    def __len__(self):
+        return len(self.mensajes)
+
+    def total(self):
+        """
+        Devuelve la suma de todos los turnos como ResultadoModelo.
+        """
+        return ResultadoModelo(
+            self.modelo, int(self.tokens_entrada.sum()), int(self.tokens_salida.sum()),
+            float(self.costo_entrada.sum()), float(self.costo_salida.sum()), float(self.costo_total.sum()),
+            float(self.electricidad_kwh.sum()), float(self.agua_litros.sum()), float(self.co2_kg.sum()), self.moneda,
+        )
+
+    def filas_turnos(self):
+        """
+        Devuelve una fila por turno con las columnas de la tabla de resultados, más "Turno" (desde 1).
+        """
+        columnas = zip(self.tokens_entrada.tolist(), self.tokens_salida.tolist(), self.costo_entrada.tolist(),
+                       self.costo_salida.tolist(), self.costo_total.tolist(), self.electricidad_kwh.tolist(),
+                       self.agua_litros.tolist(), self.co2_kg.tolist())
+        return [{COLUMNA_TURNO: turno, **ResultadoModelo(self.modelo, *valores, self.moneda).a_fila()}
+                for turno, valores in enumerate(columnas, start=1)]
+
+    def a_dict(self):
+        return {"turnos": self.filas_turnos(), "total": self.total().a_fila()}
+
+
+def simular_modelo(mensajes, modelo, catalogo, moneda="USD", tokens_por_mensaje=0, num_hilos=None):
+    """
+    Simula una conversación ya normalizada (`normalizar_mensajes`) con un modelo.
+
+    Args:
+        mensajes (list[tuple[str, str]]): (rol, texto) de cada mensaje, en orden.
+        modelo (str): Nombre del modelo en el catálogo.
+        catalogo (Catalogo): Catálogo de `calculators.catalog`.
+        moneda (str, opcional): Moneda de los costos.
+        tokens_por_mensaje (int, opcional): Tokens de formato que la API añade por cada mensaje enviado
+            (p. ej. los delimitadores de rol del formato de chat). Por defecto 0: solo se cuenta el texto.
+        num_hilos (int, opcional): Hilos de tiktoken.
+
+    Returns:
+        SimulacionModelo: El resultado por turno, o None si el modelo no tiene precio o tokenizer.
+    """
+    if modelo not in catalogo.precios:
+        return None
+    textos = [texto for _, texto in mensajes]
+    with medir("codificacion", unidades=len(textos), modelo=modelo):
+        conteos = contar_tokens_modelo_batch(textos, modelo, catalogo, num_hilos)
+    if conteos is None:
+        return None
+    conteos = np.asarray(conteos, dtype=np.int64)
+    # acumulado[i] = tokens de los mensajes anteriores al i-ésimo.
+    acumulado = np.concatenate(([0], np.cumsum(conteos + tokens_por_mensaje)))
+    posiciones = np.array([i for i, (rol, _) in enumerate(mensajes) if rol in ROLES_ASISTENTE], dtype=np.int64)
+    tokens_entrada = acumulado[posiciones]
+    tokens_salida = conteos[posiciones]
+
+    with medir("precio", unidades=len(posiciones), modelo=modelo):
+        costos = calcular_costos_vectorizado(tokens_entrada, tokens_salida,
+                                             compilar_matriz_precios(catalogo.precios, [modelo]))
+    with medir("energia", unidades=len(posiciones), modelo=modelo):
+        electricidad_por_1k, agua_por_1k = catalogo.indice_energia.factores(modelo)
+        miles = (tokens_entrada + tokens_salida) / 1000
+    return SimulacionModelo(modelo, moneda, posiciones, tokens_entrada, tokens_salida, costos,
+                            miles * electricidad_por_1k, miles * agua_por_1k)
+
+
+def simular_conversacion(mensajes, modelos, moneda="USD", tokens_por_mensaje=0, catalogo=None, num_hilos=None):
+    """
+    Simula el costo de una conversación de varios turnos con cada modelo.
+
+    Args:
+        mensajes (list[dict]): Mensajes de la conversación, en orden (ver el docstring del módulo).
+        modelos (list[str]): Modelos a simular.
+        moneda (str, opcional): Moneda de los costos.
+        tokens_por_mensaje (int, opcional): Ver `simular_modelo`.
+        catalogo (Catalogo, opcional): Por defecto, el catálogo vigente.
+        num_hilos (int, opcional): Hilos de tiktoken.
+
+    Returns:
+        dict: {modelo: SimulacionModelo o None si el modelo no tiene precio o tokenizer}.
+    """
+    catalogo = catalogo or obtener_catalogo()
+    normalizados = normalizar_mensajes(mensajes)
+    return {modelo: simular_modelo(normalizados, modelo, catalogo, moneda, tokens_por_mensaje, num_hilos)
+            for modelo in modelos}
+
+
+if __name__ == "__main__":
+    # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
+    conversacion = [{"rol": "system", "contenido": "Eres un asistente que responde en español."}]
+    for i in range(1, 4):
+        conversacion.append({"rol": "user", "contenido": f"Pregunta número {i}: ¿cuánto cuesta este turno?"})
+        conversacion.append({"rol": "assistant", "contenido": f"Respuesta {i}. " * 20})
+    for modelo_ejemplo, simulacion in simular_conversacion(conversacion, ["GPT-4o", "Claude 3 Haiku"]).items():
+        print(modelo_ejemplo, simulacion.tokens_entrada.tolist(), simulacion.total().costo_total)
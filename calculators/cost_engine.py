@@ -0,0 +1,186 @@
+from collections.abc import Mapping
+
+import numpy as np
+"""
+Motor vectorizado de costos: calcula el costo de N peticiones para M modelos en una sola operación.
+
+`calcular_costo_tokens` calcula una petición para un modelo y devuelve cadenas formateadas. Para
+analizar meses de registros contra todo el catálogo, este módulo compila `precios_modelos` en una
+matriz de tarifas (`compilar_matriz_precios`) y opera sobre arreglos de NumPy con los conteos de
+tokens de entrada y salida. Las tarifas siguen siendo por cada 1000 tokens, igual que en
+`token_costs.calcular_costo_tokens`.
+"""
+
+
+class MatrizPrecios:
+    """
+    Tarifas de un conjunto de modelos compiladas en arreglos de NumPy.
+
+    Atributos:
+        modelos (tuple[str]): Nombres de los modelos, en el orden de las columnas.
+        entrada (numpy.ndarray): Tarifa de entrada por 1000 tokens de cada modelo, forma (M,).
+        salida (numpy.ndarray): Tarifa de salida por 1000 tokens de cada modelo, forma (M,).
+    """
+    __slots__ = ("modelos", "entrada", "salida", "_columnas")
+
+    def __init__(self, modelos, entrada, salida):
+        self.modelos = tuple(modelos)
+        self.entrada = np.asarray(entrada, dtype=np.float64)
+        self.salida = np.asarray(salida, dtype=np.float64)
+        self._columnas = {modelo: i for i, modelo in enumerate(self.modelos)}
+
+    def __len__(self):
+        return len(self.modelos)
+
+    def columna(self, modelo):
+        # Índice de columna del modelo, o -1 si no está en la matriz.
+        return self._columnas.get(modelo, -1)
+
+    def columnas(self, modelos):
+        """
+        Devuelve el índice de columna de cada modelo de `modelos` (-1 para los desconocidos).
+        """
+        columnas = self._columnas
+        return np.fromiter((columnas.get(modelo, -1) for modelo in modelos), dtype=np.int64, count=len(modelos))
+
+    def seleccionar(self, modelos):
+        """
+        Devuelve una nueva matriz con solo `modelos`, en ese orden. Lanza KeyError si alguno no existe.
+        """
+        indices = []
+        for modelo in modelos:
+            columna = self.columna(modelo)
+            if columna == -1:
+                raise KeyError(modelo)
+            indices.append(columna)
+        return MatrizPrecios([self.modelos[i] for i in indices], self.entrada[indices], self.salida[indices])
+
+
+def compilar_matriz_precios(precios_modelos, modelos=None):
+    """
+    Compila el diccionario `precios_modelos` ({"GPT-4": {"entrada": ..., "salida": ...}, ...}) en una MatrizPrecios.
+    Las entradas que no son tarifas de un modelo (p. ej. la sección "energia" de model_prices.json) se ignoran.
+
+    Args:
+        precios_modelos (Mapping): Tarifas por 1000 tokens de cada modelo (p. ej. `Catalogo.precios`).
+        modelos (list[str], opcional): Modelos a incluir, en ese orden. Por defecto, todos.
+
+    Returns:
+        MatrizPrecios: La matriz compilada.
+    """
+    if modelos is None:
+        modelos = [
+            modelo for modelo, tarifas in precios_modelos.items()
+            if isinstance(tarifas, Mapping) and ("entrada" in tarifas or "salida" in tarifas)
+        ]
+    entrada = [precios_modelos[modelo].get("entrada", 0) for modelo in modelos]
+    salida = [precios_modelos[modelo].get("salida", 0) for modelo in modelos]
+    return MatrizPrecios(modelos, entrada, salida)
+
+
+class CostosVectorizados:
+    """
+    Costos calculados por el motor vectorizado. Cada arreglo tiene forma (N, M) para
+    `calcular_costos_vectorizado` o (N,) para `calcular_costos_por_fila`.
+    """
+    __slots__ = ("modelos", "costo_entrada", "costo_salida", "costo_total")
+
+    def __init__(self, modelos, costo_entrada, costo_salida):
+        self.modelos = modelos
+        self.costo_entrada = costo_entrada
+        self.costo_salida = costo_salida
+        self.costo_total = costo_entrada + costo_salida
+
+    def totales_por_modelo(self):
+        """
+        Suma los costos de todas las peticiones. Devuelve {modelo: costo_total}.
+        """
+        if self.costo_total.ndim != 2:
+            raise ValueError("totales_por_modelo solo aplica a resultados de forma (N, M)")
+        return dict(zip(self.modelos, self.costo_total.sum(axis=0).tolist()))
+
+
+def _tokens_en_miles(tokens):
+    return np.asarray(tokens, dtype=np.float64) / 1000
+
+
+def calcular_costos_vectorizado(tokens_entrada, tokens_salida, matriz):
+    """
+    Calcula el costo de cada petición para cada modelo de la matriz.
+
+    Args:
+        tokens_entrada (array-like): Tokens de entrada de N peticiones.
+        tokens_salida (array-like): Tokens de salida de N peticiones.
+        matriz (MatrizPrecios): Tarifas de M modelos.
+
+    Returns:
+        CostosVectorizados: Costos de entrada, salida y total con forma (N, M).
+        Ocupa 3 * N * M * 8 bytes; para solo obtener totales usa `totales_por_grupo`.
+    """
+    miles_entrada = _tokens_en_miles(tokens_entrada)[:, None]
+    miles_salida = _tokens_en_miles(tokens_salida)[:, None]
+    return CostosVectorizados(matriz.modelos, miles_entrada * matriz.entrada, miles_salida * matriz.salida)
+
+
+def calcular_costos_por_fila(tokens_entrada, tokens_salida, modelos, matriz):
+    """
+    Calcula el costo de cada petición con su propio modelo (p. ej. una columna "modelo" de un registro de uso).
+
+    Args:
+        tokens_entrada (array-like): Tokens de entrada de N peticiones.
+        tokens_salida (array-like): Tokens de salida de N peticiones.
+        modelos (array-like[str]): Modelo usado en cada petición.
+        matriz (MatrizPrecios): Tarifas de los modelos.
+
+    Returns:
+        CostosVectorizados: Costos con forma (N,). Las peticiones de modelos que no están en la matriz quedan en NaN.
+    """
+    columnas = matriz.columnas(modelos)
+    conocidos = columnas >= 0
+    tarifa_entrada = np.where(conocidos, matriz.entrada[columnas], np.nan)
+    tarifa_salida = np.where(conocidos, matriz.salida[columnas], np.nan)
+    return CostosVectorizados(
+        None, _tokens_en_miles(tokens_entrada) * tarifa_entrada, _tokens_en_miles(tokens_salida) * tarifa_salida
+    )
+
+
+def totales_por_grupo(tokens_entrada, tokens_salida, grupos, matriz):
+    """
+    Calcula el costo total de cada grupo de peticiones (p. ej. por día o por proyecto) para cada modelo.
+    Como el costo es lineal en los tokens, primero se suman los tokens de cada grupo y después se
+    multiplican por las tarifas, sin construir la matriz (N, M) completa.
+
+    Args:
+        tokens_entrada (array-like): Tokens de entrada de N peticiones.
+        tokens_salida (array-like): Tokens de salida de N peticiones.
+        grupos (array-like): Etiqueta de grupo de cada petición.
+        matriz (MatrizPrecios): Tarifas de M modelos.
+
+    Returns:
+        tuple: (etiquetas de los G grupos, CostosVectorizados con forma (G, M)).
+    """
+    etiquetas, inversa = np.unique(np.asarray(grupos), return_inverse=True)
+    miles_entrada = np.bincount(inversa, weights=_tokens_en_miles(tokens_entrada), minlength=len(etiquetas))
+    miles_salida = np.bincount(inversa, weights=_tokens_en_miles(tokens_salida), minlength=len(etiquetas))
+    costos = CostosVectorizados(
+        matriz.modelos, miles_entrada[:, None] * matriz.entrada, miles_salida[:, None] * matriz.salida
+    )
+    return etiquetas, costos
+
+
+if __name__ == "__main__":
+    # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
+    precios = {
+        "GPT-4": {"entrada": 0.002, "salida": 0.008},
+        "Claude 3 Haiku": {"entrada": 0.00025, "salida": 0.00125},
+    }
+    matriz_ejemplo = compilar_matriz_precios(precios)
+
+    entrada_ejemplo = np.array([1500, 2000, 800])
+    salida_ejemplo = np.array([800, 1200, 300])
+    costos_ejemplo = calcular_costos_vectorizado(entrada_ejemplo, salida_ejemplo, matriz_ejemplo)
+    print(f"Costo total por petición y modelo:\n{costos_ejemplo.costo_total}")
+    print(f"Totales por modelo: {costos_ejemplo.totales_por_modelo()}")
+
+    dias, costos_por_dia = totales_por_grupo(entrada_ejemplo, salida_ejemplo, ["lunes", "lunes", "martes"], matriz_ejemplo)
+    print(f"Totales por día ({list(dias)}):\n{costos_por_dia.costo_total}")
@@ -1,36 +1,184 @@
-import json
+import re
 """
 Esta funcion nos ayuda a calcular cuánta energía y agua se gasta al usar cada modelo.
 Los datos de energía y agua se obtienen de un archivo JSON que contiene los supuestos de consumo energético por modelo.
 Los datos de energía y agua se pueden modificar en el archivo JSON para ajustar los cálculos según sea necesario.
 
+La tabla de energía se compila una sola vez en un IndiceEnergia (mapa exacto + un único patrón para
+buscar subcadenas), y la resolución de cada nombre de modelo se memoriza.
 """
-def estimar_gasto_energetico(modelo, total_tokens, datos_energia):
 
-    modelo_lower = modelo.lower()
-    electricidad_por_1k = None
-    agua_por_1k = None
+# Supuestos para modelos no especificados individualmente (en orden de prioridad):
+# (subcadenas del nombre del modelo, kWh por 1000 tokens, litros de agua por 1000 tokens)
+REGLAS_RESPALDO = (
+    (("gpt-4", "claude 3 opus", "gemini 2.5 pro"), 0.25, 0.9),
+    # Los Llama de 70B se nombran de varias formas ("Llama 3.3 70B", "Llama 3.70B"); se listan una a una para que
+    # otros modelos con "70b" en el nombre (p. ej. "...170b") no caigan en este grupo.
+    (("gemini pro", "claude 3 sonnet", "llama 3.3 70b", "llama 3.1 70b", "llama 3 70b", "llama 3.70b"), 0.1, 0.4),
+    (("mistral large", "qwen-max", "glm-4-plus"), 0.15, 0.6),
+)
+# Modelos más pequeños o desconocidos
+FACTORES_POR_DEFECTO = (0.04, 0.15)
+# Suponemos una intensidad de carbono promedio global (kg CO2/kWh).
+# Este valor es un ejemplo y puede variar significativamente.
+INTENSIDAD_CARBONO_PROMEDIO = 0.45 # kg CO2/kWh (aproximadamente el promedio mundial en 2021)
+MAX_MODELOS_MEMORIZADOS = 4096
+
+
+def _compilar_subcadenas(subcadenas):
+    # Un solo patrón que, en cada posición del nombre, reporta la primera subcadena (en orden) que empieza ahí.
+    # El lookahead permite encontrar coincidencias solapadas en una sola pasada.
+    if not subcadenas:
+        return None
+    return re.compile("(?=(" + "|".join(re.escape(subcadena) for subcadena in subcadenas) + "))")
+
+
+class IndiceEnergia:
+    """
+    Índice compilado de la tabla de energía.
+
+    La resolución de un modelo sigue este orden:
+    1. Coincidencia exacta (sin distinguir mayúsculas) con una clave de la tabla.
+    2. La primera clave de la tabla (en su orden) contenida en el nombre del modelo.
+    3. Las REGLAS_RESPALDO, en su orden.
+    4. FACTORES_POR_DEFECTO.
+
+    Args:
+        datos_energia (dict): {"gpt-4": {"electricidad_por_1k_tokens": 0.25, "agua_por_1k_tokens": 0.9}, ...}
+        reglas_respaldo (tuple, opcional): Reglas para modelos que no están en la tabla.
+        por_defecto (tuple, opcional): (kWh, litros) por 1000 tokens si nada coincide.
+    """
 
-    for key, valores in datos_energia.items():
-        if key.lower() in modelo_lower:
+    def __init__(self, datos_energia, reglas_respaldo=REGLAS_RESPALDO, por_defecto=FACTORES_POR_DEFECTO):
+        self._exactos = {}
+        self._factores_tabla = []
+        claves = []
+        for key, valores in datos_energia.items():
             electricidad_por_1k = valores.get("electricidad_por_1k_tokens")
             agua_por_1k = valores.get("agua_por_1k_tokens")
-            break
-
-    if electricidad_por_1k is not None and agua_por_1k is not None:
-        gasto_electricidad = (total_tokens / 1000) * electricidad_por_1k
-        gasto_agua = (total_tokens / 1000) * agua_por_1k
-        return gasto_electricidad, gasto_agua
-    else:
-        # Supuestos para modelos no especificados individualmente
-        if "gpt-4" in modelo_lower or "claude 3 opus" in modelo_lower or "gemini 2.5 pro" in modelo_lower:
-            return (total_tokens / 1000) * 0.25, (total_tokens / 1000) * 0.9
-        elif "gemini pro" in modelo_lower or "claude 3 sonnet" in modelo_lower() or "llama 3.3 70b" in modelo_lower():
-            return (total_tokens / 1000) * 0.1, (total_tokens / 1000) * 0.4
-        elif "mistral large" in modelo_lower or "qwen-max" in modelo_lower or "glm-4-plus" in modelo_lower():
-            return (total_tokens / 1000) * 0.15, (total_tokens / 1000) * 0.6
-        else: # Modelos más pequeños o desconocidos
-            return (total_tokens / 1000) * 0.04, (total_tokens / 1000) * 0.15
+            if electricidad_por_1k is None or agua_por_1k is None:
+                continue
+            clave = key.lower()
+            if clave in self._exactos:
+                continue
+            self._exactos[clave] = (electricidad_por_1k, agua_por_1k)
+            self._factores_tabla.append((electricidad_por_1k, agua_por_1k))
+            claves.append(clave)
+        self._orden_tabla = {clave: i for i, clave in enumerate(claves)}
+        self._patron_tabla = _compilar_subcadenas(claves)
+
+        self._factores_reglas = []
+        self._orden_reglas = {}
+        subcadenas_reglas = []
+        for i, (subcadenas, electricidad_por_1k, agua_por_1k) in enumerate(reglas_respaldo):
+            self._factores_reglas.append((electricidad_por_1k, agua_por_1k))
+            for subcadena in subcadenas:
+                if subcadena not in self._orden_reglas:
+                    self._orden_reglas[subcadena] = i
+                    subcadenas_reglas.append(subcadena)
+        self._patron_reglas = _compilar_subcadenas(subcadenas_reglas)
+        self.por_defecto = tuple(por_defecto)
+        self._memoria = {}
+
+    @staticmethod
+    def _mejor_coincidencia(patron, orden, texto):
+        # Menor orden entre todas las subcadenas presentes en `texto`, o None.
+        if patron is None:
+            return None
+        mejor = None
+        for coincidencia in patron.finditer(texto):
+            posicion = orden[coincidencia.group(1)]
+            if mejor is None or posicion < mejor:
+                mejor = posicion
+                if mejor == 0:
+                    break
+        return mejor
+
+    def _resolver(self, modelo_lower):
+        factores = self._exactos.get(modelo_lower)
+        if factores is not None:
+            return factores
+        posicion = self._mejor_coincidencia(self._patron_tabla, self._orden_tabla, modelo_lower)
+        if posicion is not None:
+            return self._factores_tabla[posicion]
+        regla = self._mejor_coincidencia(self._patron_reglas, self._orden_reglas, modelo_lower)
+        if regla is not None:
+            return self._factores_reglas[regla]
+        return self.por_defecto
+
+    def factores(self, modelo):
+        """
+        Devuelve (kWh por 1000 tokens, litros de agua por 1000 tokens) para el modelo. El resultado se memoriza.
+        """
+        factores = self._memoria.get(modelo)
+        if factores is None:
+            factores = self._resolver(modelo.lower())
+            if len(self._memoria) >= MAX_MODELOS_MEMORIZADOS:
+                self._memoria.clear()
+            self._memoria[modelo] = factores
+        return factores
+
+    def estimar(self, modelo, total_tokens):
+        electricidad_por_1k, agua_por_1k = self.factores(modelo)
+        return (total_tokens / 1000) * electricidad_por_1k, (total_tokens / 1000) * agua_por_1k
+
+    def estimar_vectorizado(self, modelos, total_tokens):
+        """
+        Estima electricidad y agua para N filas (modelo, tokens) como una unión con la tabla de factores:
+        cada nombre de modelo distinto se resuelve una vez y los factores se reparten con un índice.
+
+        Args:
+            modelos (array-like[str]): Modelo de cada fila.
+            total_tokens (array-like): Tokens de cada fila.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: (electricidad en kWh, agua en litros) de cada fila.
+        """
+        # numpy solo hace falta en la versión vectorizada; `estimar` se usa sin cargarlo.
+        import numpy as np
+
+        codigos = {}
+        indices = np.fromiter((codigos.setdefault(modelo, len(codigos)) for modelo in modelos),
+                              dtype=np.int64, count=len(modelos))
+        tabla = np.array([self.factores(modelo) for modelo in codigos], dtype=np.float64).reshape(-1, 2)
+        miles = np.asarray(total_tokens, dtype=np.float64) / 1000
+        return miles * tabla[indices, 0], miles * tabla[indices, 1]
+
+
+# Índices ya compilados por tabla de energía (por identidad del diccionario). Si una tabla se modifica
+# después de usarla, compila un nuevo índice con `compilar_indice_energia` o pasa un IndiceEnergia.
+_INDICES = {}
+
+
+def compilar_indice_energia(datos_energia):
+    """
+    Devuelve el IndiceEnergia de `datos_energia` (compilado la primera vez que se pide para ese diccionario).
+    """
+    if isinstance(datos_energia, IndiceEnergia):
+        return datos_energia
+    entrada = _INDICES.get(id(datos_energia))
+    if entrada is None or entrada[0] is not datos_energia:
+        if len(_INDICES) >= 64:
+            _INDICES.clear()
+        entrada = (datos_energia, IndiceEnergia(datos_energia))
+        _INDICES[id(datos_energia)] = entrada
+    return entrada[1]
+
+
+def estimar_gasto_energetico(modelo, total_tokens, datos_energia):
+    """
+    Estima la electricidad (kWh) y el agua (litros) para `total_tokens` tokens del modelo.
+    `datos_energia` puede ser el diccionario de la tabla de energía o un IndiceEnergia ya compilado.
+    """
+    return compilar_indice_energia(datos_energia).estimar(modelo, total_tokens)
+
+
+def estimar_gasto_energetico_vectorizado(modelos, total_tokens, datos_energia):
+    """
+    Versión vectorizada de `estimar_gasto_energetico` para arreglos de (modelo, tokens).
+    Devuelve dos numpy.ndarray: (electricidad en kWh, agua en litros).
+    """
+    return compilar_indice_energia(datos_energia).estimar_vectorizado(modelos, total_tokens)
 
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
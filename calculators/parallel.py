@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+"""
+Ejecución de tareas en un pool de procesos, conservando el orden de la entrada.
+
+La tokenización de los analizadores basados en Hugging Face o Qwen retiene el GIL durante mucho
+tiempo, así que los hilos no escalan. Aquí cada bloque de trabajo se envía a un proceso:
+
+- En sistemas con fork, los tokenizers se cargan en el proceso padre antes de crear el pool (`precargar`),
+  y los hijos los comparten copia-en-escritura en lugar de cargarlos cada uno.
+- Los resultados se devuelven en el mismo orden que las tareas (`Pool.imap`).
+- Como mucho `max_pendientes` tareas están en vuelo a la vez, para que leer la entrada más rápido de lo
+  que se procesa no acumule bloques en memoria.
+- Se registra el tiempo de cada tarea por proceso para informar del rendimiento de cada trabajador.
+"""
+
+
+class EstadisticasTrabajadores:
+    """
+    Rendimiento de cada proceso trabajador: tareas, filas y tokens procesados, y segundos ocupados.
+    """
+    __slots__ = ("por_trabajador", "inicio")
+
+    def __init__(self):
+        self.por_trabajador = {}
+        self.inicio = time.perf_counter()
+
+    def registrar(self, pid, segundos, filas, tokens):
+        trabajador = self.por_trabajador.setdefault(pid, {"tareas": 0, "filas": 0, "tokens": 0, "segundos": 0.0})
+        trabajador["tareas"] += 1
+        trabajador["filas"] += filas
+        trabajador["tokens"] += tokens
+        trabajador["segundos"] += segundos
+
+    def a_dict(self):
+        """
+        Devuelve {pid: {tareas, filas, tokens, segundos, filas_por_segundo, tokens_por_segundo}} y el tiempo total.
+        """
+        trabajadores = {}
+        for pid, datos in self.por_trabajador.items():
+            segundos = datos["segundos"]
+            trabajadores[str(pid)] = dict(
+                datos,
+                filas_por_segundo=datos["filas"] / segundos if segundos else 0.0,
+                tokens_por_segundo=datos["tokens"] / segundos if segundos else 0.0,
+            )
+        return {"segundos_totales": time.perf_counter() - self.inicio, "trabajadores": trabajadores}
+
+
+def contexto_multiproceso():
+    # fork permite compartir los tokenizers precargados; donde no existe (Windows) se usa spawn.
+    import multiprocessing
+
+    metodo = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(metodo)
+
+
+def _inicializar_trabajador():
+    # Los tokenizers "fast" de Hugging Face paralelizan en Rust; con varios procesos eso solo compite por las CPUs.
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def _ejecutar_tarea(argumentos):
+    funcion, tarea = argumentos
+    inicio = time.perf_counter()
+    resultado = funcion(tarea)
+    return os.getpid(), time.perf_counter() - inicio, resultado
+
+
+def mapear_en_procesos(funcion, tareas, trabajadores, precargar=None, max_pendientes=None):
+    """
+    Aplica `funcion` a cada tarea en `trabajadores` procesos y devuelve los resultados en orden.
+
+    Args:
+        funcion (callable): Función de nivel de módulo (debe poder serializarse con pickle).
+        tareas (iterable): Tareas a procesar; se consumen de forma perezosa.
+        trabajadores (int): Número de procesos.
+        precargar (callable, opcional): Se llama en el proceso padre antes de crear el pool.
+        max_pendientes (int, opcional): Tareas en vuelo como máximo. Por defecto, 2 por trabajador.
+
+    Yields:
+        tuple: (pid del trabajador, segundos que tardó la tarea, resultado), en el orden de `tareas`.
+    """
+    if precargar is not None:
+        precargar()
+    cupos = threading.BoundedSemaphore(max_pendientes or 2 * trabajadores)
+    terminado = threading.Event()
+
+    def tareas_con_cupo():
+        # El hilo que reparte las tareas del pool espera aquí cuando ya hay `max_pendientes` en vuelo.
+        for tarea in tareas:
+            while not cupos.acquire(timeout=0.1):
+                if terminado.is_set():
+                    return
+            yield funcion, tarea
+
+    pool = contexto_multiproceso().Pool(trabajadores, initializer=_inicializar_trabajador)
+    try:
+        for resultado in pool.imap(_ejecutar_tarea, tareas_con_cupo(), chunksize=1):
+            cupos.release()
+            yield resultado
+    finally:
+        # Si el consumidor se detiene antes de tiempo (o falla una tarea), el repartidor no debe quedarse
+        # esperando un cupo: se le avisa antes de terminar el pool, que espera a ese hilo.
+        terminado.set()
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+"""
+Registro numérico con el resultado de analizar un texto con un modelo: tokens, costos, energía y CO2.
+
+Todos los valores se guardan como números; el formato (decimales, unidades) se aplica únicamente al
+mostrar o exportar los resultados con `ResultadoModelo.formatear` o `formato_columnas`. Las columnas coinciden con
+las que esperan las funciones de `src/utils/visualizations.py`.
+"""
+
+COLUMNA_MODELO = "Modelo"
+COLUMNA_TOKENS_ENTRADA = "Tokens Entrada"
+COLUMNA_TOKENS_SALIDA = "Tokens Salida"
+COLUMNA_ELECTRICIDAD = "Electricidad (kWh)"
+COLUMNA_AGUA = "Agua (litros)"
+COLUMNA_CO2 = "CO2 (kg)"
+
+
+def columna_costo_entrada(moneda):
+    return f"Costo Entrada ({moneda})"
+
+
+def columna_costo_salida(moneda):
+    return f"Costo Salida ({moneda})"
+
+
+def columna_costo_total(moneda):
+    return f"Costo Total ({moneda})"
+
+
+def columnas_resultados(moneda="USD"):
+    return [
+        COLUMNA_MODELO, COLUMNA_TOKENS_ENTRADA, COLUMNA_TOKENS_SALIDA,
+        columna_costo_entrada(moneda), columna_costo_salida(moneda), columna_costo_total(moneda),
+        COLUMNA_ELECTRICIDAD, COLUMNA_AGUA, COLUMNA_CO2,
+    ]
+
+
+def formato_columnas(moneda="USD"):
+    """
+    Formato printf de cada columna numérica, para mostrar (p. ej. `st.column_config.NumberColumn`) o exportar.
+    """
+    return {
+        COLUMNA_TOKENS_ENTRADA: "%g",
+        COLUMNA_TOKENS_SALIDA: "%g",
+        columna_costo_entrada(moneda): "%.6f",
+        columna_costo_salida(moneda): "%.6f",
+        columna_costo_total(moneda): "%.6f",
+        COLUMNA_ELECTRICIDAD: "%.4f",
+        COLUMNA_AGUA: "%.4f",
+        COLUMNA_CO2: "%.4f",
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class ResultadoModelo:
+    modelo: str
+    tokens_entrada: float
+    tokens_salida: float
+    costo_entrada: float
+    costo_salida: float
+    costo_total: float
+    electricidad_kwh: float = 0.0
+    agua_litros: float = 0.0
+    co2_kg: float = 0.0
+    moneda: str = "USD"
+    # Parte de la entrada que es un prompt de sistema o un prefijo repetido entre peticiones, y su costo
+    # (ver `calculators.batch.enriquecer_bloque`). No forman parte de la fila de resultados.
+    tokens_prefijo: float = 0.0
+    costo_prefijo: float = 0.0
+
+    @property
+    def total_tokens(self):
+        return self.tokens_entrada + self.tokens_salida
+
+    def a_fila(self):
+        """
+        Devuelve el resultado como diccionario numérico con los nombres de columna de la tabla de resultados.
+        """
+        return dict(zip(columnas_resultados(self.moneda), (
+            self.modelo, self.tokens_entrada, self.tokens_salida,
+            self.costo_entrada, self.costo_salida, self.costo_total,
+            self.electricidad_kwh, self.agua_litros, self.co2_kg,
+        )))
+
+    def formatear(self):
+        """
+        Devuelve la fila con los valores numéricos convertidos a texto según `formato_columnas`.
+        """
+        formatos = formato_columnas(self.moneda)
+        return {
+            columna: (formatos[columna] % valor if columna in formatos else valor)
+            for columna, valor in self.a_fila().items()
+        }
+
+
+def resultados_a_dataframe(resultados, moneda="USD"):
+    """
+    Convierte una lista de ResultadoModelo en un DataFrame de pandas con columnas numéricas.
+    """
+    import pandas as pd
+
+    return pd.DataFrame([resultado.a_fila() for resultado in resultados], columns=columnas_resultados(moneda))
+
+
+if __name__ == "__main__":
+    # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
+    resultado_ejemplo = ResultadoModelo("GPT-4", 1500, 800, 0.003, 0.0064, 0.0094, 0.575, 2.07, 0.25875, "EUR")
+    print(resultado_ejemplo.a_fila())
+    print(resultado_ejemplo.formatear())
@@ -0,0 +1,392 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from calculators.batch import TAMANO_BLOQUE, TotalesAcumulados, enriquecer_bloque
+from calculators.conversation import simular_conversacion
+from src.utils.metrics import exportar_json, exportar_prometheus, metricas_activas
+"""
+Servicio HTTP local de estimación (asyncio, solo biblioteca estándar):
+
+    python -m calculators serve --port 8765
+
+Rutas:
+    POST /estimar        Un registro JSON {"modelo": ..., "prompt": ..., "respuesta": ...}; responde la fila enriquecida.
+    POST /estimar/lote   Registros en NDJSON (uno por línea); responde en streaming una fila NDJSON por registro
+                         y al final una línea {"totales": {...}}.
+    POST /conversacion   {"modelos": [...], "mensajes": [{"rol": ..., "contenido": ...}, ...]} (opcionales "moneda"
+                         y "tokens_por_mensaje"); responde por modelo los tokens, costos y energía de cada turno y
+                         el total (ver `calculators.conversation`), o null si el modelo no tiene precio.
+    GET  /metricas       Peticiones, tamaño medio de los lotes y percentiles de latencia (y, con la
+                         instrumentación de `src.utils.metrics` activa, sus histogramas en "instrumentacion").
+    GET  /metricas/prometheus  La instrumentación en el formato de texto de Prometheus.
+    GET  /salud          {"estado": "ok"}.
+
+Las peticiones a /estimar que llegan dentro de una ventana de `ventana_ms` milisegundos se agrupan en un
+solo bloque (`AgrupadorPeticiones`), así que el tokenizer de cada modelo se llama una vez por lote en lugar
+de una vez por petición. La tokenización se ejecuta en hilos para no bloquear el bucle de eventos.
+"""
+
+VENTANA_POR_DEFECTO_MS = 5
+MAX_LOTE_POR_DEFECTO = 256
+MAX_CUERPO = 10 * 1024 * 1024
+TAMANO_LECTURA = 64 * 1024
+MUESTRAS_LATENCIA = 10_000
+MENSAJES_ESTADO = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class EstadisticasLatencia:
+    """
+    Latencias recientes de una ruta (las últimas `MUESTRAS_LATENCIA`) y número total de peticiones.
+    """
+    __slots__ = ("muestras", "peticiones")
+
+    def __init__(self, maximo=MUESTRAS_LATENCIA):
+        self.muestras = deque(maxlen=maximo)
+        self.peticiones = 0
+
+    def registrar(self, segundos):
+        self.peticiones += 1
+        self.muestras.append(segundos)
+
+    def a_dict(self):
+        if not self.muestras:
+            return {"peticiones": self.peticiones}
+        p50, p90, p99 = np.percentile(np.fromiter(self.muestras, dtype=np.float64), [50, 90, 99]) * 1000
+        return {
+            "peticiones": self.peticiones,
+            "latencia_ms": {"p50": p50, "p90": p90, "p99": p99, "max": max(self.muestras) * 1000},
+        }
+
+
+class AgrupadorPeticiones:
+    """
+    Agrupa los registros que llegan casi a la vez y los enriquece en un solo `enriquecer_bloque`.
+
+    Args:
+        ventana_ms (float, opcional): Cuánto espera el primer registro de un lote a que lleguen otros.
+        max_lote (int, opcional): Registros a partir de los cuales el lote se procesa sin esperar.
+        **opciones: Argumentos de `enriquecer_bloque` (columnas, modelo_por_defecto, moneda).
+    """
+
+    def __init__(self, ventana_ms=VENTANA_POR_DEFECTO_MS, max_lote=MAX_LOTE_POR_DEFECTO, **opciones):
+        self.ventana = ventana_ms / 1000
+        self.max_lote = max_lote
+        self.opciones = opciones
+        self._pendientes = []
+        self._temporizador = None
+        self._tareas = set()
+        self.lotes = 0
+        self.registros = 0
+
+    async def enviar(self, registro):
+        """
+        Añade el registro al lote en curso y espera su resultado: (fila, ResultadoModelo o None).
+        """
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendientes.append((registro, futuro))
+        if len(self._pendientes) >= self.max_lote:
+            self._despachar()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.ventana, self._despachar)
+        return await futuro
+
+    def _despachar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        pendientes, self._pendientes = self._pendientes, []
+        if pendientes:
+            self.lotes += 1
+            self.registros += len(pendientes)
+            tarea = asyncio.get_running_loop().create_task(self._procesar(pendientes))
+            # Se guarda una referencia para que la tarea no se recolecte antes de terminar.
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+
+    async def _procesar(self, pendientes):
+        registros = [registro for registro, _ in pendientes]
+        try:
+            enriquecidas = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: enriquecer_bloque(registros, **self.opciones)
+            )
+        except Exception as e:
+            for _, futuro in pendientes:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for (_, futuro), enriquecida in zip(pendientes, enriquecidas):
+            if not futuro.done():
+                futuro.set_result(enriquecida)
+
+    def a_dict(self):
+        return {
+            "lotes": self.lotes,
+            "registros": self.registros,
+            "registros_por_lote": self.registros / self.lotes if self.lotes else 0.0,
+        }
+
+
+async def _leer_cabeceras(lector):
+    linea = await lector.readline()
+    if not linea:
+        return None
+    try:
+        metodo, ruta, _ = linea.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ErrorHTTP(400, "Línea de petición inválida")
+    cabeceras = {}
+    while True:
+        linea = await lector.readline()
+        if linea in (b"\r\n", b"\n", b""):
+            break
+        nombre, _, valor = linea.decode("latin-1").partition(":")
+        cabeceras[nombre.strip().lower()] = valor.strip()
+    return metodo.upper(), ruta.split("?", 1)[0], cabeceras
+
+
+async def _fragmentos_cuerpo(lector, cabeceras):
+    # Devuelve el cuerpo de la petición por fragmentos, con Content-Length o con Transfer-Encoding: chunked.
+    if "chunked" in cabeceras.get("transfer-encoding", "").lower():
+        while True:
+            tamano = int((await lector.readline()).split(b";", 1)[0].strip() or b"0", 16)
+            if tamano == 0:
+                while (await lector.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            yield await lector.readexactly(tamano)
+            await lector.readline()
+    else:
+        restante = int(cabeceras.get("content-length", "0"))
+        while restante > 0:
+            fragmento = await lector.readexactly(min(TAMANO_LECTURA, restante))
+            restante -= len(fragmento)
+            yield fragmento
+
+
+async def _leer_cuerpo(lector, cabeceras):
+    partes = []
+    tamano = 0
+    async for fragmento in _fragmentos_cuerpo(lector, cabeceras):
+        tamano += len(fragmento)
+        if tamano > MAX_CUERPO:
+            raise ErrorHTTP(413, f"El cuerpo supera {MAX_CUERPO} bytes; usa /estimar/lote")
+        partes.append(fragmento)
+    return b"".join(partes)
+
+
+async def _lineas_cuerpo(lector, cabeceras):
+    resto = b""
+    async for fragmento in _fragmentos_cuerpo(lector, cabeceras):
+        lineas = (resto + fragmento).split(b"\n")
+        resto = lineas.pop()
+        for linea in lineas:
+            yield linea
+    if resto:
+        yield resto
+
+
+def _registro_json(datos):
+    try:
+        registro = json.loads(datos)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ErrorHTTP(400, f"JSON inválido: {e}")
+    if not isinstance(registro, dict):
+        raise ErrorHTTP(400, "Se esperaba un objeto JSON")
+    return registro
+
+
+class ServicioEstimacion:
+    """
+    Servicio HTTP de estimación. `iniciar(host, puerto)` devuelve el `asyncio.Server` ya escuchando.
+
+    Args:
+        ventana_ms (float, opcional): Ventana de agrupación de peticiones a /estimar.
+        max_lote (int, opcional): Tamaño máximo de un lote agrupado.
+        tamano_bloque (int, opcional): Filas que se tokenizan juntas en /estimar/lote.
+        **opciones: Argumentos de `enriquecer_bloque` (columnas, modelo_por_defecto, moneda).
+    """
+
+    def __init__(self, ventana_ms=VENTANA_POR_DEFECTO_MS, max_lote=MAX_LOTE_POR_DEFECTO, tamano_bloque=TAMANO_BLOQUE,
+                 **opciones):
+        self.opciones = opciones
+        self.tamano_bloque = tamano_bloque
+        self.agrupador = AgrupadorPeticiones(ventana_ms, max_lote, **opciones)
+        self.latencias = {"/estimar": EstadisticasLatencia(), "/estimar/lote": EstadisticasLatencia(),
+                          "/conversacion": EstadisticasLatencia()}
+
+    async def iniciar(self, host="127.0.0.1", puerto=8765):
+        return await asyncio.start_server(self._atender_conexion, host, puerto)
+
+    def metricas(self):
+        metricas = {
+            "rutas": {ruta: estadisticas.a_dict() for ruta, estadisticas in self.latencias.items()},
+            "agrupacion": self.agrupador.a_dict(),
+        }
+        if metricas_activas():
+            metricas["instrumentacion"] = exportar_json()
+        return metricas
+
+    async def _atender_conexion(self, lector, escritor):
+        try:
+            while True:
+                try:
+                    peticion = await _leer_cabeceras(lector)
+                    if peticion is None:
+                        break
+                    metodo, ruta, cabeceras = peticion
+                    inicio = time.perf_counter()
+                    cerrar = await self._atender(metodo, ruta, cabeceras, lector, escritor)
+                    if ruta in self.latencias:
+                        self.latencias[ruta].registrar(time.perf_counter() - inicio)
+                    if cerrar:
+                        break
+                except ErrorHTTP as e:
+                    await self._responder_json(escritor, e.estado, {"error": str(e)}, cerrar=True)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    await self._responder_json(escritor, 500, {"error": f"{type(e).__name__}: {e}"}, cerrar=True)
+                    break
+                if cabeceras.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _atender(self, metodo, ruta, cabeceras, lector, escritor):
+        if ruta == "/salud":
+            await self._responder_json(escritor, 200, {"estado": "ok"})
+        elif ruta == "/metricas":
+            await self._responder_json(escritor, 200, self.metricas())
+        elif ruta == "/metricas/prometheus":
+            await self._responder(escritor, 200, exportar_prometheus().encode("utf-8"),
+                                  "text/plain; version=0.0.4; charset=utf-8")
+        elif ruta in ("/estimar", "/estimar/lote", "/conversacion"):
+            if metodo != "POST":
+                await _leer_cuerpo(lector, cabeceras)
+                raise ErrorHTTP(405, f"{ruta} solo acepta POST")
+            if ruta == "/estimar":
+                registro = _registro_json(await _leer_cuerpo(lector, cabeceras))
+                fila, _ = await self.agrupador.enviar(registro)
+                await self._responder_json(escritor, 200, fila)
+            elif ruta == "/conversacion":
+                peticion = _registro_json(await _leer_cuerpo(lector, cabeceras))
+                await self._responder_json(escritor, 200, await self._simular_conversacion(peticion))
+            else:
+                return await self._estimar_lote(cabeceras, lector, escritor)
+        else:
+            await _leer_cuerpo(lector, cabeceras)
+            raise ErrorHTTP(404, f"Ruta desconocida: {ruta}")
+
+    async def _simular_conversacion(self, peticion):
+        mensajes, modelos = peticion.get("mensajes", peticion.get("messages")), peticion.get("modelos")
+        if not isinstance(mensajes, list) or not isinstance(modelos, list) or not modelos:
+            raise ErrorHTTP(400, "Se esperaban las listas \"mensajes\" y \"modelos\"")
+        moneda = peticion.get("moneda", self.opciones.get("moneda", "USD"))
+        tokens_por_mensaje = peticion.get("tokens_por_mensaje", 0)
+        if not isinstance(tokens_por_mensaje, int) or tokens_por_mensaje < 0:
+            raise ErrorHTTP(400, "\"tokens_por_mensaje\" debe ser un entero no negativo")
+        try:
+            simulaciones = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: simular_conversacion(mensajes, [str(modelo) for modelo in modelos], moneda,
+                                                   tokens_por_mensaje))
+        except ValueError as e:
+            raise ErrorHTTP(400, str(e))
+        return {
+            "moneda": moneda,
+            "modelos": {modelo: None if simulacion is None else simulacion.a_dict()
+                        for modelo, simulacion in simulaciones.items()},
+        }
+
+    async def _estimar_lote(self, cabeceras, lector, escritor):
+        # Lee los registros NDJSON a medida que llegan y responde cada bloque en cuanto está enriquecido.
+        # Devuelve True si hay que cerrar la conexión: tras un error puede quedar cuerpo sin leer.
+        loop = asyncio.get_running_loop()
+        totales = TotalesAcumulados(self.opciones.get("moneda", "USD"))
+        escritor.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+
+        async def enviar_bloque(bloque):
+            enriquecidas = await loop.run_in_executor(None, lambda: enriquecer_bloque(bloque, **self.opciones))
+            lineas = []
+            for fila, resultado in enriquecidas:
+                if resultado is None:
+                    totales.agregar_sin_precio()
+                else:
+                    totales.agregar(resultado)
+                lineas.append(json.dumps(fila, ensure_ascii=False))
+            self._escribir_fragmento(escritor, "\n".join(lineas) + "\n")
+            await escritor.drain()
+
+        bloque = []
+        try:
+            async for linea in _lineas_cuerpo(lector, cabeceras):
+                if not linea.strip():
+                    continue
+                bloque.append(_registro_json(linea))
+                if len(bloque) >= self.tamano_bloque:
+                    await enviar_bloque(bloque)
+                    bloque = []
+            if bloque:
+                await enviar_bloque(bloque)
+            final = {"totales": totales.a_dict()}
+            error = None
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as e:
+            # Las cabeceras ya se enviaron: el error se informa como última línea del stream y no como otra
+            # respuesta HTTP dentro del cuerpo.
+            error = str(e) if isinstance(e, ErrorHTTP) else f"{type(e).__name__}: {e}"
+            final = {"error": error, "totales": totales.a_dict()}
+        self._escribir_fragmento(escritor, json.dumps(final, ensure_ascii=False) + "\n")
+        escritor.write(b"0\r\n\r\n")
+        await escritor.drain()
+        return error is not None
+
+    @staticmethod
+    def _escribir_fragmento(escritor, texto):
+        datos = texto.encode("utf-8")
+        escritor.write(f"{len(datos):X}\r\n".encode("ascii") + datos + b"\r\n")
+
+    @staticmethod
+    async def _responder(escritor, estado, cuerpo, tipo, cerrar=False):
+        cabeceras = (
+            f"HTTP/1.1 {estado} {MENSAJES_ESTADO.get(estado, '')}\r\n"
+            f"Content-Type: {tipo}\r\nContent-Length: {len(cuerpo)}\r\n"
+            + ("Connection: close\r\n" if cerrar else "")
+            + "\r\n"
+        )
+        escritor.write(cabeceras.encode("latin-1") + cuerpo)
+        await escritor.drain()
+
+    @classmethod
+    async def _responder_json(cls, escritor, estado, datos, cerrar=False):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        await cls._responder(escritor, estado, cuerpo, "application/json; charset=utf-8", cerrar)
+
+
+async def servir(host="127.0.0.1", puerto=8765, **opciones):
+    """
+    Inicia el servicio y lo mantiene en marcha hasta que se interrumpa.
+    """
+    servicio = ServicioEstimacion(**opciones)
+    servidor = await servicio.iniciar(host, puerto)
+    direcciones = ", ".join(str(socket.getsockname()) for socket in servidor.sockets)
+    print(f"Servicio de estimación escuchando en {direcciones}", flush=True)
+    async with servidor:
+        await servidor.serve_forever()
@@ -1,14 +1,25 @@
-import json
+from dataclasses import dataclass
 """
-Esta función calcula el costo estimado de tokens de entrada y salida para un modelo específico.
-Los costos se calculan en función de las tarifas por 1000 tokens para cada modelo.
-Args:
-    tokens_entrada (int): Número de tokens en el prompt de entrada.
-    tokens_salida (int): Número de tokens en la salida generada.
-    modelo (str): Nombre del modelo de lenguaje.
-    precios_modelos (dict): Diccionario con las tarifas por 1000 tokens para cada modelo.
+Costo numérico de una petición. Los valores se guardan como float y solo se convierten en texto
+al mostrarlos o exportarlos (`formatear`), para poder sumarlos, ordenarlos y graficarlos directamente.
 """
-def calcular_costo_tokens(tokens_entrada, tokens_salida, modelo, precios_modelos, moneda="USD"):
+@dataclass(frozen=True, slots=True)
+class CostoTokens:
+    costo_entrada: float
+    costo_salida: float
+    costo_total: float
+
+    def formatear(self, moneda="USD"):
+        return {
+            f"costo_entrada_{moneda}": f"{self.costo_entrada:.6f}",
+            f"costo_salida_{moneda}": f"{self.costo_salida:.6f}",
+            f"costo_total_{moneda}": f"{self.costo_total:.6f}"
+        }
+"""
+Igual que `calcular_costo_tokens`, pero devuelve un CostoTokens con valores numéricos
+(o None si el modelo no está en `precios_modelos`).
+"""
+def calcular_costo_tokens_numerico(tokens_entrada, tokens_salida, modelo, precios_modelos):
 
     if modelo not in precios_modelos:
         return None
@@ -18,13 +29,22 @@ def calcular_costo_tokens(tokens_entrada, tokens_salida, modelo, precios_modelos
 
     costo_entrada = (tokens_entrada / 1000) * tarifa_entrada
     costo_salida = (tokens_salida / 1000) * tarifa_salida
-    costo_total = costo_entrada + costo_salida
+    return CostoTokens(costo_entrada, costo_salida, costo_entrada + costo_salida)
+"""
+Esta función calcula el costo estimado de tokens de entrada y salida para un modelo específico.
+Los costos se calculan en función de las tarifas por 1000 tokens para cada modelo.
+Args:
+    tokens_entrada (int): Número de tokens en el prompt de entrada.
+    tokens_salida (int): Número de tokens en la salida generada.
+    modelo (str): Nombre del modelo de lenguaje.
+    precios_modelos (dict): Diccionario con las tarifas por 1000 tokens para cada modelo.
+"""
+def calcular_costo_tokens(tokens_entrada, tokens_salida, modelo, precios_modelos, moneda="USD"):
 
-    return {
-        f"costo_entrada_{moneda}": f"{costo_entrada:.6f}",
-        f"costo_salida_{moneda}": f"{costo_salida:.6f}",
-        f"costo_total_{moneda}": f"{costo_total:.6f}"
-    }
+    costo = calcular_costo_tokens_numerico(tokens_entrada, tokens_salida, modelo, precios_modelos)
+    if costo is None:
+        return None
+    return costo.formatear(moneda)
 
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
@@ -6,12 +6,18 @@ Este módulo contendrá funciones específicas para analizar texto con modelos d
 Alibaba Qwen utiliza una tokenización BPE y el paquete `qwen-tokenizer` está disponible.
 """
 
-try:
-    from qwen_tokenizer import QwenTokenizer
-    HAVE_QWEN_TOKENIZER = True
-except ImportError:
-    HAVE_QWEN_TOKENIZER = False
-    print("Advertencia: La librería `qwen-tokenizer` no está instalada. Se usará una estimación basada en palabras.")
+import importlib.util
+import sys
+
+from src.utils.token_cache import version_paquete
+from src.utils.token_estimator import estimar_tokens
+from src.utils.tokenizer_pool import obtener_tokenizer_qwen
+from src.utils.tokenizers import contar_tokens_fragmentando, contar_tokens_funcion_batch
+
+# Solo se comprueba que el paquete existe; se importa al crear la instancia compartida en el pool de tokenizers.
+HAVE_QWEN_TOKENIZER = importlib.util.find_spec("qwen_tokenizer") is not None
+if not HAVE_QWEN_TOKENIZER:
+    print("Advertencia: La librería `qwen-tokenizer` no está instalada. Se usará una estimación por clases de caracteres.", file=sys.stderr)
 
 def contar_tokens_qwen(texto):
     """
@@ -24,11 +30,24 @@ def contar_tokens_qwen(texto):
         int: El número de tokens en el texto. Devuelve None si la librería no está instalada.
     """
     if HAVE_QWEN_TOKENIZER:
-        tokenizer = QwenTokenizer()
-        return len(tokenizer.encode(texto))
+        tokenizer = obtener_tokenizer_qwen()
+        return contar_tokens_fragmentando(tokenizer.encode, texto, identidad=("qwen:QwenTokenizer", version_paquete("qwen-tokenizer")))
     else:
-        # Estimación basada en palabras si la librería no está instalada
-        return int(len(texto.split()) * 0.8) if texto else 0  # Un factor ligeramente diferente
+        # Estimación por clases de caracteres si la librería no está instalada
+        return estimar_tokens(texto, "alibaba")
+
+def contar_tokens_qwen_batch(textos):
+    """
+    Versión por lotes de `contar_tokens_qwen`. `qwen-tokenizer` no ofrece una API por lotes,
+    así que se reutiliza el tokenizer compartido del pool para todos los textos.
+
+    Args:
+        textos (iterable[str]): Lista o iterador de textos.
+
+    Returns:
+        numpy.ndarray: El número de tokens de cada texto, en el mismo orden que la entrada.
+    """
+    return contar_tokens_funcion_batch(contar_tokens_qwen, textos)
 
 def calcular_costo_qwen(tokens_entrada, tokens_salida, modelo, precios_modelos, moneda="USD"):
     """
@@ -64,11 +83,9 @@ def calcular_costo_qwen(tokens_entrada, tokens_salida, modelo, precios_modelos,
 
 if __name__ == "__main__":
     # Ejemplo de uso
-    precios_qwen_ejemplo = {
-        "Qwen-Max": {"entrada": 0.0016, "salida": 0.0064},
-        "Qwen-Plus": {"entrada": 0.0004, "salida": 0.0012},
-        "Qwen-Turbo": {"entrada": 0.00005, "salida": 0.0002},
-    }
+    from calculators.catalog import obtener_catalogo
+
+    precios_qwen_ejemplo = obtener_catalogo().precios
 
     texto_entrada_qwen = "¿Cuál es la capital de China?"
     texto_salida_qwen = "La capital de China es Beijing."
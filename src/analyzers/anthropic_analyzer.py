@@ -13,8 +13,37 @@ ya que algunos modelos de Anthropic tienen codificaciones similares.
 """
 #librerias
 
-import tiktoken
-import json
+from src.utils.token_estimator import estimar_tokens
+from src.utils.tokenizer_pool import obtener_encoding
+from src.utils.tokenizers import (NUM_HILOS_BATCH, contar_tokens_encoding, contar_tokens_encoding_batch,
+                                  contar_tokens_funcion_batch)
+
+def _encoding_anthropic(modelo):
+    # Selecciona la codificación de tiktoken usada como aproximación; lanza KeyError/ValueError si no existe.
+    if "claude-3" in modelo.lower():
+        # Claude 3 utiliza una codificación similar a cl100k_base
+        return obtener_encoding("cl100k_base")
+    elif "claude-2" in modelo.lower():
+        # Claude 2 podría usar una codificación diferente
+        # Esto es una suposición y podría no ser exacto
+        return obtener_encoding("oa2")
+    else:
+        # Intenta con una codificación genérica
+        return obtener_encoding("utf-8")
+
+def _estimar_tokens_sin_tokenizer(texto):
+    return estimar_tokens(texto, "anthropic") # Último recurso: estimación por clases de caracteres
+
+def usa_encoding(modelo):
+    """
+    Indica si el modelo se cuenta con una codificación de tiktoken o, porque no está disponible, con
+    `estimar_tokens`.
+    """
+    try:
+        _encoding_anthropic(modelo)
+    except (KeyError, ValueError):
+        return False
+    return True
 
 def contar_tokens_anthropic(texto, modelo):
     """
@@ -30,19 +59,29 @@ def contar_tokens_anthropic(texto, modelo):
         int: Una estimación del número de tokens.
     """
     try:
-        if "claude-3" in modelo.lower():
-            # Claude 3 utiliza una codificación similar a cl100k_base
-            encoding = tiktoken.get_encoding("cl100k_base")
-        elif "claude-2" in modelo.lower():
-            # Claude 2 podría usar una codificación diferente
-            # Esto es una suposición y podría no ser exacto
-            encoding = tiktoken.get_encoding("oa2")
-        else:
-            # Intenta con una codificación genérica
-            encoding = tiktoken.get_encoding("utf-8")
-        return len(encoding.encode(texto))
-    except KeyError:
-        return int(len(texto.split()) * 0.8) if texto else 0 # Último recurso: estimación por palabras
+        encoding = _encoding_anthropic(modelo)
+        return contar_tokens_encoding(encoding, texto)
+    except (KeyError, ValueError):
+        return _estimar_tokens_sin_tokenizer(texto)
+
+def contar_tokens_anthropic_batch(textos, modelo, num_hilos=NUM_HILOS_BATCH):
+    """
+    Versión por lotes de `contar_tokens_anthropic`: codifica muchos textos a la vez con
+    `encode_ordinary_batch` de tiktoken usando varios hilos.
+
+    Args:
+        textos (iterable[str]): Lista o iterador de textos.
+        modelo (str): El nombre del modelo.
+        num_hilos (int, opcional): Hilos usados por tiktoken. Por defecto, el número de CPUs.
+
+    Returns:
+        numpy.ndarray: Una estimación del número de tokens por texto, en el mismo orden que la entrada.
+    """
+    try:
+        encoding = _encoding_anthropic(modelo)
+    except (KeyError, ValueError):
+        return contar_tokens_funcion_batch(_estimar_tokens_sin_tokenizer, textos)
+    return contar_tokens_encoding_batch(encoding, textos, num_hilos)
 
 def calcular_costo_anthropic(tokens_entrada, tokens_salida, modelo, precios_modelos, moneda="USD"):
     """
@@ -79,11 +118,9 @@ def calcular_costo_anthropic(tokens_entrada, tokens_salida, modelo, precios_mode
 
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
-    precios_anthropic_ejemplo = {
-        "Claude 3 Opus": {"entrada": 0.015, "salida": 0.075},
-        "Claude 3 Sonnet": {"entrada": 0.003, "salida": 0.015},
-        "Claude 3 Haiku": {"entrada": 0.00025, "salida": 0.00125},
-    }
+    from calculators.catalog import obtener_catalogo
+
+    precios_anthropic_ejemplo = obtener_catalogo().precios
 
     texto_entrada_claude = "¿Qué tres cosas son necesarias para sobrevivir?"
     texto_salida_claude_opus = "Tres cosas necesarias para sobrevivir son agua, comida y refugio."
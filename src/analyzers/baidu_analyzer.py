@@ -7,24 +7,57 @@ pero para una implementación más directa, podemos intentar usar la librería `
 de Hugging Face, que tiene soporte para varios modelos ERNIE.
 """
 
-try:
-    from transformers import AutoTokenizer
-    HAVE_TRANSFORMERS = True
-    ERNIE_TOKENIZER_MAPPING = {
-        "ERNIE 4.5": "nghuyong/ernie-3.0-base-zh",  # Ejemplo: puede necesitar ajuste
-        "ERNIE X1": "nghuyong/ernie-3.0-base-zh",     # Ejemplo: puede necesitar ajuste
-        # Añadir otros modelos ERNIE y sus tokenizers correspondientes si es necesario
-    }
-    TOKENIZERS = {}
-    for model_name, tokenizer_name in ERNIE_TOKENIZER_MAPPING.items():
-        try:
-            TOKENIZERS[model_name] = AutoTokenizer.from_pretrained(tokenizer_name)
-        except Exception as e:
-            print(f"Advertencia: No se pudo cargar el tokenizer para {model_name} ({tokenizer_name}): {e}")
-            TOKENIZERS[model_name] = None
-except ImportError:
-    HAVE_TRANSFORMERS = False
-    print("Advertencia: La librería `transformers` no está instalada. Se usará una estimación basada en palabras.")
+import importlib.util
+import sys
+
+from src.utils.token_estimator import estimar_tokens
+from src.utils.tokenizer_pool import ejecutar_precarga, obtener_tokenizer_hf
+from src.utils.tokenizers import contar_tokens_funcion_batch, contar_tokens_hf, contar_tokens_hf_batch
+
+# Los tokenizers se cargan en el primer uso (o con `precargar_tokenizers_ernie`), no al importar el módulo.
+ERNIE_TOKENIZER_MAPPING = {
+    "ERNIE 4.5": "nghuyong/ernie-3.0-base-zh",  # Ejemplo: puede necesitar ajuste
+    "ERNIE X1": "nghuyong/ernie-3.0-base-zh",     # Ejemplo: puede necesitar ajuste
+    # Añadir otros modelos ERNIE y sus tokenizers correspondientes si es necesario
+}
+TOKENIZERS_FALLIDOS = set()
+
+HAVE_TRANSFORMERS = importlib.util.find_spec("transformers") is not None
+if not HAVE_TRANSFORMERS:
+    print("Advertencia: La librería `transformers` no está instalada. Se usará una estimación por clases de caracteres.", file=sys.stderr)
+
+def _obtener_tokenizer(modelo):
+    # Busca el tokenizer en el pool compartido; None si no hay `transformers` o no se pudo cargar.
+    if not HAVE_TRANSFORMERS or modelo not in ERNIE_TOKENIZER_MAPPING:
+        return None
+    tokenizer_name = ERNIE_TOKENIZER_MAPPING[modelo]
+    if tokenizer_name in TOKENIZERS_FALLIDOS:
+        return None
+    try:
+        return obtener_tokenizer_hf(tokenizer_name)
+    except Exception as e:
+        print(f"Advertencia: No se pudo cargar el tokenizer para {modelo} ({tokenizer_name}): {e}", file=sys.stderr)
+        TOKENIZERS_FALLIDOS.add(tokenizer_name)
+        return None
+
+def precargar_tokenizers_ernie(en_segundo_plano=True):
+    """
+    Carga por adelantado en el pool los tokenizers de todos los modelos ERNIE mapeados.
+
+    Args:
+        en_segundo_plano (bool, opcional): Si es True (por defecto) la carga se hace en un hilo daemon.
+
+    Returns:
+        threading.Thread: El hilo de precarga, o None si se ejecutó de forma síncrona.
+    """
+    def precargar():
+        for modelo in ERNIE_TOKENIZER_MAPPING:
+            _obtener_tokenizer(modelo)
+
+    return ejecutar_precarga(precargar, en_segundo_plano)
+
+def _estimar_tokens_sin_tokenizer(texto):
+    return estimar_tokens(texto, "baidu") # Un token por carácter chino, como WordPiece
 
 def contar_tokens_ernie(texto, modelo):
     """
@@ -38,11 +71,29 @@ def contar_tokens_ernie(texto, modelo):
         int: El número de tokens en el texto. Devuelve None si la librería no está instalada
              o no se encuentra el tokenizer para el modelo.
     """
-    if HAVE_TRANSFORMERS and modelo in TOKENIZERS and TOKENIZERS[modelo] is not None:
-        return len(TOKENIZERS[modelo].encode(texto))
+    tokenizer = _obtener_tokenizer(modelo)
+    if tokenizer is not None:
+        return contar_tokens_hf(tokenizer, texto)
     else:
-        # Estimación basada en palabras si la librería no está instalada o el tokenizer no se cargó
-        return int(len(texto.split()) * 0.9) if texto else 0 # Otro factor de estimación
+        # Estimación por clases de caracteres si la librería no está instalada o el tokenizer no se cargó
+        return _estimar_tokens_sin_tokenizer(texto)
+
+def contar_tokens_ernie_batch(textos, modelo):
+    """
+    Versión por lotes de `contar_tokens_ernie`: pasa los textos en bloques al tokenizer "fast"
+    de Hugging Face, que los codifica en paralelo.
+
+    Args:
+        textos (iterable[str]): Lista o iterador de textos.
+        modelo (str): El nombre del modelo (ej. "ERNIE 4.5").
+
+    Returns:
+        numpy.ndarray: El número de tokens de cada texto, en el mismo orden que la entrada.
+    """
+    tokenizer = _obtener_tokenizer(modelo)
+    if tokenizer is None:
+        return contar_tokens_funcion_batch(_estimar_tokens_sin_tokenizer, textos)
+    return contar_tokens_hf_batch(tokenizer, textos)
 
 def calcular_costo_ernie(tokens_entrada, tokens_salida, modelo, precios_modelos, moneda="USD"):
     """
@@ -79,10 +130,9 @@ def calcular_costo_ernie(tokens_entrada, tokens_salida, modelo, precios_modelos,
 
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
-    precios_ernie_ejemplo = {
-        "ERNIE 4.5": {"entrada": 0.00055, "salida": 0.0022},
-        "ERNIE X1": {"entrada": 0.00028, "salida": 0.0011},
-    }
+    from calculators.catalog import obtener_catalogo
+
+    precios_ernie_ejemplo = obtener_catalogo().precios
 
     texto_entrada_ernie = "¿Cuál es la capital de China?"
     texto_salida_ernie = "中国的首都是北京。"
@@ -114,6 +164,6 @@ if __name__ == "__main__":
 NOTA IMPORTANTE: Para una implementación precisa con modelos de Baidu ERNIE,
 se recomienda investigar y utilizar la librería oficial `erniebot` de Baidu
 o la librería `transformers` de Hugging Face con la configuración correcta
-para los modelos ERNIE específicos. La tokenización basada en palabras es una aproximación.
+para los modelos ERNIE específicos. La estimación por clases de caracteres es una aproximación.
 
 """
\ No newline at end of file
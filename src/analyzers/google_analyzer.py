@@ -6,20 +6,27 @@ Este módulo incluye funciones para contar tokens y calcular costos estimados de
 
 Por el momento, no hay una librería de tokenización específica de Google AI fácil de usar
 como `tiktoken` para OpenAI. La API de Gemini tiene métodos para contar tokens,
-pero para una implementación local, podríamos usar una aproximación basada en palabras
-o investigar librerías como SentencePiece que Google utiliza internamente.
+pero para una implementación local usamos una aproximación por clases de caracteres
+(`src/utils/token_estimator.py`). Más adelante se podría investigar SentencePiece, que Google utiliza internamente.
 """
 #libreria
-import tiktoken
+from src.utils.token_estimator import estimar_tokens, estimar_tokens_batch
 """
-Esta función estima el número de tokens en un texto para modelos de Google (aproximación basada en palabras).
+Esta función estima el número de tokens en un texto para modelos de Google (aproximación por clases de caracteres).
 """
 def contar_tokens_google(texto):
 
-    # Una aproximación simple es dividir el número de palabras por un factor (ej: 0.75).
-    # Esto se basa en la heurística de que en promedio, un token es ~0.75 palabras en inglés.
-    # Para otros idiomas, este factor podría variar.
-    return int(len(texto.split()) * 0.75) if texto else 0
+    # El tokenizer de Gemini tiene un vocabulario grande y multilingüe, como o200k_base, así que se usan
+    # sus coeficientes (ver `src/utils/token_estimator.py`). A diferencia de contar palabras, esto
+    # también cuenta bien el chino o el japonés, que no separan las palabras con espacios.
+    return estimar_tokens(texto, "google")
+"""
+Versión por lotes de `contar_tokens_google`: recibe una lista o un iterador de textos
+y devuelve un numpy.ndarray con la estimación de tokens de cada uno.
+"""
+def contar_tokens_google_batch(textos):
+
+    return estimar_tokens_batch(textos, "google")
 """
 Esta funcion estima el costo de tokens de entrada y salida para un modelo de Google.
 Los costos se calculan en función de las tarifas por 1000 tokens para cada modelo.
@@ -44,11 +51,9 @@ def calcular_costo_google(tokens_entrada, tokens_salida, modelo, precios_modelos
 
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
-    precios_google_ejemplo = {
-        "Gemini 2.5 Pro Preview": {"entrada": 0.00125, "salida": 0.01},
-        "Gemini 1.5 Flash": {"entrada": 0.000075, "salida": 0.0003},
-        "Gemini 2.0 Flash-Lite": {"entrada": 0.000075, "salida": 0.0003},
-    }
+    from calculators.catalog import obtener_catalogo
+
+    precios_google_ejemplo = obtener_catalogo().precios
 
     texto_entrada_google = "Explica la teoría de la relatividad en dos frases."
     texto_salida_google = "La teoría de la relatividad especial describe cómo el espacio y el tiempo están entrelazados para objetos que se mueven a velocidades constantes. La teoría de la relatividad general explica cómo la gravedad es la curvatura del espacio-tiempo causada por la masa y la energía."
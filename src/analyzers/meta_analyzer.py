@@ -0,0 +1,58 @@
+"""
+Este módulo contiene funciones para estimar tokens con modelos de Meta (Llama).
+¡Ojo! Es una aproximación local.
+
+El tokenizer de Llama 3 está construido sobre `tiktoken`: su vocabulario de 128k tokens
+incluye los 100k de `cl100k_base` más 28k tokens adicionales (sobre todo de otros idiomas).
+Por eso usamos `cl100k_base` como aproximación; para textos que no están en inglés
+el conteo real puede ser algo menor.
+"""
+#librerias
+
+from src.utils.token_estimator import estimar_tokens
+from src.utils.tokenizer_pool import obtener_encoding
+from src.utils.tokenizers import (NUM_HILOS_BATCH, contar_tokens_encoding, contar_tokens_encoding_batch,
+                                  contar_tokens_funcion_batch)
+
+def _estimar_tokens_sin_tokenizer(texto):
+    return estimar_tokens(texto, "meta") # Estimación por clases de caracteres
+
+def usa_encoding(modelo):
+    """
+    Indica si el modelo se cuenta con una codificación de tiktoken o, porque no está disponible, con
+    `estimar_tokens`.
+    """
+    try:
+        obtener_encoding("cl100k_base")
+    except (KeyError, ValueError):
+        return False
+    return True
+
+def contar_tokens_llama(texto, modelo):
+    """
+    Estima el número de tokens de un texto para modelos Llama.
+
+    Args:
+        texto (str): El texto para tokenizar.
+        modelo (str): El nombre del modelo (ej. "llama-3.1-8b"). Todos los Llama 3 comparten tokenizer.
+
+    Returns:
+        int: Una estimación del número de tokens.
+    """
+    try:
+        return contar_tokens_encoding(obtener_encoding("cl100k_base"), texto)
+    except (KeyError, ValueError):
+        return _estimar_tokens_sin_tokenizer(texto)
+
+def contar_tokens_llama_batch(textos, modelo, num_hilos=NUM_HILOS_BATCH):
+    """
+    Versión por lotes de `contar_tokens_llama`.
+
+    Returns:
+        numpy.ndarray: Una estimación del número de tokens por texto, en el mismo orden que la entrada.
+    """
+    try:
+        encoding = obtener_encoding("cl100k_base")
+    except (KeyError, ValueError):
+        return contar_tokens_funcion_batch(_estimar_tokens_sin_tokenizer, textos)
+    return contar_tokens_encoding_batch(encoding, textos, num_hilos)
@@ -7,24 +7,57 @@ Mistral AI utiliza una tokenización basada en SentencePiece.
 La librería `transformers` de Hugging Face proporciona tokenizers para los modelos Mistral.
 """
 
-try:
-    from transformers import AutoTokenizer
-    HAVE_TRANSFORMERS = True
-    MISTRAL_TOKENIZER_MAPPING = {
-        "Mistral Large": "mistralai/Mistral-large-latest",
-        "Codestral": "mistralai/Codestral",
-        # Añadir otros modelos de Mistral si es necesario
-    }
-    TOKENIZERS = {}
-    for model_name, tokenizer_name in MISTRAL_TOKENIZER_MAPPING.items():
-        try:
-            TOKENIZERS[model_name] = AutoTokenizer.from_pretrained(tokenizer_name)
-        except Exception as e:
-            print(f"Advertencia: No se pudo cargar el tokenizer para {model_name} ({tokenizer_name}): {e}")
-            TOKENIZERS[model_name] = None
-except ImportError:
-    HAVE_TRANSFORMERS = False
-    print("Advertencia: La librería `transformers` no está instalada. Se usará una estimación basada en palabras.")
+import importlib.util
+import sys
+
+from src.utils.token_estimator import estimar_tokens
+from src.utils.tokenizer_pool import ejecutar_precarga, obtener_tokenizer_hf
+from src.utils.tokenizers import contar_tokens_funcion_batch, contar_tokens_hf, contar_tokens_hf_batch
+
+# Los tokenizers se cargan en el primer uso (o con `precargar_tokenizers_mistral`), no al importar el módulo.
+MISTRAL_TOKENIZER_MAPPING = {
+    "Mistral Large": "mistralai/Mistral-large-latest",
+    "Codestral": "mistralai/Codestral",
+    # Añadir otros modelos de Mistral si es necesario
+}
+TOKENIZERS_FALLIDOS = set()
+
+HAVE_TRANSFORMERS = importlib.util.find_spec("transformers") is not None
+if not HAVE_TRANSFORMERS:
+    print("Advertencia: La librería `transformers` no está instalada. Se usará una estimación por clases de caracteres.", file=sys.stderr)
+
+def _obtener_tokenizer(modelo):
+    # Busca el tokenizer en el pool compartido; None si no hay `transformers` o no se pudo cargar.
+    if not HAVE_TRANSFORMERS or modelo not in MISTRAL_TOKENIZER_MAPPING:
+        return None
+    tokenizer_name = MISTRAL_TOKENIZER_MAPPING[modelo]
+    if tokenizer_name in TOKENIZERS_FALLIDOS:
+        return None
+    try:
+        return obtener_tokenizer_hf(tokenizer_name)
+    except Exception as e:
+        print(f"Advertencia: No se pudo cargar el tokenizer para {modelo} ({tokenizer_name}): {e}", file=sys.stderr)
+        TOKENIZERS_FALLIDOS.add(tokenizer_name)
+        return None
+
+def precargar_tokenizers_mistral(en_segundo_plano=True):
+    """
+    Carga por adelantado en el pool los tokenizers de todos los modelos Mistral mapeados.
+
+    Args:
+        en_segundo_plano (bool, opcional): Si es True (por defecto) la carga se hace en un hilo daemon.
+
+    Returns:
+        threading.Thread: El hilo de precarga, o None si se ejecutó de forma síncrona.
+    """
+    def precargar():
+        for modelo in MISTRAL_TOKENIZER_MAPPING:
+            _obtener_tokenizer(modelo)
+
+    return ejecutar_precarga(precargar, en_segundo_plano)
+
+def _estimar_tokens_sin_tokenizer(texto):
+    return estimar_tokens(texto, "mistral") # Estimación por clases de caracteres
 
 def contar_tokens_mistral(texto, modelo):
     """
@@ -38,11 +71,29 @@ def contar_tokens_mistral(texto, modelo):
         int: El número de tokens en el texto. Devuelve None si la librería no está instalada
              o no se encuentra el tokenizer para el modelo.
     """
-    if HAVE_TRANSFORMERS and modelo in TOKENIZERS and TOKENIZERS[modelo] is not None:
-        return len(TOKENIZERS[modelo].encode(texto))
+    tokenizer = _obtener_tokenizer(modelo)
+    if tokenizer is not None:
+        return contar_tokens_hf(tokenizer, texto)
     else:
-        # Estimación basada en palabras si la librería no está instalada o el tokenizer no se cargó
-        return int(len(texto.split()) * 0.75) if texto else 0 # Factor de estimación
+        # Estimación por clases de caracteres si la librería no está instalada o el tokenizer no se cargó
+        return _estimar_tokens_sin_tokenizer(texto)
+
+def contar_tokens_mistral_batch(textos, modelo):
+    """
+    Versión por lotes de `contar_tokens_mistral`: pasa los textos en bloques al tokenizer "fast"
+    de Hugging Face, que los codifica en paralelo.
+
+    Args:
+        textos (iterable[str]): Lista o iterador de textos.
+        modelo (str): El nombre del modelo (ej. "Mistral Large").
+
+    Returns:
+        numpy.ndarray: El número de tokens de cada texto, en el mismo orden que la entrada.
+    """
+    tokenizer = _obtener_tokenizer(modelo)
+    if tokenizer is None:
+        return contar_tokens_funcion_batch(_estimar_tokens_sin_tokenizer, textos)
+    return contar_tokens_hf_batch(tokenizer, textos)
 
 def calcular_costo_mistral(tokens_entrada, tokens_salida, modelo, precios_modelos, moneda="USD"):
     """
@@ -79,10 +130,9 @@ def calcular_costo_mistral(tokens_entrada, tokens_salida, modelo, precios_modelo
 
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
-    precios_mistral_ejemplo = {
-        "Mistral Large": {"entrada": 0.003, "salida": 0.009},
-        "Codestral": {"entrada": 0.001, "salida": 0.003},
-    }
+    from calculators.catalog import obtener_catalogo
+
+    precios_mistral_ejemplo = obtener_catalogo().precios
 
     texto_entrada_mistral = "Escribe una función en Python para calcular la suma de dos números."
     texto_salida_mistral = "```python\ndef sumar(a, b):\n  return a + b\n```"
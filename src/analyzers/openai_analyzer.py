@@ -1,6 +1,6 @@
 #librerias
-import tiktoken
-import json
+from src.utils.tokenizer_pool import obtener_encoding_para_modelo
+from src.utils.tokenizers import NUM_HILOS_BATCH, contar_tokens_encoding, contar_tokens_encoding_batch
 """
 Esta función toma un texto y un modelo de OpenAI, y devuelve el número de tokens en el texto.
 Los modelos de OpenAI tienen diferentes codificaciones, y esta función utiliza la biblioteca tiktoken para determinar el número de tokens en el texto según el modelo especificado.
@@ -8,11 +8,35 @@ Los modelos de OpenAI tienen diferentes codificaciones, y esta función utiliza
 def contar_tokens_openai(texto, modelo):
 
     try:
-        encoding = tiktoken.encoding_for_model(modelo)
-        return len(encoding.encode(texto))
+        encoding = obtener_encoding_para_modelo(modelo)
+        return contar_tokens_encoding(encoding, texto)
     except KeyError:
         return None
 
+"""
+Indica si el modelo tiene codificación de tiktoken (si no, las funciones de conteo devuelven None).
+"""
+def usa_encoding(modelo):
+
+    try:
+        obtener_encoding_para_modelo(modelo)
+    except KeyError:
+        return False
+    return True
+
+"""
+Versión por lotes de `contar_tokens_openai`: recibe una lista o un iterador de textos y los codifica
+con `encode_ordinary_batch` de tiktoken, repartiendo el trabajo entre `num_hilos` hilos.
+Devuelve un numpy.ndarray con el número de tokens de cada texto, o None si el modelo no se encuentra.
+"""
+def contar_tokens_openai_batch(textos, modelo, num_hilos=NUM_HILOS_BATCH):
+
+    try:
+        encoding = obtener_encoding_para_modelo(modelo)
+    except KeyError:
+        return None
+    return contar_tokens_encoding_batch(encoding, textos, num_hilos)
+
 """
 Esta función calcula el costo estimado de tokens de entrada y salida para un modelo de OpenAI.
 
@@ -0,0 +1,341 @@
+"""
+Registro de analizadores por proveedor.
+
+Cada modelo del catálogo (`src/config/model_prices.json`, sección "tokenizers") indica su proveedor
+y el nombre que espera el analizador de ese proveedor (`modelo_tokenizer`). Este módulo traduce esa
+entrada a la función de conteo correcta, importando el analizador solo la primera vez que se usa.
+"""
+#librerias
+import hashlib
+import importlib
+from functools import lru_cache
+
+import numpy as np
+
+from src.utils.metrics import incrementar, medir, metricas_activas
+from src.utils.token_cache import hash_texto
+from src.utils.tokenizers import NUM_HILOS_BATCH, iterar_bloques, iterar_fragmentos_archivo, iterar_fragmentos_seguros
+
+# proveedor: (módulo, función de un texto, función por lotes, ¿la función recibe el modelo?)
+ANALIZADORES = {
+    "openai": ("src.analyzers.openai_analyzer", "contar_tokens_openai", "contar_tokens_openai_batch", True),
+    "anthropic": ("src.analyzers.anthropic_analyzer", "contar_tokens_anthropic", "contar_tokens_anthropic_batch", True),
+    "google": ("src.analyzers.google_analyzer", "contar_tokens_google", "contar_tokens_google_batch", False),
+    "meta": ("src.analyzers.meta_analyzer", "contar_tokens_llama", "contar_tokens_llama_batch", True),
+    "mistral": ("src.analyzers.mistral_analyzer", "contar_tokens_mistral", "contar_tokens_mistral_batch", True),
+    "baidu": ("src.analyzers.baidu_analyzer", "contar_tokens_ernie", "contar_tokens_ernie_batch", True),
+    "alibaba": ("src.analyzers.alibaba_analyzer", "contar_tokens_qwen", "contar_tokens_qwen_batch", False),
+    "zhipu": ("src.analyzers.zhipu_analyzer", "contar_tokens_zhipu", "contar_tokens_zhipu_batch", True),
+}
+
+# Conteos que `ConteoDeduplicado` recuerda por tokenizer; al superarse, se vacía la memoria de ese tokenizer.
+MAX_TEXTOS_DEDUPLICADOS = 1_000_000
+# Los textos de hasta esta longitud se usan directamente como clave; los más largos, por su hash.
+LONGITUD_CLAVE_DIRECTA = 64
+# Tamaño (en caracteres) de los segmentos en los que `ConteoDeduplicado` divide los textos largos para
+# reutilizar sus prefijos compartidos.
+TAMANO_SEGMENTO_PREFIJO = 512
+
+
+@lru_cache(maxsize=None)
+def funciones_proveedor(proveedor):
+    """
+    Devuelve (contar, contar_batch, recibe_modelo, acepta_hilos) del analizador del proveedor.
+    Lanza KeyError si no existe.
+    """
+    modulo, contar, contar_batch, recibe_modelo = ANALIZADORES[proveedor]
+    import inspect
+
+    analizador = importlib.import_module(modulo)
+    contar_batch = getattr(analizador, contar_batch)
+    acepta_hilos = "num_hilos" in inspect.signature(contar_batch).parameters
+    return getattr(analizador, contar), contar_batch, recibe_modelo, acepta_hilos
+
+
+def conteo_aditivo(proveedor, modelo_tokenizer):
+    """
+    Indica si el analizador del proveedor cuenta `modelo_tokenizer` con una codificación de tiktoken, con la que
+    la suma de los conteos de fragmentos cortados en posiciones seguras es el conteo del texto completo (ver
+    `src.utils.tokenizers._CORTE_SEGURO`). Lo decide la función `usa_encoding` del analizador, que comprueba que
+    la codificación esté disponible: sin ella, o si el analizador recurre a `estimar_tokens`, no es aditivo.
+    """
+    usa_encoding = getattr(importlib.import_module(ANALIZADORES[proveedor][0]), "usa_encoding", None)
+    return usa_encoding is not None and usa_encoding(modelo_tokenizer)
+
+
+def contar_tokens_proveedor(texto, proveedor, modelo_tokenizer):
+    contar, _, recibe_modelo, _ = funciones_proveedor(proveedor)
+    with medir("codificacion", proveedor=proveedor, modelo=modelo_tokenizer):
+        tokens = contar(texto, modelo_tokenizer) if recibe_modelo else contar(texto)
+    if tokens is not None:
+        incrementar("tokens", tokens, proveedor=proveedor, modelo=modelo_tokenizer)
+    return tokens
+
+
+def contar_tokens_proveedor_batch(textos, proveedor, modelo_tokenizer, num_hilos=None):
+    # `num_hilos` solo se pasa a los analizadores que lo aceptan (los basados en tiktoken).
+    _, contar_batch, recibe_modelo, acepta_hilos = funciones_proveedor(proveedor)
+    argumentos = (textos, modelo_tokenizer) if recibe_modelo else (textos,)
+    unidades = len(textos) if hasattr(textos, "__len__") else 1
+    with medir("codificacion", unidades=unidades, proveedor=proveedor, modelo=modelo_tokenizer):
+        if num_hilos is not None and acepta_hilos:
+            conteos = contar_batch(*argumentos, num_hilos=num_hilos)
+        else:
+            conteos = contar_batch(*argumentos)
+    if conteos is not None and metricas_activas():
+        incrementar("tokens", int(conteos.sum()), proveedor=proveedor, modelo=modelo_tokenizer)
+    return conteos
+
+
+def contar_tokens_modelo(texto, modelo, catalogo):
+    """
+    Cuenta los tokens de `texto` con el analizador que el catálogo asigna a `modelo`.
+
+    Args:
+        texto (str): El texto para tokenizar.
+        modelo (str): Nombre del modelo en el catálogo (ej. "GPT-4o").
+        catalogo (Catalogo): Catálogo de `calculators.catalog`.
+
+    Returns:
+        int: El número de tokens, o None si el modelo no está en el catálogo o el analizador no lo reconoce.
+    """
+    tokenizer = catalogo.tokenizer(modelo)
+    if tokenizer is None:
+        return None
+    return contar_tokens_proveedor(texto, tokenizer.proveedor, tokenizer.modelo_tokenizer)
+
+
+def contar_tokens_modelo_batch(textos, modelo, catalogo, num_hilos=None):
+    """
+    Versión por lotes de `contar_tokens_modelo`. Devuelve un numpy.ndarray con el conteo de cada texto,
+    o None si el modelo no está en el catálogo o el analizador no lo reconoce.
+    `num_hilos` limita los hilos de tiktoken (por defecto, los de cada analizador).
+    """
+    tokenizer = catalogo.tokenizer(modelo)
+    if tokenizer is None:
+        return None
+    return contar_tokens_proveedor_batch(textos, tokenizer.proveedor, tokenizer.modelo_tokenizer, num_hilos)
+
+
+def contar_tokens_modelo_archivo(ruta, modelo, catalogo, num_hilos=None, **opciones):
+    """
+    Cuenta los tokens del contenido del archivo `ruta` con el analizador de `modelo` sin leerlo entero: el archivo
+    se recorre por memory map en fragmentos seguros (`iterar_fragmentos_archivo`), que se cuentan en grupos con la
+    función por lotes del proveedor.
+
+    Con tiktoken el conteo es exacto. Con los tokenizers de Hugging Face y las estimaciones sin tokenizer, los
+    tokens especiales, el prefijo "▁" de sentencepiece o el término constante se suman una vez por fragmento (unos
+    pocos tokens cada 64K caracteres).
+
+    Args:
+        ruta (str o os.PathLike): Archivo de texto.
+        modelo (str): Nombre del modelo en el catálogo.
+        catalogo (Catalogo): Catálogo de `calculators.catalog`.
+        num_hilos (int, opcional): Hilos de tiktoken y fragmentos por grupo. Por defecto, el número de CPUs.
+        **opciones: `codificacion` y `errores` de `iterar_fragmentos_archivo`.
+
+    Returns:
+        int: El número de tokens, o None si el modelo no está en el catálogo o el analizador no lo reconoce.
+    """
+    tokenizer = catalogo.tokenizer(modelo)
+    if tokenizer is None:
+        return None
+    total = 0
+    for grupo in iterar_bloques(iterar_fragmentos_archivo(ruta, **opciones), num_hilos or NUM_HILOS_BATCH):
+        conteos = contar_tokens_proveedor_batch(grupo, tokenizer.proveedor, tokenizer.modelo_tokenizer, num_hilos)
+        if conteos is None:
+            return None
+        total += int(conteos.sum())
+    return total
+
+
+class ConteoDeduplicado:
+    """
+    Cuenta tokens por lotes tokenizando cada texto distinto una sola vez por tokenizer, y cada prefijo
+    compartido (p. ej. un prompt de sistema) una sola vez.
+
+    En los registros de uso el mismo texto se repite miles de veces (reintentos, tareas programadas,
+    preguntas idénticas). Cada texto se identifica por su hash (o por sí mismo si es corto); los que ya se
+    contaron con el mismo tokenizer, en este lote o en uno anterior, toman el conteo guardado, y el resto se
+    cuenta con una sola llamada a la función por lotes del proveedor. La memoria es por (proveedor,
+    modelo_tokenizer) del catálogo.
+
+    Los textos de más de dos segmentos se dividen además en segmentos de unos `tamano_segmento` caracteres
+    cortados en posiciones seguras (`iterar_fragmentos_seguros`). La división solo depende del texto desde el
+    principio de cada segmento, así que los textos que empiezan igual comparten sus primeros segmentos, que se
+    cuentan una vez y se reutilizan: de un texto nuevo solo se codifica el resto. Cuando el modelo se cuenta con
+    una codificación de tiktoken (`conteo_aditivo`) la suma de los segmentos es exactamente el conteo del texto;
+    si no, el texto se cuenta entero.
+
+    Los segmentos forman un trie (cada nodo es el hash de un prefijo de segmentos) por tokenizer y por columna
+    (`columna` de `contar_con_prefijos`), para que una respuesta que empieza como un prompt anterior no cuente
+    como prefijo repetido de los prompts. `contar_con_prefijos` informa, para cada texto, de los tokens de sus
+    segmentos iniciales por los que ya pasó otro texto distinto de la misma columna: el prefijo repetido. Si el
+    conteo no es aditivo, ese valor es la parte del conteo del texto proporcional a los caracteres del prefijo.
+
+    Atributos:
+        textos (int): Textos pedidos.
+        tokenizados (int): Textos distintos que no estaban en la memoria.
+        caracteres (int): Caracteres de los textos pedidos.
+        caracteres_codificados (int): Caracteres que se llegaron a enviar al tokenizer.
+    """
+    __slots__ = ("max_textos", "tamano_segmento", "memoria", "nodos", "textos", "tokenizados", "caracteres",
+                 "caracteres_codificados")
+
+    def __init__(self, max_textos=MAX_TEXTOS_DEDUPLICADOS, tamano_segmento=TAMANO_SEGMENTO_PREFIJO):
+        self.max_textos = max_textos
+        self.tamano_segmento = tamano_segmento
+        self.memoria = {}
+        # Tries de prefijos, {(proveedor, modelo_tokenizer, columna): {hash del prefijo: clave del primer texto
+        # que pasó por él, o True si pasaron varios}}.
+        self.nodos = {}
+        self.textos = 0
+        self.tokenizados = 0
+        self.caracteres = 0
+        self.caracteres_codificados = 0
+
+    @staticmethod
+    def _clave(texto):
+        return texto if len(texto) <= LONGITUD_CLAVE_DIRECTA else hash_texto(texto)
+
+    @staticmethod
+    def _recorrer_trie(nodos, clave_texto, segmentos):
+        # Registra los prefijos del texto y devuelve cuántos segmentos iniciales comparte con otro texto distinto.
+        # El último segmento no es un prefijo: lo que sigue a un prefijo repetido siempre es propio del texto.
+        prefijo = hashlib.blake2b(digest_size=16)
+        compartidos = 0
+        en_prefijo = True
+        for segmento in segmentos[:-1]:
+            prefijo.update(segmento.encode("utf-8", "surrogatepass"))
+            nodo = prefijo.digest()
+            dueno = nodos.get(nodo)
+            if dueno is None:
+                nodos[nodo] = clave_texto
+                en_prefijo = False
+            elif dueno is True or dueno != clave_texto:
+                nodos[nodo] = True
+                if en_prefijo:
+                    compartidos += 1
+            else:
+                en_prefijo = False
+        return compartidos
+
+    def contar_con_prefijos(self, textos, modelo, catalogo, num_hilos=None, columna=None):
+        """
+        Como `contar`, pero devuelve (conteos, tokens del prefijo repetido de cada texto), dos numpy.ndarray,
+        o None si el modelo no está en el catálogo o el analizador no lo reconoce. Los prefijos solo se comparan
+        con los de textos anteriores de la misma `columna` (p. ej. "prompt" o "respuesta").
+        """
+        tokenizer = catalogo.tokenizer(modelo)
+        if tokenizer is None:
+            return None
+        memoria = self.memoria.setdefault((tokenizer.proveedor, tokenizer.modelo_tokenizer), {})
+        nodos = self.nodos.setdefault((tokenizer.proveedor, tokenizer.modelo_tokenizer, columna), {})
+        aditivo = conteo_aditivo(tokenizer.proveedor, tokenizer.modelo_tokenizer)
+        claves = [self._clave(texto) for texto in textos]
+        # {clave: texto} de lo que hay que codificar: textos completos o segmentos.
+        pendientes = {}
+        # {posición del texto: (claves de sus segmentos, cuántos forman el prefijo repetido)}
+        segmentados = {}
+        nuevos = set()
+        for i, (clave, texto) in enumerate(zip(claves, textos)):
+            nuevo = clave not in memoria and clave not in nuevos
+            if nuevo:
+                nuevos.add(clave)
+            if len(texto) <= 2 * self.tamano_segmento:
+                if nuevo:
+                    pendientes[clave] = texto
+                continue
+            segmentos = [segmento for segmento in iterar_fragmentos_seguros(texto, self.tamano_segmento) if segmento]
+            claves_segmentos = [self._clave(segmento) for segmento in segmentos]
+            compartidos = self._recorrer_trie(nodos, clave, segmentos)
+            if not aditivo:
+                # Las estimaciones no se pueden sumar por segmentos: se codifica el texto entero y al prefijo
+                # repetido se le asigna la parte proporcional a sus caracteres.
+                if nuevo:
+                    pendientes[clave] = texto
+                segmentados[i] = (None, sum(map(len, segmentos[:compartidos])) / len(texto))
+                continue
+            segmentados[i] = (claves_segmentos, compartidos)
+            # De un texto nuevo se codifican sus segmentos; del prefijo repetido, los que falten para poder
+            # informar de sus tokens.
+            hasta = len(segmentos) if nuevo else compartidos
+            for clave_segmento, segmento in zip(claves_segmentos[:hasta], segmentos[:hasta]):
+                if clave_segmento not in memoria:
+                    pendientes.setdefault(clave_segmento, segmento)
+
+        if pendientes:
+            conteos = contar_tokens_proveedor_batch(list(pendientes.values()), tokenizer.proveedor,
+                                                    tokenizer.modelo_tokenizer, num_hilos)
+            if conteos is None:
+                return None
+            memoria.update(zip(pendientes, conteos.tolist()))
+        prefijos = np.zeros(len(textos), dtype=np.int64)
+        for i, (claves_segmentos, compartidos) in segmentados.items():
+            if claves_segmentos is None:
+                prefijos[i] = round(memoria[claves[i]] * compartidos)
+                continue
+            if claves[i] not in memoria:
+                memoria[claves[i]] = sum(memoria[clave] for clave in claves_segmentos)
+            prefijos[i] = sum(memoria[clave] for clave in claves_segmentos[:compartidos])
+        resultado = np.fromiter((memoria[clave] for clave in claves), dtype=np.int64, count=len(claves))
+
+        self.registrar(len(textos), len(nuevos), sum(map(len, textos)), sum(map(len, pendientes.values())))
+        if len(memoria) > self.max_textos:
+            memoria.clear()
+        if len(nodos) > self.max_textos:
+            nodos.clear()
+        return resultado, prefijos
+
+    def contar(self, textos, modelo, catalogo, num_hilos=None):
+        """
+        Como `contar_tokens_modelo_batch`: devuelve un numpy.ndarray con el conteo de cada texto de la lista,
+        o None si el modelo no está en el catálogo o el analizador no lo reconoce.
+        """
+        resultado = self.contar_con_prefijos(textos, modelo, catalogo, num_hilos)
+        return None if resultado is None else resultado[0]
+
+    def cifras(self):
+        return self.textos, self.tokenizados, self.caracteres, self.caracteres_codificados
+
+    def registrar(self, textos, tokenizados, caracteres=0, caracteres_codificados=0):
+        # También suma las cifras de los procesos trabajadores, que deduplican con su propia memoria.
+        self.textos += textos
+        self.tokenizados += tokenizados
+        self.caracteres += caracteres
+        self.caracteres_codificados += caracteres_codificados
+
+    def a_dict(self):
+        return {
+            "textos": self.textos,
+            "textos_tokenizados": self.tokenizados,
+            # Textos por cada texto tokenizado (1.0 = sin duplicados).
+            "ratio_deduplicacion": self.textos / self.tokenizados if self.tokenizados else 1.0,
+            "caracteres": self.caracteres,
+            "caracteres_codificados": self.caracteres_codificados,
+        }
+
+
+def precargar_tokenizers(catalogo, modelos=None):
+    """
+    Importa los analizadores y carga en el pool los tokenizers de `modelos` (por defecto, todos los del
+    catálogo) contando un texto corto con cada uno. Se usa antes de crear procesos con fork para que los
+    hijos compartan los tokenizers ya cargados en lugar de cargarlos cada uno.
+    """
+    for modelo in (catalogo.modelos if modelos is None else modelos):
+        contar_tokens_modelo_batch(["precarga"], modelo, catalogo)
+
+
+def precargar_encodings(catalogo):
+    """
+    Como `precargar_tokenizers`, pero solo carga las codificaciones de tiktoken de los modelos del catálogo (con
+    la función `usa_encoding` de su analizador), que son pocas y ligeras. Los tokenizers de Hugging Face y Qwen
+    no se cargan: cada proceso los carga en su primer uso, solo si la entrada los necesita.
+    """
+    vistos = set()
+    for modelo in catalogo.modelos:
+        tokenizer = catalogo.tokenizer(modelo)
+        if tokenizer is None or (tokenizer.proveedor, tokenizer.modelo_tokenizer) in vistos:
+            continue
+        vistos.add((tokenizer.proveedor, tokenizer.modelo_tokenizer))
+        conteo_aditivo(tokenizer.proveedor, tokenizer.modelo_tokenizer)
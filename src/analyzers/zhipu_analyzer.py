@@ -12,8 +12,37 @@ para obtener un conteo preciso de tokens.
 """
 #librerias
 
-import tiktoken
-import json
+from src.utils.token_estimator import estimar_tokens
+from src.utils.tokenizer_pool import obtener_encoding
+from src.utils.tokenizers import (NUM_HILOS_BATCH, contar_tokens_encoding, contar_tokens_encoding_batch,
+                                  contar_tokens_funcion_batch)
+
+def _encoding_zhipu(modelo):
+    # Selecciona la codificación de tiktoken usada como aproximación; lanza KeyError/ValueError si no existe.
+    if "glm-4" in modelo.lower():
+        # GLM-4 podría usar una codificación similar a cl100k_base o una específica
+        # Intentamos con cl100k_base como una aproximación
+        return obtener_encoding("cl100k_base")
+    elif "chatglm2" in modelo.lower():
+        # ChatGLM2 tiene su propia codificación
+        return obtener_encoding("chatglm2")
+    else:
+        # Intenta con una codificación genérica
+        return obtener_encoding("utf-8")
+
+def _estimar_tokens_sin_tokenizer(texto):
+    return estimar_tokens(texto, "zhipu") # Estimación por clases de caracteres
+
+def usa_encoding(modelo):
+    """
+    Indica si el modelo se cuenta con una codificación de tiktoken o, porque no está disponible, con
+    `estimar_tokens`.
+    """
+    try:
+        _encoding_zhipu(modelo)
+    except (KeyError, ValueError):
+        return False
+    return True
 
 def contar_tokens_zhipu(texto, modelo):
     """
@@ -29,19 +58,29 @@ def contar_tokens_zhipu(texto, modelo):
         int: Una estimación del número de tokens.
     """
     try:
-        if "glm-4" in modelo.lower():
-            # GLM-4 podría usar una codificación similar a cl100k_base o una específica
-            # Intentamos con cl100k_base como una aproximación
-            encoding = tiktoken.get_encoding("cl100k_base")
-        elif "chatglm2" in modelo.lower():
-            # ChatGLM2 tiene su propia codificación
-            encoding = tiktoken.get_encoding("chatglm2")
-        else:
-            # Intenta con una codificación genérica
-            encoding = tiktoken.get_encoding("utf-8")
-        return len(encoding.encode(texto))
-    except KeyError:
-        return int(len(texto.split()) * 0.7) if texto else 0 # Otra estimación basada en palabras
+        encoding = _encoding_zhipu(modelo)
+        return contar_tokens_encoding(encoding, texto)
+    except (KeyError, ValueError):
+        return _estimar_tokens_sin_tokenizer(texto)
+
+def contar_tokens_zhipu_batch(textos, modelo, num_hilos=NUM_HILOS_BATCH):
+    """
+    Versión por lotes de `contar_tokens_zhipu`: codifica muchos textos a la vez con
+    `encode_ordinary_batch` de tiktoken usando varios hilos.
+
+    Args:
+        textos (iterable[str]): Lista o iterador de textos.
+        modelo (str): El nombre del modelo.
+        num_hilos (int, opcional): Hilos usados por tiktoken. Por defecto, el número de CPUs.
+
+    Returns:
+        numpy.ndarray: Una estimación del número de tokens por texto, en el mismo orden que la entrada.
+    """
+    try:
+        encoding = _encoding_zhipu(modelo)
+    except (KeyError, ValueError):
+        return contar_tokens_funcion_batch(_estimar_tokens_sin_tokenizer, textos)
+    return contar_tokens_encoding_batch(encoding, textos, num_hilos)
 
 def calcular_costo_zhipu(tokens_entrada, tokens_salida, modelo, precios_modelos, moneda="USD"):
     """
@@ -78,11 +117,9 @@ def calcular_costo_zhipu(tokens_entrada, tokens_salida, modelo, precios_modelos,
 
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
-    precios_zhipu_ejemplo = {
-        "GLM-4-Plus": {"entrada": 0.0007, "salida": 0.0007},
-        "GLM-4-Long": {"entrada": 0.00014, "salida": 0.00014},
-        "GLM-4-AirX": {"entrada": 0.0014, "salida": 0.0014},
-    }
+    from calculators.catalog import obtener_catalogo
+
+    precios_zhipu_ejemplo = obtener_catalogo().precios
 
     texto_entrada_glm = "¿Cuál es la capital de China?"
     texto_salida_glm = "中国的首都是北京。"
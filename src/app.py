@@ -10,62 +10,77 @@ Ademas calcularemos el gasto energetico y de agua, y el CO2 estimado en base a l
 - Permitir al usuario seleccionar la moneda en la que se mostrar
 """
 #Librerias
+import os
+import sys
+
 import streamlit as st
-import pandas as pd
-import tiktoken
-import plotly.express as px
-
-#realizamos un diccionario con los valores de los precios de los diferentes modelos de IA del mercado
-
-precios_modelos = {
-    "GPT-4": {"entrada": 0.002, "salida": 0.008},
-    "GPT-4o": {"entrada": 0.005, "salida": 0.02},
-    "GPT-4o-mini": {"entrada": 0.0011, "salida": 0.0044},
-    "Claude 3 Opus": {"entrada": 0.015, "salida": 0.075},
-    "Claude 3 Sonnet": {"entrada": 0.003, "salida": 0.015},
-    "Claude 3 Haiku": {"entrada": 0.00025, "salida": 0.00125},
-    "Gemini 2.5 Pro Preview": {"entrada": 0.00125, "salida": 0.01},
-    "Gemini 1.5 Flash": {"entrada": 0.000075, "salida": 0.0003},
-    "Gemini 2.0 Flash-Lite": {"entrada": 0.000075, "salida": 0.0003},
-    "Llama 3.1 405B": {"entrada": 0.0035, "salida": 0.0035},
-    "Llama 3.3 70B": {"entrada": 0.00059, "salida": 0.00099},
-    "Llama 3.1 8B": {"entrada": 0.00009, "salida": 0.00009},
-    "Mistral Large": {"entrada": 0.003, "salida": 0.009},
-    "Codestral": {"entrada": 0.001, "salida": 0.003},
-    "Nemo": {"entrada": 0.0003, "salida": 0.0003},
-    "ERNIE 4.5": {"entrada": 0.00055, "salida": 0.0022},
-    "ERNIE X1": {"entrada": 0.00028, "salida": 0.0011},
-    "Qwen-Max": {"entrada": 0.0016, "salida": 0.0064},
-    "Qwen-Plus": {"entrada": 0.0004, "salida": 0.0012},
-    "Qwen-Turbo": {"entrada": 0.00005, "salida": 0.0002},
-    "GLM-4-Plus": {"entrada": 0.0007, "salida": 0.0007},
-    "GLM-4-Long": {"entrada": 0.00014, "salida": 0.00014},
-    "GLM-4-AirX": {"entrada": 0.0014, "salida": 0.0014},
-}
-
-# Suponemos una intensidad de carbono promedio global (kg CO2/kWh).
-# Este valor es un ejemplo y puede variar significativamente.
-INTENSIDAD_CARBONO_PROMEDIO = 0.45 # kg CO2/kWh (aproximadamente el promedio mundial en 2021)
+# pandas y plotly.express tardan más de medio segundo en importarse: se importan donde se usan, así la primera
+# carga de la página no los espera si aún no hay nada que mostrar.
+
+# Streamlit ejecuta este archivo directamente; añadimos la raíz del repositorio para poder importar `src.*` y `calculators.*`.
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_REPOSITORIO not in sys.path:
+    sys.path.insert(0, RAIZ_REPOSITORIO)
+
+from calculators.conversation import COLUMNA_TURNO, leer_mensajes, simular_conversacion
+from calculators.energy_estimation import INTENSIDAD_CARBONO_PROMEDIO
+from calculators.results import (COLUMNA_AGUA, COLUMNA_CO2, COLUMNA_ELECTRICIDAD, COLUMNA_MODELO, COLUMNA_TOKENS_ENTRADA,
+                                 COLUMNA_TOKENS_SALIDA, ResultadoModelo, columna_costo_total, formato_columnas,
+                                 resultados_a_dataframe)
+from calculators.token_costs import calcular_costo_tokens_numerico
+from calculators.catalog import obtener_catalogo
+from src.utils.metrics import METRICAS, medir, metricas_activas
+from src.utils.token_estimator import PERFIL_POR_DEFECTO, estimar_desde_caracteristicas, extraer_caracteristicas
+from src.utils.tokenizer_pool import obtener_encoding_para_modelo
+from src.utils.tokenizers import ConteoIncremental
+
+# Precios, factores de energía y tokenizers de cada modelo vienen del catálogo (src/config/model_prices.json).
+# Se carga y valida una vez por proceso y se recarga solo si el archivo cambia, así que cada rerun ve los precios vigentes.
+catalogo = obtener_catalogo()
+precios_modelos = catalogo.precios
 
 # Esta función nos ayuda a calcular cuánta energía y agua se gasta al usar cada modelo.
+# Usa la tabla "energia" del catálogo y, para los modelos que no están en ella, las reglas de respaldo
+# de `calculators.energy_estimation` (kWh electricidad / 1000 tokens, litros agua / 1000 tokens).
 def estimar_gasto_energetico(modelo, total_tokens):
-    # Supuestos aproximados (kWh electricidad / 1000 tokens, litros agua / 1000 tokens)
-    if "gpt-4" in modelo.lower() or "claude 3 opus" in modelo.lower() or "gemini 2.5 pro" in modelo.lower():
-        electricidad = (total_tokens / 1000) * 0.25
-        agua = (total_tokens / 1000) * 0.9
-    elif "gemini pro" in modelo.lower() or "claude 3 sonnet" in modelo.lower() or "llama 3.3 70b" in modelo.lower():
-        electricidad = (total_tokens / 1000) * 0.1
-        agua = (total_tokens / 1000) * 0.4
-    elif "mistral large" in modelo.lower() or "qwen-max" in modelo.lower() or "glm-4-plus" in modelo.lower():
-        electricidad = (total_tokens / 1000) * 0.15
-        agua = (total_tokens / 1000) * 0.6
-    else: # Modelos más pequeños o desconocidos
-        electricidad = (total_tokens / 1000) * 0.04
-        agua = (total_tokens / 1000) * 0.15
-
+    with medir("energia", modelo=modelo):
+        electricidad, agua = catalogo.indice_energia.estimar(modelo, total_tokens)
     co2_estimado = electricidad * INTENSIDAD_CARBONO_PROMEDIO
     return electricidad, agua, co2_estimado
 
+# Streamlit vuelve a ejecutar todo el script en cada interacción. Las codificaciones se guardan como
+# recurso compartido y cada sesión guarda un `ConteoIncremental` por área de texto y forma de contar
+# (encoding de tiktoken o perfil de estimación): al editar una frase de un prompt largo solo se vuelven a
+# contar los segmentos que cambiaron, y los modelos que comparten encoding comparten el conteo.
+@st.cache_resource(show_spinner=False)
+def cargar_encoding(modelo):
+    try:
+        return obtener_encoding_para_modelo(modelo)
+    except KeyError:
+        return None
+
+def contar_tokens_app(campo, modelo, texto):
+    encoding = cargar_encoding(modelo) if "gpt-4" in modelo.lower() else None
+    if encoding is not None:
+        clave = (campo, "tiktoken:" + encoding.name)
+    else:
+        # Sin tokenizer local: estimación por clases de caracteres con los coeficientes del proveedor.
+        tokenizer = catalogo.tokenizer(modelo)
+        perfil = tokenizer.proveedor if tokenizer else PERFIL_POR_DEFECTO
+        clave = (campo, "estimacion:" + perfil)
+    conteos = st.session_state.setdefault("conteos_incrementales", {})
+    if clave not in conteos:
+        contar = (lambda segmento: len(encoding.encode_ordinary(segmento))) if encoding is not None else extraer_caracteristicas
+        conteos[clave] = ConteoIncremental(contar)
+    with medir("codificacion", modelo=modelo, metodo="tiktoken" if encoding is not None else "estimacion"):
+        total = conteos[clave].actualizar(texto)
+    if not texto:
+        return 0
+    if encoding is not None:
+        return total
+    # El total de la estimación es la suma de las características de los segmentos.
+    return estimar_desde_caracteristicas(total, perfil)
+
 # Tittulo de la aplicacion en streamlit
 
 st.title("Calculadora de Costos y Tokens de Modelos de IA")
@@ -83,13 +98,7 @@ prompt_salida = st.text_area("Ingresa tu prompt de salida:(opcional )", height=2
 #------------------------------------------------------------------------------------------------------------------------------------
 
 # Lista de todos los modelos de IA que podemos analizar. ¡Nuestras opciones!
-modelos_ia = [
-    'GPT-4', 'GPT-4o', 'GPT-4o-mini', 'Claude 3 Opus', 'Claude 3 Sonnet', 'Claude 3 Haiku',
-    'Gemini 2.5 Pro Preview', 'Gemini 1.5 Flash', 'Gemini 2.0 Flash-Lite',
-    'Llama 3.1 405B', 'Llama 3.3 70B', 'Llama 3.1 8B',
-    'Mistral Large', 'Codestral', 'Nemo', 'ERNIE 4.5', 'ERNIE X1',
-    'Qwen-Max', 'Qwen-Plus', 'Qwen-Turbo', 'GLM-4-Plus', 'GLM-4-Long', 'GLM-4-AirX'
-]
+modelos_ia = list(catalogo.modelos)
 
 #widget para seleccionar el modelo de IA
 
@@ -106,81 +115,99 @@ if modelos_seleccionados:
     st.subheader("Resultados del Análisis")
     resultados = []
     for modelo in modelos_seleccionados:
-        tokens_entrada=0
-        tokens_salida =0
-        costo_entrada = 0
-        costo_salida = 0
-        costo_total = 0
-        gasto_electricidad = 0
-        gasto_agua = 0
-        gasto_CO2 = 0
         # Contamos los tokens de entrada y salida segun el modelo seleccionado
-        if "gpt-4" in modelo.lower():
-            try:
-                encoding = tiktoken.encoding_for_model(modelo)
-                tokens_entrada = len(encoding.encode(prompt_entrada)) if prompt_entrada else 0
-                tokens_salida = len(encoding.encode(prompt_salida)) if prompt_salida else 0
-            except KeyError:
-                tokens_entrada = len(prompt_entrada.split()) / 4 if prompt_entrada else 0
-                tokens_salida = len(prompt_salida.split()) / 4 if prompt_salida else 0
-        else:
-            tokens_entrada = len(prompt_entrada.split()) / 4 if prompt_entrada else 0
-            tokens_salida = len(prompt_salida.split()) / 4 if prompt_salida else 0
+        tokens_entrada = contar_tokens_app("entrada", modelo, prompt_entrada)
+        tokens_salida = contar_tokens_app("salida", modelo, prompt_salida)
 
         #Calculamos los costos de entrada y salida segun el modelo seleccionado
-        if modelo in precios_modelos:
-            tarifa_entrada = precios_modelos[modelo].get("entrada", 0)
-            tarifa_salida = precios_modelos[modelo].get("salida", 0)
-
-            costo_entrada =(tokens_entrada / 1000) * tarifa_entrada
-            costo_salida = (tokens_salida / 1000) * tarifa_salida
-            costo_total = costo_entrada + costo_salida
-
+        with medir("precio", modelo=modelo):
+            costo = calcular_costo_tokens_numerico(tokens_entrada, tokens_salida, modelo, precios_modelos)
+        if costo is not None:
             total_tokens = tokens_entrada + tokens_salida
             gasto_electricidad, gasto_agua, gasto_CO2 = estimar_gasto_energetico(modelo, total_tokens)
 
-            #Guardamos los resulttados que los mostraremos en la tabla y el grafico
-            resultados.append({
-                "Modelo": modelo,
-                "Tokens entrada": tokens_entrada if tokens_entrada is not None else "No disponible",
-                "Tokens salida": tokens_salida if tokens_salida is not None else "No disponible",
-                f"Costo entrada ({moneda_seleccionada})": f"{costo_entrada:.6f}",
-                f"Costo salida ({moneda_seleccionada})": f"{costo_salida:.6f}",
-                f"Costo total ({moneda_seleccionada})": f"{costo_total:.6f}",
-                "Electricidad (kWh)": f"{gasto_electricidad:.4f}",
-                "Agua (litros)": f"{gasto_agua:.4f}",
-                "CO2 (kg)": f"{gasto_CO2:.4f}",
-            })
+            #Guardamos los resultados numericos; el formato se aplica solo al mostrarlos
+            resultados.append(ResultadoModelo(
+                modelo, tokens_entrada, tokens_salida,
+                costo.costo_entrada, costo.costo_salida, costo.costo_total,
+                gasto_electricidad, gasto_agua, gasto_CO2, moneda_seleccionada,
+            ))
 
     #Mostramos los resultados en una tabla
 
     if resultados:
-        df_resultados = pd.DataFrame(resultados)
-        st.dataframe(df_resultados)
+        import plotly.express as px
+
+        df_resultados = resultados_a_dataframe(resultados, moneda_seleccionada)
+        st.dataframe(df_resultados, column_config={
+            columna: st.column_config.NumberColumn(format=formato)
+            for columna, formato in formato_columnas(moneda_seleccionada).items()
+        })
 
         #Mostramos los resultados en un grafico de barras
 
         #Grafico de costos total por modelo
 
-        fig_costos = px.bar(df_resultados, x="Modelo", y=f"Costo total ({moneda_seleccionada})", title=f"Costo Total por Modelo de IA ({moneda_seleccionada})")
-        st.plotly_chart(fig_costos, use_container_width=True)
+        with medir("grafico", grafico="costos"):
+            fig_costos = px.bar(df_resultados, x=COLUMNA_MODELO, y=columna_costo_total(moneda_seleccionada), title=f"Costo Total por Modelo de IA ({moneda_seleccionada})")
+            st.plotly_chart(fig_costos, use_container_width=True)
 
         #Grafico de tokens de entrada y salida por modelo
 
-        df_tokens = df_resultados[["Modelo", "Tokens entrada", "Tokens salida"]].melt(id_vars=["Modelo"], var_name="Tipo de token" , value_name="Cantidad")
+        with medir("grafico", grafico="tokens"):
+            df_tokens = df_resultados[[COLUMNA_MODELO, COLUMNA_TOKENS_ENTRADA, COLUMNA_TOKENS_SALIDA]].melt(id_vars=[COLUMNA_MODELO], var_name="Tipo de token" , value_name="Cantidad")
 
-        fig_tokens = px.bar(df_tokens, x="Modelo", y="Cantidad", color="Tipo de token", barmode="group", title="Tokens de entrada y salida por modelo")
-        st.plotly_chart(fig_tokens, use_container_width=True)
+            fig_tokens = px.bar(df_tokens, x=COLUMNA_MODELO, y="Cantidad", color="Tipo de token", barmode="group", title="Tokens de entrada y salida por modelo")
+            st.plotly_chart(fig_tokens, use_container_width=True)
 
         #Grafico de gasto energetico por modelo (electricidad, agua y CO2)
 
-        df_energia = df_resultados[["Modelo", "Electricidad (kWh)", "Agua (litros)", "CO2 (kg)"]].melt(id_vars=["Modelo"], var_name="Tipo de gasto", value_name="Cantidad")
-        fig_energia = px.bar(df_energia, x="Modelo", y="Cantidad", color="Tipo de gasto", barmode="group", title="Gasto energetico por modelo")
-        st.plotly_chart(fig_energia, use_container_width=True)
+        with medir("grafico", grafico="energia"):
+            df_energia = df_resultados[[COLUMNA_MODELO, COLUMNA_ELECTRICIDAD, COLUMNA_AGUA, COLUMNA_CO2]].melt(id_vars=[COLUMNA_MODELO], var_name="Tipo de gasto", value_name="Cantidad")
+            fig_energia = px.bar(df_energia, x=COLUMNA_MODELO, y="Cantidad", color="Tipo de gasto", barmode="group", title="Gasto energetico por modelo")
+            st.plotly_chart(fig_energia, use_container_width=True)
 
     else:
         st.warning("Seleciona almenos un modelo de IA para analizar los resultados.")
 
+#------------------------------------------------------------------------------------------------------------------------------------
+# Simulador de conversaciones: en un chat cada turno reenvía todo el historial, así que la entrada de cada turno
+# incluye todos los mensajes anteriores. Cada mensaje se cuenta una sola vez y los turnos salen de sumas acumuladas.
+
+with st.expander("Simular una conversación de varios turnos"):
+    st.markdown('Cada respuesta del asistente es un turno. Formato: `[{"rol": "user", "contenido": "..."}, '
+                '{"rol": "assistant", "contenido": "..."}]` (también `role`/`content`, o JSONL con un mensaje por línea).')
+    archivo_conversacion = st.file_uploader("Sube la conversación (JSON o JSONL):", type=["json", "jsonl"])
+    texto_conversacion = st.text_area("O pégala aquí:", height=200)
+    tokens_por_mensaje = st.number_input("Tokens de formato por mensaje:", min_value=0, value=0, step=1)
+    if archivo_conversacion is not None:
+        texto_conversacion = archivo_conversacion.getvalue().decode("utf-8")
+
+    if texto_conversacion.strip() and modelos_seleccionados:
+        try:
+            simulaciones = simular_conversacion(leer_mensajes(texto_conversacion), modelos_seleccionados,
+                                                moneda_seleccionada, int(tokens_por_mensaje), catalogo)
+        except ValueError as e:
+            st.error(f"No se pudo leer la conversación: {e}")
+        else:
+            simulaciones = [simulacion for simulacion in simulaciones.values() if simulacion is not None]
+            if simulaciones:
+                import pandas as pd
+                import plotly.express as px
+
+                st.dataframe(resultados_a_dataframe([simulacion.total() for simulacion in simulaciones], moneda_seleccionada),
+                             column_config={
+                                 columna: st.column_config.NumberColumn(format=formato)
+                                 for columna, formato in formato_columnas(moneda_seleccionada).items()
+                             })
+                df_turnos = pd.DataFrame([fila for simulacion in simulaciones for fila in simulacion.filas_turnos()])
+                if not df_turnos.empty:
+                    with medir("grafico", grafico="conversacion"):
+                        df_turnos["Costo acumulado"] = df_turnos.groupby(COLUMNA_MODELO)[columna_costo_total(moneda_seleccionada)].cumsum()
+                        fig_conversacion = px.line(df_turnos, x=COLUMNA_TURNO, y="Costo acumulado", color=COLUMNA_MODELO,
+                                                   title=f"Costo acumulado por turno ({moneda_seleccionada})")
+                        st.plotly_chart(fig_conversacion, use_container_width=True)
+
 #------------------------------------------------------------------------------------------------------------------------------------
 #Barra latteral para la documentacion de la aplicacion
 
@@ -251,4 +278,16 @@ with st.sidebar:
             - **Infraestructura no considerada:** No se tiene en cuenta el costo de la infraestructura
               subyacente
             """
-        )
\ No newline at end of file
+        )
+
+    # Con CALCULADORA_METRICAS=1 se muestran los tiempos acumulados de cada operación (carga de tokenizers,
+    # codificación, precios, energía y gráficos) por modelo, desde que arrancó el proceso.
+    if metricas_activas():
+        st.header("Métricas (depuración)")
+        resumen_metricas = METRICAS.resumen()
+        if resumen_metricas:
+            import pandas as pd
+
+            st.dataframe(pd.DataFrame(resumen_metricas), hide_index=True)
+        else:
+            st.caption("Aún no hay operaciones medidas.")
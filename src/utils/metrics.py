@@ -0,0 +1,305 @@
+"""
+Este módulo implementa la instrumentación de las operaciones costosas: carga de tokenizers,
+codificación, cálculo de precios, estimación de energía y dibujo de gráficos.
+
+Cada operación medida con `medir(operacion, **etiquetas)` suma una observación a un histograma de
+duraciones (más el número de unidades procesadas: textos, filas...) indexado por la operación y sus
+etiquetas (proveedor, modelo...). `incrementar` lleva contadores simples, como los tokens contados.
+Los datos se exportan en el formato de texto de Prometheus (`exportar_prometheus`) o como JSON
+(`exportar_json`).
+
+La instrumentación está desactivada por defecto. Se activa con la variable de entorno
+`CALCULADORA_METRICAS=1` o llamando a `activar_metricas()`. Desactivada, `medir` devuelve siempre
+el mismo gestor de contexto vacío y `incrementar` retorna de inmediato, así que el coste es el de
+una llamada a función.
+"""
+#librerias
+import os
+import threading
+import time
+from bisect import bisect_left
+
+VARIABLE_METRICAS = "CALCULADORA_METRICAS"
+PREFIJO = "calculadora"
+# Límites superiores (segundos) de las cubetas de los histogramas de duración.
+LIMITES_HISTOGRAMA = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted((str(clave), str(valor)) for clave, valor in etiquetas.items()))
+
+
+class _Histograma:
+    __slots__ = ("cubetas", "cuenta", "suma", "maximo", "unidades")
+
+    def __init__(self):
+        self.cubetas = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+        self.cuenta = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self.unidades = 0
+
+    def observar(self, segundos, unidades):
+        self.cubetas[bisect_left(LIMITES_HISTOGRAMA, segundos)] += 1
+        self.cuenta += 1
+        self.suma += segundos
+        self.maximo = max(self.maximo, segundos)
+        self.unidades += unidades
+
+
+class Metricas:
+    """
+    Registro de histogramas de duración y contadores, seguro entre hilos.
+    """
+
+    def __init__(self):
+        self._histogramas = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def observar(self, operacion, segundos, unidades=1, **etiquetas):
+        clave = _clave(operacion, etiquetas)
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = _Histograma()
+            histograma.observar(segundos, unidades)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def reiniciar(self):
+        with self._lock:
+            self._histogramas.clear()
+            self._contadores.clear()
+
+    def instantanea(self):
+        """
+        Devuelve los datos como un diccionario serializable en JSON:
+        {"histogramas": [{operacion, etiquetas, cuenta, suma_segundos, maximo_segundos, unidades, limites, cubetas}],
+         "contadores": [{nombre, etiquetas, valor}]}.
+        """
+        with self._lock:
+            histogramas = [
+                {
+                    "operacion": operacion,
+                    "etiquetas": dict(etiquetas),
+                    "cuenta": histograma.cuenta,
+                    "suma_segundos": histograma.suma,
+                    "maximo_segundos": histograma.maximo,
+                    "unidades": histograma.unidades,
+                    "limites": list(LIMITES_HISTOGRAMA),
+                    "cubetas": list(histograma.cubetas),
+                }
+                for (operacion, etiquetas), histograma in self._histogramas.items()
+            ]
+            contadores = [
+                {"nombre": nombre, "etiquetas": dict(etiquetas), "valor": valor}
+                for (nombre, etiquetas), valor in self._contadores.items()
+            ]
+        return {"histogramas": histogramas, "contadores": contadores}
+
+    def combinar(self, instantanea):
+        """
+        Suma a este registro una instantánea de otro (p. ej. la de un proceso trabajador).
+        """
+        with self._lock:
+            for datos in instantanea["histogramas"]:
+                clave = _clave(datos["operacion"], datos["etiquetas"])
+                histograma = self._histogramas.get(clave)
+                if histograma is None:
+                    histograma = self._histogramas[clave] = _Histograma()
+                histograma.cubetas = [a + b for a, b in zip(histograma.cubetas, datos["cubetas"])]
+                histograma.cuenta += datos["cuenta"]
+                histograma.suma += datos["suma_segundos"]
+                histograma.maximo = max(histograma.maximo, datos["maximo_segundos"])
+                histograma.unidades += datos["unidades"]
+            for datos in instantanea["contadores"]:
+                clave = _clave(datos["nombre"], datos["etiquetas"])
+                self._contadores[clave] = self._contadores.get(clave, 0) + datos["valor"]
+
+    def resumen(self):
+        """
+        Una fila por operación y etiquetas, con llamadas, unidades y tiempos en milisegundos (para mostrar).
+        """
+        filas = []
+        for datos in self.instantanea()["histogramas"]:
+            cuenta = datos["cuenta"]
+            filas.append({
+                "operacion": datos["operacion"],
+                "etiquetas": ", ".join(f"{clave}={valor}" for clave, valor in datos["etiquetas"].items()),
+                "llamadas": cuenta,
+                "unidades": datos["unidades"],
+                "total_ms": datos["suma_segundos"] * 1000,
+                "media_ms": datos["suma_segundos"] * 1000 / cuenta if cuenta else 0.0,
+                "maximo_ms": datos["maximo_segundos"] * 1000,
+            })
+        return sorted(filas, key=lambda fila: fila["total_ms"], reverse=True)
+
+
+def _escapar(valor):
+    return valor.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _etiquetas_prometheus(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{clave}="{_escapar(valor)}"' for clave, valor in etiquetas) + "}"
+
+
+def _formatear_limite(limite):
+    return "+Inf" if limite is None else repr(float(limite))
+
+
+def exportar_prometheus(metricas=None):
+    """
+    Devuelve las métricas en el formato de texto de exposición de Prometheus (versión 0.0.4).
+    """
+    metricas = metricas or METRICAS
+    datos = metricas.instantanea()
+    lineas = []
+    if datos["histogramas"]:
+        nombre = f"{PREFIJO}_operacion_segundos"
+        lineas += [f"# HELP {nombre} Duración de las operaciones instrumentadas.", f"# TYPE {nombre} histogram"]
+        for histograma in datos["histogramas"]:
+            etiquetas = [("operacion", histograma["operacion"]), *histograma["etiquetas"].items()]
+            acumulado = 0
+            for limite, cantidad in zip([*LIMITES_HISTOGRAMA, None], histograma["cubetas"]):
+                acumulado += cantidad
+                lineas.append(f"{nombre}_bucket{_etiquetas_prometheus(etiquetas + [('le', _formatear_limite(limite))])} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas_prometheus(etiquetas)} {histograma['suma_segundos']!r}")
+            lineas.append(f"{nombre}_count{_etiquetas_prometheus(etiquetas)} {histograma['cuenta']}")
+        nombre = f"{PREFIJO}_operacion_unidades_total"
+        lineas += [f"# HELP {nombre} Unidades (textos, filas...) procesadas por las operaciones instrumentadas.",
+                   f"# TYPE {nombre} counter"]
+        for histograma in datos["histogramas"]:
+            etiquetas = [("operacion", histograma["operacion"]), *histograma["etiquetas"].items()]
+            lineas.append(f"{nombre}{_etiquetas_prometheus(etiquetas)} {histograma['unidades']}")
+
+    por_nombre = {}
+    for contador in datos["contadores"]:
+        por_nombre.setdefault(contador["nombre"], []).append(contador)
+    for nombre_contador, contadores in por_nombre.items():
+        nombre = f"{PREFIJO}_{nombre_contador}_total"
+        lineas.append(f"# TYPE {nombre} counter")
+        for contador in contadores:
+            lineas.append(f"{nombre}{_etiquetas_prometheus(list(contador['etiquetas'].items()))} {contador['valor']}")
+    return "\n".join(lineas) + "\n" if lineas else ""
+
+
+def exportar_json(metricas=None):
+    """
+    Devuelve las métricas como diccionario serializable (ver `Metricas.instantanea`).
+    """
+    return (metricas or METRICAS).instantanea()
+
+
+METRICAS = Metricas()
+
+
+def _reiniciar_tras_fork():
+    # Un proceso hijo empieza con métricas vacías (los trabajadores envían las suyas al padre, que ya tiene
+    # las propias) y con un lock nuevo, por si otro hilo del padre lo tenía tomado al hacer fork.
+    METRICAS._lock = threading.Lock()
+    METRICAS._histogramas = {}
+    METRICAS._contadores = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+_ACTIVAS = os.environ.get(VARIABLE_METRICAS, "").lower() not in ("", "0", "false", "no")
+
+
+def activar_metricas():
+    global _ACTIVAS
+    _ACTIVAS = True
+
+
+def desactivar_metricas():
+    global _ACTIVAS
+    _ACTIVAS = False
+
+
+def metricas_activas():
+    return _ACTIVAS
+
+
+class _Medicion:
+    __slots__ = ("operacion", "unidades", "etiquetas", "inicio")
+
+    def __init__(self, operacion, unidades, etiquetas):
+        self.operacion = operacion
+        self.unidades = unidades
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        METRICAS.observar(self.operacion, time.perf_counter() - self.inicio, self.unidades, **self.etiquetas)
+        return False
+
+
+class _SinMedicion:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+_SIN_MEDICION = _SinMedicion()
+
+
+def medir(operacion, unidades=1, **etiquetas):
+    """
+    Gestor de contexto que mide la duración del bloque y la registra en el histograma de `operacion`.
+
+    Args:
+        operacion (str): Nombre de la operación (ej. "codificacion", "precio").
+        unidades (int, opcional): Textos, filas... procesados en el bloque.
+        **etiquetas: Etiquetas del histograma (ej. proveedor="openai", modelo="gpt-4").
+
+    Ejemplo:
+        with medir("codificacion", unidades=len(textos), proveedor="openai", modelo="gpt-4"):
+            conteos = contar_tokens_openai_batch(textos, "gpt-4")
+    """
+    if not _ACTIVAS:
+        return _SIN_MEDICION
+    return _Medicion(operacion, unidades, etiquetas)
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    """
+    Suma `valor` al contador `nombre` con las etiquetas dadas (ej. tokens contados por modelo).
+    """
+    if _ACTIVAS:
+        METRICAS.incrementar(nombre, valor, **etiquetas)
+
+
+def extraer_instantanea():
+    """
+    Devuelve la instantánea de las métricas del proceso y las reinicia, o None si están desactivadas.
+    La usan los procesos trabajadores para enviar sus métricas al proceso principal.
+    """
+    if not _ACTIVAS:
+        return None
+    instantanea = METRICAS.instantanea()
+    METRICAS.reiniciar()
+    return instantanea
+
+
+if __name__ == "__main__":
+    # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
+    activar_metricas()
+    for _ in range(3):
+        with medir("codificacion", unidades=2, proveedor="openai", modelo="gpt-4"):
+            time.sleep(0.001)
+    incrementar("tokens", 120, proveedor="openai", modelo="gpt-4")
+    print(exportar_prometheus())
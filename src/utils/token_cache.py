@@ -0,0 +1,298 @@
+"""
+Este módulo implementa una caché persistente de conteos de tokens.
+
+Muchos textos se cuentan una y otra vez (prompts de sistema, plantillas, reintentos). La caché
+guarda en un archivo SQLite local el conteo de cada texto, indexado por el hash del texto y por la
+identidad del tokenizer (ej. "tiktoken:cl100k_base"). Cada tokenizer tiene además una versión
+(la versión de la librería que lo implementa): si cambia, las entradas antiguas de ese tokenizer
+se invalidan automáticamente la primera vez que se consulta.
+
+La caché está desactivada por defecto. Se activa con la variable de entorno
+`CALCULADORA_CACHE_TOKENS=<ruta.sqlite>` o llamando a `activar_cache_tokens(ruta)`.
+"""
+#librerias
+import hashlib
+import os
+import threading
+import time
+from functools import lru_cache
+
+VARIABLE_RUTA_CACHE = "CALCULADORA_CACHE_TOKENS"
+MAX_ENTRADAS_POR_DEFECTO = 1_000_000
+# Textos más cortos que esto se cuentan directamente: codificarlos cuesta menos que consultar SQLite.
+LONGITUD_MINIMA_CACHE = 256
+# Solo se actualiza la fecha de último acceso de una entrada si tiene más de este tiempo (segundos),
+# para que las lecturas no se conviertan en escrituras.
+INTERVALO_REFRESCO_ACCESO = 3600
+# Fracción de entradas que se desalojan cuando la caché supera su tamaño máximo.
+FRACCION_DESALOJO = 0.1
+
+
+def hash_texto(texto):
+    return hashlib.blake2b(texto.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+@lru_cache(maxsize=None)
+def version_paquete(paquete):
+    """
+    Devuelve la versión instalada de `paquete` (ej. "tiktoken"), o "desconocida".
+    """
+    from importlib import metadata
+
+    try:
+        return metadata.version(paquete)
+    except metadata.PackageNotFoundError:
+        return "desconocida"
+
+
+class CacheConteoTokens:
+    """
+    Caché persistente (SQLite) de conteos de tokens con desalojo por tamaño.
+
+    Args:
+        ruta (str): Ruta del archivo SQLite (se crea si no existe). ":memory:" para una caché temporal.
+        max_entradas (int, opcional): Número máximo de conteos guardados antes de desalojar los más antiguos.
+    """
+
+    def __init__(self, ruta, max_entradas=MAX_ENTRADAS_POR_DEFECTO):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS conteos ("
+            " tokenizer TEXT NOT NULL, hash BLOB NOT NULL, conteo INTEGER NOT NULL, accedido INTEGER NOT NULL,"
+            " PRIMARY KEY (tokenizer, hash)) WITHOUT ROWID"
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS conteos_accedido ON conteos (accedido)")
+        self._conexion.execute("CREATE TABLE IF NOT EXISTS versiones (tokenizer TEXT PRIMARY KEY, version TEXT NOT NULL)")
+        self._entradas = self._conexion.execute("SELECT COUNT(*) FROM conteos").fetchone()[0]
+        self._versiones_verificadas = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    def _verificar_version(self, tokenizer, version):
+        # Borra las entradas del tokenizer si fueron guardadas con otra versión. Llamar con el lock tomado.
+        if self._versiones_verificadas.get(tokenizer) == version:
+            return
+        fila = self._conexion.execute("SELECT version FROM versiones WHERE tokenizer = ?", (tokenizer,)).fetchone()
+        if fila is not None and fila[0] != version:
+            borradas = self._conexion.execute("DELETE FROM conteos WHERE tokenizer = ?", (tokenizer,)).rowcount
+            self._entradas -= borradas
+            self.invalidaciones += 1
+        if fila is None or fila[0] != version:
+            self._conexion.execute("INSERT OR REPLACE INTO versiones (tokenizer, version) VALUES (?, ?)", (tokenizer, version))
+        self._versiones_verificadas[tokenizer] = version
+
+    def obtener_muchos(self, textos, tokenizer, version):
+        """
+        Busca los conteos de varios textos de una vez.
+
+        Args:
+            textos (list[str]): Textos a buscar.
+            tokenizer (str): Identidad del tokenizer (ej. "tiktoken:cl100k_base").
+            version (str): Versión del tokenizer; si no coincide con la guardada, la caché de ese tokenizer se vacía.
+
+        Returns:
+            list: El conteo de cada texto, o None para los que no están en la caché.
+        """
+        hashes = [hash_texto(texto) for texto in textos]
+        ahora = int(time.time())
+        encontrados = {}
+        with self._lock:
+            self._verificar_version(tokenizer, version)
+            # SQLite limita el número de parámetros por consulta; se consulta por bloques.
+            for inicio in range(0, len(hashes), 500):
+                bloque = hashes[inicio:inicio + 500]
+                marcadores = ",".join("?" * len(bloque))
+                filas = self._conexion.execute(
+                    f"SELECT hash, conteo, accedido FROM conteos WHERE tokenizer = ? AND hash IN ({marcadores})",
+                    (tokenizer, *bloque),
+                ).fetchall()
+                for hash_, conteo, accedido in filas:
+                    encontrados[hash_] = conteo
+                    if ahora - accedido > INTERVALO_REFRESCO_ACCESO:
+                        self._conexion.execute(
+                            "UPDATE conteos SET accedido = ? WHERE tokenizer = ? AND hash = ?", (ahora, tokenizer, hash_)
+                        )
+            conteos = [encontrados.get(hash_) for hash_ in hashes]
+            aciertos = sum(conteo is not None for conteo in conteos)
+            self.aciertos += aciertos
+            self.fallos += len(conteos) - aciertos
+        return conteos
+
+    def obtener(self, texto, tokenizer, version):
+        return self.obtener_muchos([texto], tokenizer, version)[0]
+
+    def guardar_muchos(self, textos, conteos, tokenizer, version):
+        """
+        Guarda los conteos de varios textos y desaloja las entradas más antiguas si se supera `max_entradas`.
+        """
+        ahora = int(time.time())
+        filas = [(tokenizer, hash_texto(texto), int(conteo), ahora) for texto, conteo in zip(textos, conteos)]
+        with self._lock:
+            self._verificar_version(tokenizer, version)
+            self._conexion.execute("BEGIN")
+            try:
+                antes = self._conexion.total_changes
+                self._conexion.executemany(
+                    "INSERT OR IGNORE INTO conteos (tokenizer, hash, conteo, accedido) VALUES (?, ?, ?, ?)", filas
+                )
+                self._entradas += self._conexion.total_changes - antes
+                if self._entradas > self.max_entradas:
+                    self._desalojar()
+                self._conexion.execute("COMMIT")
+            except Exception:
+                self._conexion.execute("ROLLBACK")
+                raise
+
+    def guardar(self, texto, conteo, tokenizer, version):
+        self.guardar_muchos([texto], [conteo], tokenizer, version)
+
+    def _desalojar(self):
+        # Borra las entradas con acceso más antiguo hasta dejar margen bajo `max_entradas`.
+        exceso = self._entradas - self.max_entradas + max(1, int(self.max_entradas * FRACCION_DESALOJO))
+        borradas = self._conexion.execute(
+            "DELETE FROM conteos WHERE (tokenizer, hash) IN"
+            " (SELECT tokenizer, hash FROM conteos ORDER BY accedido LIMIT ?)",
+            (exceso,),
+        ).rowcount
+        self._entradas -= borradas
+        self.desalojos += borradas
+
+    def estadisticas(self):
+        """
+        Devuelve un diccionario con aciertos, fallos, tasa de aciertos, entradas, desalojos e invalidaciones.
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+                "entradas": self._entradas,
+                "max_entradas": self.max_entradas,
+                "desalojos": self.desalojos,
+                "invalidaciones": self.invalidaciones,
+            }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+_CACHE = None
+_LOCK_CACHE = threading.Lock()
+
+
+def activar_cache_tokens(ruta, max_entradas=MAX_ENTRADAS_POR_DEFECTO):
+    """
+    Activa la caché persistente para todo el proceso y la devuelve.
+    """
+    global _CACHE
+    with _LOCK_CACHE:
+        if _CACHE is not None:
+            _CACHE.cerrar()
+        _CACHE = CacheConteoTokens(ruta, max_entradas)
+        return _CACHE
+
+
+def desactivar_cache_tokens():
+    global _CACHE
+    with _LOCK_CACHE:
+        if _CACHE is not None:
+            _CACHE.cerrar()
+        _CACHE = None
+
+
+def obtener_cache_tokens():
+    """
+    Devuelve la caché activa del proceso o None. La primera vez la crea a partir de
+    `CALCULADORA_CACHE_TOKENS` si esa variable de entorno está definida.
+    """
+    global _CACHE
+    if _CACHE is None and os.environ.get(VARIABLE_RUTA_CACHE):
+        with _LOCK_CACHE:
+            if _CACHE is None:
+                _CACHE = CacheConteoTokens(os.environ[VARIABLE_RUTA_CACHE])
+    return _CACHE
+
+
+# Una conexión de SQLite no puede usarse en un proceso hijo creado con fork. El hijo abre su propia
+# conexión a la misma ruta; la heredada se conserva sin usar, porque cerrarla desde el hijo podría
+# liberar los bloqueos del padre.
+_CONEXIONES_HEREDADAS = []
+
+
+def _reabrir_cache_tras_fork():
+    global _CACHE, _LOCK_CACHE
+    _LOCK_CACHE = threading.Lock()
+    if _CACHE is not None:
+        _CONEXIONES_HEREDADAS.append(_CACHE)
+        _CACHE = CacheConteoTokens(_CACHE.ruta, _CACHE.max_entradas)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reabrir_cache_tras_fork)
+
+
+def estadisticas_cache_tokens():
+    cache = obtener_cache_tokens()
+    return cache.estadisticas() if cache is not None else None
+
+
+def contar_con_cache(texto, tokenizer, version, contar):
+    """
+    Devuelve el conteo de `texto` desde la caché o, si no está, lo calcula con `contar()` y lo guarda.
+    Sin caché activa, o para textos cortos, simplemente llama a `contar()`.
+
+    Args:
+        texto (str): El texto a contar.
+        tokenizer (str): Identidad del tokenizer (ej. "tiktoken:cl100k_base").
+        version (str): Versión del tokenizer.
+        contar (callable): Función sin argumentos que calcula el conteo.
+    """
+    cache = obtener_cache_tokens()
+    if cache is None or len(texto) < LONGITUD_MINIMA_CACHE:
+        return contar()
+    conteo = cache.obtener(texto, tokenizer, version)
+    if conteo is None:
+        conteo = contar()
+        cache.guardar(texto, conteo, tokenizer, version)
+    return conteo
+
+
+def contar_lote_con_cache(textos, tokenizer, version, contar_lote):
+    """
+    Versión por lotes de `contar_con_cache`: solo los textos que no están en la caché se pasan a
+    `contar_lote(lista_de_textos) -> lista_de_conteos`. Los textos de menos de `LONGITUD_MINIMA_CACHE`
+    caracteres se cuentan siempre, sin consultar ni guardar en la caché.
+
+    Returns:
+        list[int]: El conteo de cada texto, en el mismo orden que `textos`.
+    """
+    cache = obtener_cache_tokens()
+    if cache is None:
+        return list(contar_lote(textos))
+    conteos = [None] * len(textos)
+    largos = [i for i, texto in enumerate(textos) if len(texto) >= LONGITUD_MINIMA_CACHE]
+    if largos:
+        for i, conteo in zip(largos, cache.obtener_muchos([textos[i] for i in largos], tokenizer, version)):
+            conteos[i] = conteo
+    # Los cortos y los largos que faltan en la caché se cuentan en una sola llamada a `contar_lote`.
+    pendientes = [i for i, conteo in enumerate(conteos) if conteo is None]
+    if pendientes:
+        nuevos = list(contar_lote([textos[i] for i in pendientes]))
+        for i, conteo in zip(pendientes, nuevos):
+            conteos[i] = conteo
+        guardar = [(textos[i], conteos[i]) for i in pendientes if len(textos[i]) >= LONGITUD_MINIMA_CACHE]
+        if guardar:
+            cache.guardar_muchos([texto for texto, _ in guardar], [conteo for _, conteo in guardar], tokenizer,
+                                 version)
+    return conteos
@@ -0,0 +1,282 @@
+"""
+Este módulo estima el número de tokens de un texto sin tokenizarlo.
+
+Las estimaciones por palabras (`len(texto.split()) * 0.75`) crean una lista con todas las palabras
+y cuentan casi cero tokens en chino o japonés, que no separan las palabras con espacios. Aquí el
+texto se recorre una sola vez, por fragmentos de tamaño fijo: cada carácter se clasifica por su
+escritura o categoría (letra latina, letra acentuada, dígito, puntuación, ideograma han, hangul,
+kana, otra escritura, símbolo, espacio) con una tabla precalculada y numpy, y se cuentan unas
+pocas características (`CARACTERISTICAS`). La estimación es una combinación lineal de esas
+características con coeficientes calibrados contra el tokenizer real. La memoria usada depende
+del tamaño del fragmento, no del texto.
+
+Error medido con `benchmarks/calibrate_estimator.py` (muestras de ~2 KB y al menos 100 tokens que no
+se usaron para calibrar; error relativo absoluto medio / máximo):
+
+                 inglés       español      fr/de/it/pt  cirílico     chino         japonés      coreano       código
+    cl100k_base  5.4%/20.2%   6.7%/13.1%   7.2%/18.4%   6.6%/18.3%   13.2%/33.9%   5.3%/10.8%   11.1%/38.2%   7.2%/22.2%
+    o200k_base   5.7%/21.2%   6.5%/19.2%   5.0%/13.7%   6.1%/19.9%   10.8%/25.1%   5.1%/12.4%   13.3%/41.9%   6.6%/21.6%
+
+Con las mismas muestras, `len(texto.split()) * 0.75` se equivoca en un 53-88% de media. El chino
+tradicional necesita más tokens por carácter que el simplificado y el modelo no los distingue; el
+máximo en coreano corresponde a un texto de sílabas poco frecuentes.
+
+En textos muy cortos (menos de ~100 tokens) el error relativo puede ser mayor, aunque el absoluto
+es de pocos tokens. Los proveedores cuyo tokenizer no se puede ejecutar localmente (Gemini,
+Mistral, ERNIE, Qwen, GLM) usan el perfil del tokenizer más parecido (`PERFILES_PROVEEDOR`); para
+ellos el error no está medido y conviene suponer hasta ±25%.
+"""
+#librerias
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+# Caracteres por fragmento: cada uno ocupa 4 bytes en UTF-32 más un byte por su categoría.
+TAMANO_FRAGMENTO = 1 << 20
+
+# Categorías de carácter.
+ESPACIO, LATINA, LATINA_EXTENDIDA, DIGITO, PUNTUACION, HAN, HANGUL, CJK_OTROS, OTRA_ESCRITURA, SIMBOLO = range(10)
+NUM_CATEGORIAS = 10
+
+CARACTERISTICAS = (
+    "palabras",           # secuencias de letras latinas (con o sin acentos)
+    "letras",             # letras latinas ASCII
+    "letras_extendidas",  # letras latinas acentuadas y marcas diacríticas
+    "digitos",
+    "puntuacion",         # puntuación y símbolos ASCII
+    "grupos_puntuacion",  # secuencias de puntuación ASCII ("):", "==", "->"...)
+    "han",                # ideogramas chinos (hanzi, kanji, hanja)
+    "hangul",             # sílabas y jamo coreanos
+    "cjk_otros",          # kana, bopomofo, puntuación CJK y formas de ancho completo
+    "otra_escritura",     # letras de otras escrituras (cirílico, griego, árabe, devanagari...)
+    "simbolos",           # símbolos y emojis fuera de ASCII
+    "espacios_extra",     # espacios que siguen a otro espacio (sangrías, alineaciones)
+    "saltos_linea",
+    "constante",          # 1 si el texto no está vacío
+)
+
+# Coeficientes (tokens por unidad de cada característica), calibrados con `benchmarks/calibrate_estimator.py`.
+COEFICIENTES_BASE = {
+    "cl100k_base": {
+        "palabras": 0.3004, "letras": 0.1313, "letras_extendidas": 2.3793, "digitos": 1.442, "puntuacion": 0.1158,
+        "grupos_puntuacion": 0.4766, "han": 1.1977, "hangul": 1.2457, "cjk_otros": 0.9401,
+        "otra_escritura": 0.4447, "simbolos": 1.435, "espacios_extra": 0.0, "saltos_linea": 2.0087,
+        "constante": 2.7908,
+    },
+    "o200k_base": {
+        "palabras": 0.4256, "letras": 0.1009, "letras_extendidas": 0.6567, "digitos": 1.4005, "puntuacion": 0.1146,
+        "grupos_puntuacion": 0.3876, "han": 0.7574, "hangul": 0.7056, "cjk_otros": 0.5837,
+        "otra_escritura": 0.2492, "simbolos": 2.1351, "espacios_extra": 0.01, "saltos_linea": 2.2532,
+        "constante": 4.453,
+    },
+}
+
+# proveedor: (perfil base, coeficientes que se sustituyen). Los tokenizers con vocabularios grandes y
+# multilingües (Gemini, Qwen, GLM-4) se parecen más a o200k_base; ERNIE usa WordPiece, que cuenta un
+# token por carácter chino y añade [CLS] y [SEP].
+PERFILES_PROVEEDOR = {
+    "openai": ("o200k_base", {}),
+    "anthropic": ("cl100k_base", {}),
+    "meta": ("cl100k_base", {}),
+    "mistral": ("cl100k_base", {}),
+    "google": ("o200k_base", {}),
+    "alibaba": ("o200k_base", {}),
+    "zhipu": ("o200k_base", {}),
+    "baidu": ("cl100k_base", {"han": 1.0, "cjk_otros": 1.0, "constante": 2.0}),
+}
+PERFIL_POR_DEFECTO = "cl100k_base"
+
+# Rangos (inicio, fin inclusive, categoría) de caracteres CJK en el plano básico.
+_RANGOS_CJK = (
+    (0x1100, 0x11FF, HANGUL),     # Hangul jamo
+    (0x2E80, 0x2FDF, HAN),        # radicales CJK y Kangxi
+    (0x3000, 0x303F, CJK_OTROS),  # símbolos y puntuación CJK
+    (0x3040, 0x30FF, CJK_OTROS),  # hiragana y katakana
+    (0x3100, 0x312F, CJK_OTROS),  # bopomofo
+    (0x3130, 0x318F, HANGUL),     # jamo de compatibilidad
+    (0x3190, 0x33FF, CJK_OTROS),  # kanbun, extensiones de katakana, caracteres encerrados, compatibilidad CJK
+    (0x3400, 0x4DBF, HAN),        # extensión A
+    (0x4E00, 0x9FFF, HAN),        # ideogramas unificados
+    (0xA960, 0xA97F, HANGUL),     # Hangul jamo extendido A
+    (0xAC00, 0xD7FF, HANGUL),     # sílabas hangul y jamo extendido B
+    (0xF900, 0xFAFF, HAN),        # ideogramas de compatibilidad
+    (0xFE30, 0xFE4F, CJK_OTROS),  # formas de compatibilidad CJK
+    (0xFF00, 0xFFEF, CJK_OTROS),  # formas de ancho completo y medio
+)
+
+
+def _categoria(codigo):
+    caracter = chr(codigo)
+    if codigo < 0x80:
+        if caracter.isspace():
+            return ESPACIO
+        if caracter.isalpha():
+            return LATINA
+        if caracter.isdigit():
+            return DIGITO
+        return PUNTUACION
+    for inicio, fin, categoria_cjk in _RANGOS_CJK:
+        if inicio <= codigo <= fin:
+            return categoria_cjk
+    categoria = unicodedata.category(caracter)
+    if caracter.isspace() or categoria.startswith("Z"):
+        return ESPACIO
+    if categoria == "Nd":
+        return DIGITO
+    if categoria[0] in "LM":
+        latina = codigo < 0x0250 or 0x1E00 <= codigo <= 0x1EFF or 0x0300 <= codigo <= 0x036F
+        return LATINA_EXTENDIDA if latina else OTRA_ESCRITURA
+    return SIMBOLO
+
+
+@lru_cache(maxsize=1)
+def _tabla_categorias():
+    # Categoría de cada carácter del plano básico (64 KB). Se construye la primera vez que se usa.
+    return np.fromiter((_categoria(codigo) for codigo in range(0x10000)), dtype=np.uint8, count=0x10000)
+
+
+def _categorias_fragmento(fragmento):
+    codigos = np.frombuffer(fragmento.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    categorias = _tabla_categorias()[np.minimum(codigos, 0xFFFF)]
+    altos = codigos > 0xFFFF
+    if altos.any():
+        # Fuera del plano básico: ideogramas de las extensiones B en adelante, o emojis y otros símbolos.
+        ideogramas = (codigos >= 0x20000) & (codigos <= 0x3FFFF)
+        categorias[altos] = SIMBOLO
+        categorias[ideogramas] = HAN
+    return categorias
+
+
+def extraer_caracteristicas(texto, tamano=TAMANO_FRAGMENTO):
+    """
+    Cuenta las características de `CARACTERISTICAS` recorriendo el texto una vez, por fragmentos de `tamano`
+    caracteres.
+
+    Returns:
+        numpy.ndarray: Un float64 por característica, en el orden de `CARACTERISTICAS`.
+    """
+    por_categoria = np.zeros(NUM_CATEGORIAS, dtype=np.int64)
+    palabras = grupos_puntuacion = espacios_extra = saltos_linea = 0
+    anterior_letra = anterior_puntuacion = anterior_espacio = False
+    for inicio in range(0, len(texto), tamano):
+        fragmento = texto[inicio:inicio + tamano]
+        categorias = _categorias_fragmento(fragmento)
+        por_categoria += np.bincount(categorias, minlength=NUM_CATEGORIAS)
+
+        letra = (categorias == LATINA) | (categorias == LATINA_EXTENDIDA)
+        palabras += int(np.count_nonzero(letra[1:] & ~letra[:-1])) + int(letra[0] and not anterior_letra)
+        puntuacion = categorias == PUNTUACION
+        grupos_puntuacion += (int(np.count_nonzero(puntuacion[1:] & ~puntuacion[:-1]))
+                              + int(puntuacion[0] and not anterior_puntuacion))
+        espacio = categorias == ESPACIO
+        espacios_extra += int(np.count_nonzero(espacio[1:] & espacio[:-1])) + int(espacio[0] and anterior_espacio)
+        saltos_linea += fragmento.count("\n")
+        anterior_letra, anterior_puntuacion, anterior_espacio = bool(letra[-1]), bool(puntuacion[-1]), bool(espacio[-1])
+
+    return np.array([
+        palabras,
+        por_categoria[LATINA],
+        por_categoria[LATINA_EXTENDIDA],
+        por_categoria[DIGITO],
+        por_categoria[PUNTUACION],
+        grupos_puntuacion,
+        por_categoria[HAN],
+        por_categoria[HANGUL],
+        por_categoria[CJK_OTROS],
+        por_categoria[OTRA_ESCRITURA],
+        por_categoria[SIMBOLO],
+        espacios_extra,
+        saltos_linea,
+        1 if texto else 0,
+    ], dtype=np.float64)
+
+
+@lru_cache(maxsize=None)
+def coeficientes_perfil(perfil=PERFIL_POR_DEFECTO):
+    """
+    Devuelve el vector de coeficientes de un perfil: un nombre de `COEFICIENTES_BASE` (ej. "cl100k_base") o de
+    proveedor de `PERFILES_PROVEEDOR` (ej. "baidu"). Lanza KeyError si no existe.
+    """
+    if perfil in PERFILES_PROVEEDOR:
+        base, cambios = PERFILES_PROVEEDOR[perfil]
+        coeficientes = dict(COEFICIENTES_BASE[base], **cambios)
+    else:
+        coeficientes = COEFICIENTES_BASE[perfil]
+    vector = np.array([coeficientes[nombre] for nombre in CARACTERISTICAS], dtype=np.float64)
+    vector.setflags(write=False)
+    return vector
+
+
+def estimar_tokens(texto, perfil=PERFIL_POR_DEFECTO):
+    """
+    Estima el número de tokens de un texto sin tokenizarlo.
+
+    Args:
+        texto (str): El texto.
+        perfil (str, opcional): Tokenizer ("cl100k_base", "o200k_base") o proveedor ("google", "baidu"...)
+            cuyos coeficientes se usan.
+
+    Returns:
+        int: Tokens estimados (0 para un texto vacío).
+    """
+    if not texto:
+        return 0
+    return estimar_desde_caracteristicas(extraer_caracteristicas(texto), perfil)
+
+
+def estimar_desde_caracteristicas(caracteristicas, perfil=PERFIL_POR_DEFECTO):
+    """
+    Estima los tokens de un texto a partir de su vector de `extraer_caracteristicas`.
+
+    Acepta también la suma de los vectores de trozos de un texto cortados en posiciones seguras (ver
+    `src.utils.tokenizers.ConteoIncremental`): en esos cortes las características son aditivas salvo la
+    constante, que se cuenta una sola vez.
+    """
+    if not caracteristicas[-1]:
+        return 0
+    caracteristicas = np.array(caracteristicas, dtype=np.float64)
+    caracteristicas[-1] = 1
+    return max(0, int(round(float(caracteristicas @ coeficientes_perfil(perfil)))))
+
+
+def estimar_tokens_batch(textos, perfil=PERFIL_POR_DEFECTO):
+    """
+    Versión por lotes de `estimar_tokens`. Devuelve un numpy.ndarray (int64) en el orden de la entrada.
+    """
+    coeficientes = coeficientes_perfil(perfil)
+    return np.fromiter(
+        (max(0, int(round(float(extraer_caracteristicas(texto) @ coeficientes)))) if texto else 0 for texto in textos),
+        dtype=np.int64,
+    )
+
+
+def calibrar(textos, conteos):
+    """
+    Ajusta los coeficientes por mínimos cuadrados no negativos para que la estimación se acerque a `conteos`
+    (los tokens reales de cada texto). Las filas se ponderan por 1 / conteo, para minimizar el error relativo.
+
+    Returns:
+        dict: {característica: coeficiente}, utilizable en `COEFICIENTES_BASE`.
+    """
+    matriz = np.array([extraer_caracteristicas(texto) for texto in textos])
+    objetivo = np.asarray(conteos, dtype=np.float64)
+    pesos = 1.0 / np.maximum(objetivo, 1.0)
+    activas = np.ones(len(CARACTERISTICAS), dtype=bool)
+    coeficientes = np.zeros(len(CARACTERISTICAS))
+    # Mínimos cuadrados con las características activas; las que salen negativas se fijan a 0 y se repite.
+    while activas.any():
+        solucion, *_ = np.linalg.lstsq(matriz[:, activas] * pesos[:, None], objetivo * pesos, rcond=None)
+        if (solucion >= 0).all():
+            coeficientes[activas] = solucion
+            break
+        indices = np.flatnonzero(activas)
+        activas[indices[solucion < 0]] = False
+    return {nombre: round(float(valor), 4) for nombre, valor in zip(CARACTERISTICAS, coeficientes)}
+
+
+if __name__ == "__main__":
+    # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
+    for texto_ejemplo in ("Este es un texto de ejemplo para contar tokens.", "这是一个用于计算词元数量的示例文本。"):
+        for perfil_ejemplo in ("cl100k_base", "o200k_base", "baidu"):
+            print(perfil_ejemplo, estimar_tokens(texto_ejemplo, perfil_ejemplo), texto_ejemplo)
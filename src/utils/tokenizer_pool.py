@@ -0,0 +1,246 @@
+"""
+Este módulo mantiene un pool de tokenizers compartido por todo el proceso.
+
+Antes cada llamada a `contar_tokens_*` reconstruía su tokenizer (`tiktoken.get_encoding`,
+`QwenTokenizer()`, `AutoTokenizer.from_pretrained`...). Aquí los tokenizers se guardan una
+sola vez, indexados por la identidad del tokenizer subyacente y no por el nombre comercial
+del modelo: "ERNIE 4.5" y "ERNIE X1" comparten `nghuyong/ernie-3.0-base-zh`, y "gpt-4" y
+"gpt-3.5-turbo" comparten `cl100k_base`.
+
+El pool es seguro entre hilos, evita cargas duplicadas concurrentes de la misma clave y
+respeta un presupuesto de memoria aproximado (en MB) desalojando el tokenizer usado hace
+más tiempo (LRU). Las estadísticas de aciertos, fallos y desalojos están disponibles con
+`estadisticas_pool()`.
+
+Las librerías de tokenización (tiktoken, transformers, qwen-tokenizer) se importan al cargar el
+primer tokenizer que las necesita, no al importar este módulo.
+"""
+#librerias
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from src.utils.metrics import medir
+
+# Peso aproximado en memoria (MB) de cada tipo de tokenizer, usado para el presupuesto LRU.
+PESO_POR_TIPO_MB = {
+    "tiktoken": 30,
+    "hf": 60,
+    "qwen": 40,
+}
+PRESUPUESTO_POR_DEFECTO_MB = int(os.environ.get("CALCULADORA_POOL_TOKENIZERS_MB", "1024"))
+# Carpeta con tokenizers de Hugging Face descargados previamente, para trabajar sin red.
+VARIABLE_DIRECTORIO_TOKENIZERS = "CALCULADORA_TOKENIZERS_DIR"
+
+
+class PoolTokenizers:
+    """
+    Pool LRU de tokenizers con presupuesto de memoria y estadísticas.
+
+    Args:
+        presupuesto_mb (int): Memoria aproximada máxima que pueden ocupar los tokenizers cargados.
+    """
+
+    def __init__(self, presupuesto_mb=PRESUPUESTO_POR_DEFECTO_MB):
+        self.presupuesto_mb = presupuesto_mb
+        self._tokenizers = OrderedDict()  # clave -> (tokenizer, peso_mb)
+        self._uso_mb = 0
+        self._lock = threading.Lock()
+        self._locks_carga = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener(self, clave, cargador, peso_mb=None):
+        """
+        Devuelve el tokenizer asociado a `clave`, cargándolo con `cargador()` si no está en el pool.
+
+        Args:
+            clave (tuple): Identidad del tokenizer, por ejemplo ("tiktoken", "cl100k_base").
+            cargador (callable): Función sin argumentos que construye el tokenizer.
+            peso_mb (int, opcional): Peso aproximado en MB. Por defecto se deduce del tipo (clave[0]).
+
+        Returns:
+            object: El tokenizer cargado. Si `cargador` lanza una excepción, se propaga y no se guarda nada.
+        """
+        while True:
+            with self._lock:
+                entrada = self._tokenizers.get(clave)
+                if entrada is not None:
+                    self._tokenizers.move_to_end(clave)
+                    self.aciertos += 1
+                    return entrada[0]
+                lock_clave = self._locks_carga.setdefault(clave, threading.Lock())
+
+            # Solo un hilo carga cada clave; los demás esperan y reutilizan el resultado.
+            with lock_clave:
+                with self._lock:
+                    entrada = self._tokenizers.get(clave)
+                    if entrada is not None:
+                        self._tokenizers.move_to_end(clave)
+                        self.aciertos += 1
+                        return entrada[0]
+                    if self._locks_carga.get(clave) is not lock_clave:
+                        # La carga que esperábamos falló y su lock se retiró: puede que otro hilo ya esté
+                        # cargando con un lock nuevo, así que se vuelve a empezar con el lock vigente.
+                        continue
+                    self.fallos += 1
+                try:
+                    with medir("carga_tokenizer", tipo=clave[0], tokenizer=clave[1]):
+                        tokenizer = cargador()
+                    if peso_mb is None:
+                        peso_mb = PESO_POR_TIPO_MB.get(clave[0], 50)
+                except BaseException:
+                    with self._lock:
+                        self._retirar_lock_carga(clave, lock_clave)
+                    raise
+                # El tokenizer se guarda y el lock de carga se retira a la vez: un hilo que llegue después
+                # encuentra el tokenizer o el lock, nunca ninguno de los dos.
+                with self._lock:
+                    self._tokenizers[clave] = (tokenizer, peso_mb)
+                    self._uso_mb += peso_mb
+                    self._desalojar()
+                    self._retirar_lock_carga(clave, lock_clave)
+                return tokenizer
+
+    def _retirar_lock_carga(self, clave, lock_clave):
+        # Solo se retira el lock si sigue siendo el de esta carga, nunca uno que otro hilo creó después.
+        if self._locks_carga.get(clave) is lock_clave:
+            del self._locks_carga[clave]
+
+    def _desalojar(self):
+        # Nunca se desaloja el último tokenizer insertado, aunque por sí solo supere el presupuesto.
+        while self._uso_mb > self.presupuesto_mb and len(self._tokenizers) > 1:
+            _, (_, peso_mb) = self._tokenizers.popitem(last=False)
+            self._uso_mb -= peso_mb
+            self.desalojos += 1
+
+    def contiene(self, clave):
+        with self._lock:
+            return clave in self._tokenizers
+
+    def vaciar(self):
+        with self._lock:
+            self._tokenizers.clear()
+            self._uso_mb = 0
+
+    def estadisticas(self):
+        """
+        Devuelve un diccionario con aciertos, fallos, desalojos, tasa de aciertos y uso de memoria.
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+                "tokenizers_cargados": len(self._tokenizers),
+                "uso_mb": self._uso_mb,
+                "presupuesto_mb": self.presupuesto_mb,
+            }
+
+
+# Pool único del proceso, compartido por todos los analizadores y por la app.
+POOL = PoolTokenizers()
+
+
+def estadisticas_pool():
+    return POOL.estadisticas()
+
+
+@lru_cache(maxsize=None)
+def nombre_encoding_para_modelo(modelo):
+    """
+    Resuelve (y memoriza) el nombre de la codificación de tiktoken para un modelo de OpenAI.
+    Lanza KeyError si tiktoken no conoce el modelo.
+    """
+    import tiktoken
+    return tiktoken.encoding_name_for_model(modelo)
+
+
+def obtener_encoding(nombre_encoding):
+    """
+    Devuelve la codificación de tiktoken `nombre_encoding` (ej. "cl100k_base") desde el pool.
+    Lanza ValueError (o KeyError en versiones antiguas de tiktoken) si la codificación no existe.
+    """
+    def cargar():
+        import tiktoken
+        return tiktoken.get_encoding(nombre_encoding)
+
+    return POOL.obtener(("tiktoken", nombre_encoding), cargar)
+
+
+def obtener_encoding_para_modelo(modelo):
+    """
+    Devuelve la codificación de tiktoken para un modelo de OpenAI (ej. "gpt-4") desde el pool.
+    Modelos que comparten codificación comparten también la entrada del pool.
+    Lanza KeyError si tiktoken no conoce el modelo.
+    """
+    return obtener_encoding(nombre_encoding_para_modelo(modelo))
+
+
+def ruta_local_tokenizer(nombre_tokenizer):
+    """
+    Devuelve la carpeta local del tokenizer si se definió `CALCULADORA_TOKENIZERS_DIR`, o None.
+    El tokenizer "org/nombre" se busca en `<CALCULADORA_TOKENIZERS_DIR>/org/nombre`.
+    """
+    directorio = os.environ.get(VARIABLE_DIRECTORIO_TOKENIZERS)
+    if not directorio:
+        return None
+    return os.path.join(directorio, *nombre_tokenizer.split("/"))
+
+
+def obtener_tokenizer_hf(nombre_tokenizer):
+    """
+    Devuelve un tokenizer de Hugging Face (`AutoTokenizer.from_pretrained`) desde el pool.
+    `transformers` solo se importa la primera vez que se necesita un tokenizer.
+
+    Si la variable de entorno `CALCULADORA_TOKENIZERS_DIR` está definida, el tokenizer se carga
+    desde esa carpeta (ver `ruta_local_tokenizer`) sin acceder a la red; si la carpeta no lo
+    contiene, se usa solo la caché local del hub (`local_files_only=True`).
+
+    Lanza ImportError si `transformers` no está instalada.
+    """
+    def cargar():
+        from transformers import AutoTokenizer
+        ruta_local = ruta_local_tokenizer(nombre_tokenizer)
+        if ruta_local is None:
+            return AutoTokenizer.from_pretrained(nombre_tokenizer)
+        if os.path.isdir(ruta_local):
+            return AutoTokenizer.from_pretrained(ruta_local, local_files_only=True)
+        return AutoTokenizer.from_pretrained(nombre_tokenizer, local_files_only=True)
+
+    return POOL.obtener(("hf", nombre_tokenizer), cargar)
+
+
+def obtener_tokenizer_qwen():
+    """
+    Devuelve la instancia compartida de `QwenTokenizer` desde el pool.
+    Lanza ImportError si `qwen-tokenizer` no está instalada.
+    """
+    def cargar():
+        from qwen_tokenizer import QwenTokenizer
+        return QwenTokenizer()
+
+    return POOL.obtener(("qwen", "QwenTokenizer"), cargar)
+
+
+def ejecutar_precarga(funcion, en_segundo_plano=True):
+    """
+    Ejecuta `funcion` (que carga tokenizers en el pool) en un hilo daemon o en el hilo actual.
+
+    Args:
+        funcion (callable): Función sin argumentos que realiza la precarga.
+        en_segundo_plano (bool, opcional): Si es True (por defecto) no bloquea al llamador.
+
+    Returns:
+        threading.Thread: El hilo lanzado, o None si la precarga se hizo de forma síncrona.
+    """
+    if not en_segundo_plano:
+        funcion()
+        return None
+    hilo = threading.Thread(target=funcion, name="precarga-tokenizers", daemon=True)
+    hilo.start()
+    return hilo
@@ -1,24 +1,431 @@
-import tiktoken
+import bisect
+import codecs
+import hashlib
+import mmap
+import os
+import re
+import weakref
+
+import numpy as np
+
+from src.utils.token_cache import contar_con_cache, contar_lote_con_cache, version_paquete
+from src.utils.tokenizer_pool import obtener_encoding, obtener_encoding_para_modelo
+
+# Número de textos que se codifican juntos en cada llamada por lotes y número de hilos de tiktoken.
+TAMANO_BLOQUE_BATCH = 1000
+NUM_HILOS_BATCH = os.cpu_count() or 1
+# Tamaño (en caracteres) de los fragmentos en los que se divide un texto grande para contarlo.
+TAMANO_FRAGMENTO = 64 * 1024
+# Tamaño (en caracteres) de los segmentos que `ConteoIncremental` conserva entre ediciones: una edición
+# pequeña vuelve a contar uno o dos segmentos.
+TAMANO_SEGMENTO = 2048
+
+# Posiciones donde un texto se puede cortar sin alterar la pre-tokenización de tiktoken:
+# antes de un espacio precedido por un carácter que no es espacio, o antes de un salto de
+# línea precedido por una letra o dígito. Ninguna expresión de pre-tokenización (cl100k_base,
+# o200k_base, p50k_base...) produce un fragmento que cruce esas posiciones, así que la suma
+# de los conteos por fragmento es exactamente el conteo del texto completo.
+_CORTE_SEGURO = re.compile(r"(?<=\S) |(?<=[^\W_])\n")
+
+def _buscar_corte_seguro(texto, inicio, limite):
+    # Última posición de corte seguro en (inicio, limite], o -1 si no hay ninguna.
+    espacio = texto.rfind(" ", inicio + 1, limite + 1)
+    salto = texto.rfind("\n", inicio + 1, limite + 1)
+    while espacio > inicio or salto > inicio:
+        if espacio > salto:
+            if not texto[espacio - 1].isspace():
+                return espacio
+            espacio = texto.rfind(" ", inicio + 1, espacio)
+        else:
+            anterior = texto[salto - 1]
+            if anterior.isalnum():
+                return salto
+            salto = texto.rfind("\n", inicio + 1, salto)
+    return -1
+
+def iterar_fragmentos_seguros(texto, tamano=TAMANO_FRAGMENTO):
+    """
+    Divide un texto en fragmentos de aproximadamente `tamano` caracteres, cortando solo en
+    posiciones seguras (ver `_CORTE_SEGURO`), para contar tokens con memoria acotada.
+    Si un tramo no tiene ningún corte seguro (p. ej. chino sin espacios ni saltos de línea),
+    el fragmento se alarga hasta el siguiente corte seguro para no perder exactitud.
+    """
+    inicio = 0
+    while len(texto) - inicio > tamano:
+        corte = _buscar_corte_seguro(texto, inicio, inicio + tamano)
+        if corte == -1:
+            siguiente = _CORTE_SEGURO.search(texto, inicio + tamano)
+            if siguiente is None:
+                break
+            corte = siguiente.start()
+        yield texto[inicio:corte]
+        inicio = corte
+    yield texto[inicio:]
+
+def iterar_fragmentos_archivo(ruta, tamano=TAMANO_FRAGMENTO, codificacion="utf-8", errores="strict"):
+    """
+    Igual que `iterar_fragmentos_seguros` sobre el contenido de un archivo, sin leerlo entero en un str:
+    el archivo se mapea en memoria (mmap) y se decodifica por ventanas de `tamano` bytes con un
+    decodificador incremental, que no parte los caracteres multibyte. El texto que queda tras el último
+    corte seguro de una ventana pasa a la siguiente, así que la suma de los conteos por fragmento es
+    exactamente el conteo del archivo completo. Los saltos de línea no se traducen (\r\n se cuenta tal cual).
+
+    Args:
+        ruta (str o os.PathLike): Archivo de texto.
+        tamano (int, opcional): Bytes por ventana y caracteres aproximados por fragmento.
+        codificacion (str, opcional): Codificación del archivo.
+        errores (str, opcional): Tratamiento de bytes inválidos, como en `bytes.decode` ("strict", "replace"...).
+    """
+    decodificador = codecs.getincrementaldecoder(codificacion)(errores)
+    with open(ruta, "rb") as archivo:
+        # mmap no admite archivos vacíos.
+        if os.fstat(archivo.fileno()).st_size == 0:
+            return
+        with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            pendiente = ""
+            for inicio in range(0, len(mapa), tamano):
+                pendiente += decodificador.decode(mapa[inicio:inicio + tamano])
+                if len(pendiente) < tamano:
+                    continue
+                # El corte tiene que tener al menos un carácter detrás para saber si es seguro.
+                corte = _buscar_corte_seguro(pendiente, 0, len(pendiente) - 1)
+                if corte > 0:
+                    yield from iterar_fragmentos_seguros(pendiente[:corte], tamano)
+                    pendiente = pendiente[corte:]
+            pendiente += decodificador.decode(b"", final=True)
+            if pendiente:
+                yield from iterar_fragmentos_seguros(pendiente, tamano)
+
+def _longitud_prefijo_comun(a, b, bloque=4096):
+    # Compara por bloques (la igualdad de cadenas es un memcmp) y busca dentro del primer bloque distinto.
+    maximo = min(len(a), len(b))
+    inicio = 0
+    while inicio < maximo:
+        fin = min(inicio + bloque, maximo)
+        if a[inicio:fin] != b[inicio:fin]:
+            break
+        inicio = fin
+    else:
+        return maximo
+    bajo, alto = inicio, fin - 1
+    while bajo < alto:
+        medio = (bajo + alto + 1) // 2
+        if a[inicio:medio] == b[inicio:medio]:
+            bajo = medio
+        else:
+            alto = medio - 1
+    return bajo
+
+class ConteoIncremental:
+    """
+    Mantiene el conteo de tokens de un texto que se edita poco a poco, como un prompt en la aplicación.
+
+    El texto se guarda dividido en segmentos de unos `tamano` caracteres, cortados en posiciones seguras
+    (ver `_CORTE_SEGURO`), junto con el conteo de cada uno. Con cada versión nueva se buscan el prefijo y el
+    sufijo que no cambiaron: los segmentos que caen en ellos se conservan si sus cortes siguen siendo seguros
+    (un corte depende solo del carácter anterior y del siguiente), y solo se vuelve a dividir y contar el tramo
+    del medio. El total es igual al conteo del texto completo.
+
+    Args:
+        contar (callable): Cuenta un segmento. Puede devolver un int o un vector de numpy que se suma por
+            segmentos, como `token_estimator.extraer_caracteristicas`.
+        tamano (int, opcional): Tamaño aproximado de los segmentos.
+    """
+
+    def __init__(self, contar, tamano=TAMANO_SEGMENTO):
+        self.contar = contar
+        self.tamano = tamano
+        self.texto = ""
+        # Límites de los segmentos: el segmento i es texto[limites[i]:limites[i + 1]].
+        self.limites = [0]
+        self.conteos = []
+        self.total = 0
+        # Caracteres que se volvieron a contar en la última actualización.
+        self.recontados = 0
+
+    def actualizar(self, texto):
+        """
+        Pasa a la nueva versión del texto y devuelve el total.
+        """
+        if texto == self.texto:
+            self.recontados = 0
+            return self.total
+        anterior, limites = self.texto, self.limites
+        prefijo = _longitud_prefijo_comun(anterior, texto)
+        maximo_sufijo = min(len(anterior), len(texto)) - prefijo
+        sufijo = _longitud_prefijo_comun(anterior[::-1][:maximo_sufijo], texto[::-1][:maximo_sufijo])
+        desplazamiento = len(texto) - len(anterior)
+        segmentos = len(self.conteos)
+
+        # Se conservan los segmentos que terminan antes del último carácter común del prefijo...
+        izquierda = bisect.bisect_left(limites, prefijo, 1) - 1
+        # ...y los que empiezan después del primer carácter común del sufijo.
+        derecha = bisect.bisect_right(limites, len(anterior) - sufijo, izquierda, segmentos)
+        inicio = limites[izquierda]
+        fin = (limites[derecha] if derecha < segmentos else len(anterior)) + desplazamiento
+
+        nuevos_limites, nuevos_conteos = [], []
+        posicion = inicio
+        for segmento in iterar_fragmentos_seguros(texto[inicio:fin], self.tamano):
+            if segmento:
+                posicion += len(segmento)
+                nuevos_limites.append(posicion)
+                nuevos_conteos.append(self.contar(segmento))
+
+        self.total = self.total - sum(self.conteos[izquierda:derecha]) + sum(nuevos_conteos)
+        self.conteos = self.conteos[:izquierda] + nuevos_conteos + self.conteos[derecha:]
+        self.limites = (limites[:izquierda + 1] + nuevos_limites
+                        + [limite + desplazamiento for limite in limites[derecha + 1:]])
+        self.texto = texto
+        self.recontados = fin - inicio
+        return self.total
+
+# Versión de cada tokenizer de Hugging Face cargado (ver `identidad_tokenizer_hf`); se calcula una vez por objeto.
+_VERSIONES_HF = weakref.WeakKeyDictionary()
+
+def identidad_encoding(encoding):
+    # Identidad y versión de una codificación de tiktoken para la caché persistente de conteos. La versión
+    # incluye el tamaño del vocabulario, para que una codificación con el mismo nombre pero otros rangos
+    # (p. ej. un archivo de tiktoken distinto en TIKTOKEN_CACHE_DIR) no reutilice conteos anteriores.
+    return "tiktoken:" + encoding.name, f"{version_paquete('tiktoken')}:{encoding.n_vocab}"
+
+def _huella_carpeta(ruta):
+    # Hash del contenido de los archivos de una carpeta local de tokenizer.
+    huella = hashlib.blake2b(digest_size=8)
+    for nombre in sorted(os.listdir(ruta)):
+        archivo = os.path.join(ruta, nombre)
+        if not os.path.isfile(archivo):
+            continue
+        huella.update(nombre.encode("utf-8", "surrogatepass") + b"\0")
+        with open(archivo, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                huella.update(bloque)
+    return huella.hexdigest()
+
+def _revision_tokenizer_hf(tokenizer):
+    # Revisión de los archivos del tokenizer: la huella de su carpeta si se cargó de una carpeta local
+    # (`CALCULADORA_TOKENIZERS_DIR`), o el commit del hub si transformers lo registró.
+    ruta = tokenizer.name_or_path
+    if os.path.isdir(ruta):
+        return _huella_carpeta(ruta)
+    revision = getattr(tokenizer, "_commit_hash", None) or getattr(tokenizer, "init_kwargs", {}).get("_commit_hash")
+    return revision or "sin-revision"
+
+def identidad_tokenizer_hf(tokenizer):
+    # Identidad y versión de un tokenizer de Hugging Face para la caché persistente de conteos. La versión
+    # incluye la revisión de los archivos del tokenizer y su tamaño de vocabulario, no solo la de transformers:
+    # si cambian los archivos, la caché de ese tokenizer se invalida.
+    try:
+        version = _VERSIONES_HF.get(tokenizer)
+    except TypeError:
+        version = None
+    if version is None:
+        version = f"{version_paquete('transformers')}:{_revision_tokenizer_hf(tokenizer)}:{len(tokenizer)}"
+        try:
+            _VERSIONES_HF[tokenizer] = version
+        except TypeError:
+            pass
+    return "hf:" + tokenizer.name_or_path, version
+
+def _contar_encoding_sin_cache(encoding, texto, tamano):
+    if len(texto) <= tamano:
+        return len(encoding.encode_ordinary(texto))
+    return sum(len(encoding.encode_ordinary(fragmento)) for fragmento in iterar_fragmentos_seguros(texto, tamano))
+
+def contar_tokens_encoding(encoding, texto, tamano=TAMANO_FRAGMENTO):
+    """
+    Cuenta los tokens de un texto con una codificación de tiktoken sin materializar la lista
+    completa de tokens: los textos grandes se codifican por fragmentos seguros, de modo que
+    la memoria máxima no depende del tamaño de la entrada y el conteo es exacto.
+    Si la caché persistente está activa, se consulta antes de codificar.
+    """
+    tokenizer, version = identidad_encoding(encoding)
+    return contar_con_cache(texto, tokenizer, version, lambda: _contar_encoding_sin_cache(encoding, texto, tamano))
+
+def _contar_hf_sin_cache(tokenizer, texto, tamano):
+    if len(texto) <= tamano:
+        return len(tokenizer.encode(texto))
+    total = tokenizer.num_special_tokens_to_add()
+    for fragmento in iterar_fragmentos_seguros(texto, tamano):
+        total += len(tokenizer.encode(fragmento, add_special_tokens=False))
+    return total
+
+def contar_tokens_encoding_archivo(encoding, ruta, tamano=TAMANO_FRAGMENTO, num_hilos=NUM_HILOS_BATCH, **opciones):
+    """
+    Cuenta los tokens del contenido de un archivo con una codificación de tiktoken sin cargarlo en memoria
+    (ver `iterar_fragmentos_archivo`). Los fragmentos se codifican en grupos de `num_hilos` con
+    `encode_ordinary_batch`; la memoria usada es del orden de `num_hilos * tamano`, no del tamaño del archivo.
+
+    Args:
+        encoding (tiktoken.Encoding): La codificación a usar.
+        ruta (str o os.PathLike): Archivo de texto.
+        **opciones: `codificacion` y `errores` de `iterar_fragmentos_archivo`.
+    """
+    fragmentos = iterar_fragmentos_archivo(ruta, tamano, **opciones)
+    if num_hilos <= 1:
+        # encode_ordinary_batch crea un pool de hilos en cada llamada; con un hilo no compensa.
+        return sum(len(encoding.encode_ordinary(fragmento)) for fragmento in fragmentos)
+    total = 0
+    for grupo in iterar_bloques(fragmentos, num_hilos):
+        total += sum(len(tokens) for tokens in encoding.encode_ordinary_batch(grupo, num_threads=num_hilos))
+    return total
+
+def contar_tokens_hf(tokenizer, texto, tamano=TAMANO_FRAGMENTO):
+    """
+    Igual que `contar_tokens_encoding` para tokenizers de Hugging Face. Los tokens especiales
+    (p. ej. [CLS] y [SEP]) se cuentan una sola vez, como en `tokenizer.encode(texto)`.
+
+    Los textos de hasta `tamano` caracteres se codifican enteros y el conteo es exacto. Los más largos
+    se cuentan por fragmentos y el conteo es aproximado: los tokenizers de sentencepiece (Llama 2,
+    Mistral...) añaden a cada fragmento el prefijo "▁", lo que puede sumar un token por fragmento
+    (unos pocos cada 64K caracteres).
+    """
+    identidad, version = identidad_tokenizer_hf(tokenizer)
+    return contar_con_cache(texto, identidad, version, lambda: _contar_hf_sin_cache(tokenizer, texto, tamano))
+
+def contar_tokens_fragmentando(codificar, texto, tamano=TAMANO_FRAGMENTO, identidad=None):
+    """
+    Cuenta tokens por fragmentos seguros con cualquier función `codificar(texto) -> lista de tokens`
+    (p. ej. `QwenTokenizer().encode`). Si se indica `identidad=(tokenizer, version)`, el conteo
+    pasa por la caché persistente.
+
+    Como en `contar_tokens_hf`, los textos de hasta `tamano` caracteres se codifican enteros; en los más
+    largos el conteo es aproximado si `codificar` añade tokens o prefijos al principio de cada texto.
+    """
+    def contar():
+        if len(texto) <= tamano:
+            return len(codificar(texto))
+        return sum(len(codificar(fragmento)) for fragmento in iterar_fragmentos_seguros(texto, tamano))
+
+    if identidad is None:
+        return contar()
+    return contar_con_cache(texto, identidad[0], identidad[1], contar)
+
+def contar_palabras(texto, tamano=TAMANO_FRAGMENTO):
+    """
+    Equivale a `len(texto.split())` pero, para textos grandes, separa por fragmentos seguros
+    en lugar de crear una lista con todas las palabras del texto.
+    """
+    if len(texto) <= tamano:
+        return len(texto.split())
+    return sum(len(fragmento.split()) for fragmento in iterar_fragmentos_seguros(texto, tamano))
+
+def resolver_encoding(modelo):
+    """
+    Devuelve la codificación de tiktoken para un modelo de OpenAI o un nombre de codificación
+    (ej. "gpt-4", "cl100k_base"), o None si no se encuentra.
+    """
+    try:
+        return obtener_encoding_para_modelo(modelo)
+    except KeyError:
+        try:
+            return obtener_encoding(modelo)
+        except (KeyError, ValueError):
+            return None
 """
 Esta función cuenta el número de tokens en un texto dado para un modelo específico.
 Los modelos de OpenAI tienen diferentes codificaciones, y esta función utiliza la biblioteca tiktoken para determinar el número de tokens en el texto según el modelo especificado.
 Args:
-    texto (str): El texto para tokenizar.
+    texto (str o os.PathLike): El texto para tokenizar, o la ruta (pathlib.Path) de un archivo de texto UTF-8,
+        que se cuenta por memory map sin leerlo entero (ver `contar_tokens_encoding_archivo`).
     modelo (str): El nombre del modelo de lenguaje (ej. "gpt-4", "cl100k_base").
     Returns:
     int: El número de tokens en el texto para el modelo especificado.
          Devuelve None si no se puede encontrar la codificación para el modelo.
 """
 def contar_tokens(texto, modelo):
-    try:
-        encoding = tiktoken.encoding_for_model(modelo)
-        return len(encoding.encode(texto))
-    except KeyError:
-        try:
-            encoding = tiktoken.get_encoding(modelo)
-            return len(encoding.encode(texto))
-        except KeyError:
-            return None
+    encoding = resolver_encoding(modelo)
+    if encoding is None:
+        return None
+    if isinstance(texto, os.PathLike):
+        return contar_tokens_encoding_archivo(encoding, texto)
+    return contar_tokens_encoding(encoding, texto)
+
+def iterar_bloques(textos, tamano=TAMANO_BLOQUE_BATCH):
+    """
+    Agrupa una lista o iterador de textos en listas de como máximo `tamano` elementos,
+    sin materializar toda la entrada.
+    """
+    bloque = []
+    for texto in textos:
+        bloque.append(texto)
+        if len(bloque) >= tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+def contar_tokens_encoding_batch(encoding, textos, num_hilos=NUM_HILOS_BATCH):
+    """
+    Cuenta los tokens de muchos textos con una codificación de tiktoken usando `encode_ordinary_batch`,
+    que reparte la codificación entre `num_hilos` hilos nativos (sin el GIL).
+
+    Args:
+        encoding (tiktoken.Encoding): La codificación a usar.
+        textos (iterable[str]): Lista o iterador de textos.
+        num_hilos (int, opcional): Hilos usados por tiktoken. Por defecto, el número de CPUs.
+
+    Returns:
+        numpy.ndarray: Conteo de tokens por texto (int64), en el mismo orden que la entrada.
+    """
+    tokenizer, version = identidad_encoding(encoding)
+
+    def contar_bloque(bloque):
+        if num_hilos <= 1:
+            # `encode_ordinary_batch` crea un pool de hilos en cada llamada: con un hilo, el bucle es más rápido.
+            return [len(encoding.encode_ordinary(texto)) for texto in bloque]
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(bloque, num_threads=num_hilos)]
+
+    conteos = []
+    for bloque in iterar_bloques(textos):
+        conteos.extend(contar_lote_con_cache(bloque, tokenizer, version, contar_bloque))
+    return np.array(conteos, dtype=np.int64)
+
+def contar_tokens_hf_batch(tokenizer, textos):
+    """
+    Cuenta los tokens de muchos textos con un tokenizer de Hugging Face llamando al tokenizer
+    con listas de textos, lo que en los tokenizers "fast" se paraleliza en Rust.
+    Los conteos incluyen los tokens especiales, igual que `tokenizer.encode(texto)`.
+
+    Returns:
+        numpy.ndarray: Conteo de tokens por texto (int64), en el mismo orden que la entrada.
+    """
+    identidad, version = identidad_tokenizer_hf(tokenizer)
+
+    def contar_bloque(bloque):
+        return [len(ids) for ids in tokenizer(bloque)["input_ids"]]
+
+    conteos = []
+    for bloque in iterar_bloques(textos):
+        conteos.extend(contar_lote_con_cache(bloque, identidad, version, contar_bloque))
+    return np.array(conteos, dtype=np.int64)
+
+def contar_tokens_funcion_batch(funcion, textos):
+    """
+    Aplica una función de conteo de un solo texto a una lista o iterador de textos
+    (para tokenizers sin API por lotes y para las estimaciones por palabras).
+
+    Returns:
+        numpy.ndarray: Conteo de tokens por texto (int64), en el mismo orden que la entrada.
+    """
+    return np.fromiter((funcion(texto) for texto in textos), dtype=np.int64)
+
+def contar_tokens_batch(textos, modelo, num_hilos=NUM_HILOS_BATCH):
+    """
+    Versión por lotes de `contar_tokens`.
+
+    Args:
+        textos (iterable[str]): Lista o iterador de textos.
+        modelo (str): El nombre del modelo de lenguaje o de la codificación (ej. "gpt-4", "cl100k_base").
+        num_hilos (int, opcional): Hilos usados por tiktoken. Por defecto, el número de CPUs.
+
+    Returns:
+        numpy.ndarray: Conteo de tokens por texto. Devuelve None si no se encuentra la codificación.
+    """
+    encoding = resolver_encoding(modelo)
+    if encoding is None:
+        return None
+    return contar_tokens_encoding_batch(encoding, textos, num_hilos)
 
 if __name__ == "__main__":
     texto_ejemplo = "Este es un texto de ejemplo para contar tokens."
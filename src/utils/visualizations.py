@@ -1,61 +1,263 @@
-import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
+
+from calculators.columnar import COLUMNA_REGISTRO_FECHA
+from calculators.results import (COLUMNA_AGUA, COLUMNA_CO2, COLUMNA_ELECTRICIDAD, COLUMNA_MODELO, COLUMNA_TOKENS_ENTRADA,
+                                 COLUMNA_TOKENS_SALIDA, columna_costo_total)
+from src.utils.metrics import medir
 
 """
 Este script contiene funciones para mostrar visualizaciones de datos utilizando Streamlit y Plotly.
 Las funciones están diseñadas para mostrar comparativas de costos, tokens, energía y emisiones de CO2 entre diferentes modelos de lenguaje.
 
+Las tablas pueden ser resultados de un batch con millones de filas, así que nunca se le pasan enteras a Plotly:
+se agregan antes en el servidor (`agregar_resultados`, por modelo, proveedor o día) y lo que llega al navegador
+está acotado. Las comparativas tienen como mucho `MAX_CATEGORIAS` barras por serie (las categorías menores
+se suman en "Otros"), las series por día como mucho `MAX_PUNTOS` puntos (los días se agrupan en periodos más
+largos) y la distribución de costos por fila se agrupa en `CUBETAS` cubetas con numpy cuando hay más de
+`UMBRAL_FILAS` filas.
+
+streamlit y plotly se importan al dibujar, así que `agregar_resultados` e `histograma` se pueden usar sin ellos
+(p. ej. desde un script que resume un batch).
 """
-def mostrar_comparativa_costos(df_resultados, moneda):
+
+COLUMNA_PROVEEDOR = "Proveedor"
+COLUMNA_DIA = "Día"
+CATEGORIA_OTROS = "Otros"
+AGRUPACIONES = (COLUMNA_MODELO, COLUMNA_PROVEEDOR, COLUMNA_DIA)
+
+# Filas a partir de las cuales los histogramas se calculan en el servidor y las líneas usan WebGL.
+UMBRAL_FILAS = 5000
+MAX_CATEGORIAS = 30
+MAX_PUNTOS = 2000
+CUBETAS = 50
+
+
+def _importar_graficos():
+    import plotly.express as px
+    import streamlit as st
+    return st, px
+
+
+def _columna_proveedor(df, catalogo):
+    if COLUMNA_PROVEEDOR in df.columns:
+        return df[COLUMNA_PROVEEDOR]
+    if catalogo is None:
+        from calculators.catalog import obtener_catalogo
+        catalogo = obtener_catalogo()
+    # Se resuelve una vez por modelo distinto, no por fila.
+    codigos, modelos = pd.factorize(df[COLUMNA_MODELO])
+    proveedores = np.array([getattr(catalogo.tokenizer(modelo), "proveedor", "desconocido") for modelo in modelos]
+                           + [None], dtype=object)
+    # Los modelos ausentes tienen código -1, que apunta al None final.
+    return pd.Series(proveedores[codigos], index=df.index)
+
+
+def _columna_dia(df, max_puntos):
+    if COLUMNA_DIA in df.columns:
+        fechas = pd.to_datetime(df[COLUMNA_DIA], errors="coerce", utc=True)
+    elif COLUMNA_REGISTRO_FECHA in df.columns:
+        fechas = df[COLUMNA_REGISTRO_FECHA]
+        if pd.api.types.is_numeric_dtype(fechas):
+            fechas = pd.to_datetime(fechas, unit="s", errors="coerce", utc=True)
+        else:
+            fechas = pd.to_datetime(fechas, errors="coerce", utc=True)
+    else:
+        raise ValueError(f"Para agrupar por día la tabla necesita la columna '{COLUMNA_REGISTRO_FECHA}'")
+    dias = fechas.dt.floor("D").dt.tz_localize(None)
+    inicio, fin = dias.min(), dias.max()
+    if pd.isna(inicio):
+        return dias
+    # Si hay más días que puntos, los días se agrupan en periodos de `paso` días contados desde el primero.
+    paso = -(-((fin - inicio).days + 1) // max_puntos)
+    if paso > 1:
+        dias = inicio + pd.to_timedelta((dias - inicio).dt.days // paso * paso, unit="D")
+    return dias
+
+
+def _agrupar_menores(agregado, clave, columnas, max_categorias):
+    # Conserva las `max_categorias - 1` categorías con más valor (en la primera columna) y suma el resto en "Otros".
+    if len(agregado) <= max_categorias:
+        return agregado
+    agregado = agregado.sort_values(columnas[0], ascending=False)
+    mayores, menores = agregado.iloc[:max_categorias - 1], agregado.iloc[max_categorias - 1:]
+    otros = pd.DataFrame([{clave: CATEGORIA_OTROS, **menores[columnas].sum().to_dict()}])
+    return pd.concat([mayores, otros], ignore_index=True)
+
+
+def _limitar_modelos(agregado, columnas, max_categorias):
+    # Con una serie por modelo, los modelos que no están entre los mayores pasan a llamarse "Otros" y se vuelven a sumar.
+    totales = agregado.groupby(COLUMNA_MODELO, sort=False)[columnas[0]].sum()
+    if len(totales) <= max_categorias:
+        return agregado
+    mayores = set(totales.nlargest(max_categorias - 1).index)
+    modelos = agregado[COLUMNA_MODELO].where(agregado[COLUMNA_MODELO].isin(mayores), CATEGORIA_OTROS)
+    clave = [columna for columna in agregado.columns if columna not in columnas and columna != COLUMNA_MODELO]
+    agregado = agregado.assign(**{COLUMNA_MODELO: modelos})
+    return agregado.groupby(clave + [COLUMNA_MODELO], sort=False)[columnas].sum().reset_index()
+
+
+def agregar_resultados(df_resultados, columnas, agrupar_por=COLUMNA_MODELO, por_modelo=False, catalogo=None,
+                       max_categorias=MAX_CATEGORIAS, max_puntos=MAX_PUNTOS):
+    """
+    Suma las columnas numéricas de una tabla de resultados por modelo, proveedor o día.
+
+    Args:
+        df_resultados (pandas.DataFrame): Tabla con las columnas de `calculators.results.columnas_resultados`
+            (una fila por modelo o por registro de un batch).
+        columnas (list[str]): Columnas que se suman. Los valores ausentes cuentan como 0.
+        agrupar_por (str, opcional): "Modelo", "Proveedor" (según el catálogo si la tabla no trae la columna)
+            o "Día" (a partir de la columna "timestamp").
+        por_modelo (bool, opcional): Con "Proveedor" o "Día", separa además cada modelo (para colorear por modelo).
+        catalogo (Catalogo, opcional): Para resolver el proveedor. Por defecto, el catálogo vigente.
+        max_categorias (int, opcional): Modelos o proveedores distintos que se conservan; el resto se suma en "Otros".
+        max_puntos (int, opcional): Puntos máximos al agrupar por día (entre todas las series si `por_modelo`);
+            si hay más días, se agrupan varios por periodo.
+
+    Returns:
+        pandas.DataFrame: Una fila por grupo con la columna de agrupación (y "Modelo" si `por_modelo`) y las sumas.
+    """
+    if agrupar_por not in AGRUPACIONES:
+        raise ValueError(f"Agrupación no válida: {agrupar_por!r}; se esperaba una de {AGRUPACIONES}")
+    datos = df_resultados[columnas].fillna(0)
+    if agrupar_por == COLUMNA_MODELO:
+        claves = [df_resultados[COLUMNA_MODELO]]
+    elif agrupar_por == COLUMNA_PROVEEDOR:
+        claves = [_columna_proveedor(df_resultados, catalogo)]
+    else:
+        series = min(df_resultados[COLUMNA_MODELO].nunique(), max_categorias) if por_modelo else 1
+        # El límite de puntos es del gráfico entero: se reparte entre las series de cada modelo.
+        claves = [_columna_dia(df_resultados, max(1, max_puntos // max(series, 1)))]
+    por_modelo = por_modelo and agrupar_por != COLUMNA_MODELO
+    if por_modelo:
+        claves.append(df_resultados[COLUMNA_MODELO])
+    nombres = [agrupar_por, COLUMNA_MODELO] if por_modelo else [agrupar_por]
+    agregado = datos.groupby([clave.rename(nombre) for clave, nombre in zip(claves, nombres)], sort=False,
+                             observed=True, dropna=True).sum().reset_index()
+
+    if agrupar_por == COLUMNA_DIA:
+        if por_modelo:
+            agregado = _limitar_modelos(agregado, columnas, max_categorias)
+        return agregado.sort_values(nombres, ignore_index=True)
+    if por_modelo:
+        return _limitar_modelos(agregado, columnas, max_categorias)
+    return _agrupar_menores(agregado, agrupar_por, columnas, max_categorias)
+
+
+def histograma(valores, cubetas=CUBETAS):
+    """
+    Agrupa los valores en `cubetas` intervalos iguales con numpy. Devuelve un DataFrame con las columnas
+    "Desde", "Hasta", "Centro" y "Filas" (una fila por cubeta), que se dibuja como barras.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[np.isfinite(valores)]
+    if not len(valores):
+        return pd.DataFrame(columns=["Desde", "Hasta", "Centro", "Filas"])
+    frecuencias, bordes = np.histogram(valores, bins=cubetas)
+    return pd.DataFrame({"Desde": bordes[:-1], "Hasta": bordes[1:], "Centro": (bordes[:-1] + bordes[1:]) / 2,
+                         "Filas": frecuencias})
+
+
+def _dibujar_barras(df_resultados, columnas, agrupar_por, titulo, nombre_tipo, grafico):
+    st, px = _importar_graficos()
+    with medir("grafico", grafico=grafico, unidades=len(df_resultados)):
+        agregado = agregar_resultados(df_resultados, columnas, agrupar_por)
+        if len(columnas) == 1:
+            fig = px.bar(agregado, x=agrupar_por, y=columnas[0], title=titulo)
+        else:
+            df_largo = agregado.melt(id_vars=agrupar_por, var_name=nombre_tipo, value_name="Cantidad")
+            fig = px.bar(df_largo, x=agrupar_por, y="Cantidad", color=nombre_tipo, title=titulo, barmode="group")
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def mostrar_comparativa_costos(df_resultados, moneda, agrupar_por=COLUMNA_MODELO):
+    """
+    Muestra un gráfico de barras con el costo total por modelo (o por proveedor o día, según `agrupar_por`).
+    """
+    st, _ = _importar_graficos()
     if not df_resultados.empty:
-        fig_costos = px.bar(df_resultados, x="Modelo", y=f"Costo Total ({moneda})",
-                            title=f"Costo Total Estimado por Modelo ({moneda})")
-        st.plotly_chart(fig_costos, use_container_width=True)
+        _dibujar_barras(df_resultados, [columna_costo_total(moneda)], agrupar_por,
+                        f"Costo Total Estimado por {agrupar_por} ({moneda})", None, "costos")
     else:
         st.warning("No hay datos de costos para mostrar la comparativa.")
-"""
- Esta función muestra un gráfico de barras comparando la cantidad de tokens de entrada y salida por modelo.
-"""
-def mostrar_comparativa_tokens(df_resultados):
-   
+
+
+def mostrar_comparativa_tokens(df_resultados, agrupar_por=COLUMNA_MODELO):
+    """
+    Muestra un gráfico de barras comparando la cantidad de tokens de entrada y salida por modelo.
+    """
+    st, _ = _importar_graficos()
     if not df_resultados.empty:
-        df_tokens = df_resultados[["Modelo", "Tokens Entrada", "Tokens Salida"]].melt(
-            id_vars="Modelo", var_name="Tipo de Token", value_name="Cantidad"
-        )
-        fig_tokens = px.bar(df_tokens, x="Modelo", y="Cantidad", color="Tipo de Token",
-                           title="Cantidad de Tokens de Entrada y Salida por Modelo", barmode="group")
-        st.plotly_chart(fig_tokens, use_container_width=True)
+        _dibujar_barras(df_resultados, [COLUMNA_TOKENS_ENTRADA, COLUMNA_TOKENS_SALIDA], agrupar_por,
+                        f"Cantidad de Tokens de Entrada y Salida por {agrupar_por}", "Tipo de Token", "tokens")
     else:
         st.warning("No hay datos de tokens para mostrar la comparativa.")
 
+
+def mostrar_comparativa_energia(df_resultados, agrupar_por=COLUMNA_MODELO):
     """
-    Esta función muestra un gráfico de barras comparando el gasto energético estimado por modelo.
-    Los datos de energía se obtienen de un DataFrame que contiene la electricidad y el agua consumida por cada modelo.
+    Muestra un gráfico de barras comparando el gasto energético estimado (electricidad y agua) por modelo.
     """
-def mostrar_comparativa_energia(df_resultados):
-
+    st, _ = _importar_graficos()
     if not df_resultados.empty:
-        df_energia = df_resultados[["Modelo", "Electricidad (kWh)", "Agua (litros)"]].melt(
-            id_vars="Modelo", var_name="Tipo de Gasto", value_name="Cantidad"
-        )
-        fig_energia = px.bar(df_energia, x="Modelo", y="Cantidad", color="Tipo de Gasto",
-                            title="Gasto Energético Estimado por Modelo", barmode="group")
-        st.plotly_chart(fig_energia, use_container_width=True)
+        _dibujar_barras(df_resultados, [COLUMNA_ELECTRICIDAD, COLUMNA_AGUA], agrupar_por,
+                        f"Gasto Energético Estimado por {agrupar_por}", "Tipo de Gasto", "energia")
     else:
         st.warning("No hay datos de gasto energético para mostrar la comparativa.")
+
+
+def mostrar_comparativa_co2(df_resultados, agrupar_por=COLUMNA_MODELO):
     """
-    Esta función muestra un gráfico de barras comparando las emisiones de CO2 estimadas por modelo.
+    Muestra un gráfico de barras comparando las emisiones de CO2 estimadas por modelo.
     """
-def mostrar_comparativa_co2(df_resultados):
-
-    if not df_resultados.empty and "CO2 (kg)" in df_resultados.columns:
-        fig_co2 = px.bar(df_resultados, x="Modelo", y="CO2 (kg)",
-                            title="Emisiones de CO2 Estimadas por Modelo")
-        st.plotly_chart(fig_co2, use_container_width=True)
+    st, _ = _importar_graficos()
+    if not df_resultados.empty and COLUMNA_CO2 in df_resultados.columns:
+        _dibujar_barras(df_resultados, [COLUMNA_CO2], agrupar_por,
+                        f"Emisiones de CO2 Estimadas por {agrupar_por}", None, "co2")
     else:
         st.warning("No hay datos de emisiones de CO2 para mostrar la comparativa.")
 
+
+def mostrar_costo_por_dia(df_resultados, moneda):
+    """
+    Muestra la evolución del costo total por día y modelo de un batch con columna "timestamp". Con muchos
+    días se agrupan en periodos más largos y, si la serie tiene muchos puntos, se dibuja con WebGL.
+    """
+    st, px = _importar_graficos()
+    if df_resultados.empty or COLUMNA_REGISTRO_FECHA not in df_resultados.columns:
+        st.warning("No hay datos con fecha para mostrar la evolución de costos.")
+        return
+    columna = columna_costo_total(moneda)
+    with medir("grafico", grafico="costo_por_dia", unidades=len(df_resultados)):
+        agregado = agregar_resultados(df_resultados, [columna], COLUMNA_DIA, por_modelo=True)
+        fig = px.line(agregado, x=COLUMNA_DIA, y=columna, color=COLUMNA_MODELO, markers=False,
+                      title=f"Costo Total por Día ({moneda})",
+                      render_mode="webgl" if len(agregado) > UMBRAL_FILAS else "auto")
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def mostrar_distribucion_costos(df_resultados, moneda, cubetas=CUBETAS):
+    """
+    Muestra el histograma del costo total por fila. Hasta `UMBRAL_FILAS` filas lo calcula Plotly en el
+    navegador; con más, las cubetas se calculan aquí y solo se envían sus frecuencias.
+    """
+    st, px = _importar_graficos()
+    columna = columna_costo_total(moneda)
+    if df_resultados.empty or columna not in df_resultados.columns:
+        st.warning("No hay datos de costos para mostrar la distribución.")
+        return
+    titulo = f"Distribución del Costo por Fila ({moneda})"
+    with medir("grafico", grafico="distribucion_costos", unidades=len(df_resultados)):
+        if len(df_resultados) <= UMBRAL_FILAS:
+            fig = px.histogram(df_resultados, x=columna, nbins=cubetas, title=titulo)
+        else:
+            cubetas_costo = histograma(df_resultados[columna].to_numpy(dtype=np.float64, na_value=np.nan), cubetas)
+            fig = px.bar(cubetas_costo, x="Centro", y="Filas", hover_data=["Desde", "Hasta"], title=titulo,
+                         labels={"Centro": columna})
+            fig.update_traces(width=(cubetas_costo["Hasta"] - cubetas_costo["Desde"]).tolist())
+        st.plotly_chart(fig, use_container_width=True)
+
+
 if __name__ == "__main__":
     # Ejemplo de uso (esto no se ejecutará cuando se importe como módulo)
     data_ejemplo = {
@@ -68,6 +270,7 @@ if __name__ == "__main__":
         "CO2 (kg)": [0.05, 0.1, 0.07]
     }
     df_ejemplo = pd.DataFrame(data_ejemplo)
+    st, _ = _importar_graficos()
 
     st.title("Ejemplo de Visualizaciones")
 
@@ -81,4 +284,4 @@ if __name__ == "__main__":
     mostrar_comparativa_energia(df_ejemplo)
 
     st.subheader("Comparativa de CO2")
-    mostrar_comparativa_co2(df_ejemplo)
\ No newline at end of file
+    mostrar_comparativa_co2(df_ejemplo)
@@ -35,7 +35,7 @@ def mock_estimar_gasto_energetico(modelo, total_tokens):
 
 # Cargar precios de modelos desde el archivo JSON (simulando la carga real)
 with open("src/config/model_prices.json", "r") as f:
-    precios_modelos_data = json.load()
+    precios_modelos_data = json.load(f)
     precios_modelos = precios_modelos_data
     datos_energia = precios_modelos_data.get("energia", {})
 
@@ -0,0 +1,259 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from calculators import batch
+from calculators import cli
+from calculators import columnar
+from calculators import parallel
+from src.analyzers import registry
+from calculators.catalog import obtener_catalogo
+
+registros_jsonl = "\n".join(json.dumps(registro) for registro in [
+    {"id": 1, "modelo": "GPT-4o", "prompt": "Hola, ¿cómo estás?", "respuesta": "Muy bien, gracias."},
+    {"id": 2, "modelo": "Claude 3 Haiku", "prompt": "Resume este texto", "respuesta": "Resumen breve."},
+    {"id": 3, "modelo": "Modelo Inexistente", "prompt": "a", "respuesta": "b"},
+]) + "\n"
+
+class TestRegistro(unittest.TestCase):
+
+    def test_todos_los_modelos_del_catalogo_tienen_analizador(self):
+        catalogo = obtener_catalogo()
+        for modelo in catalogo.modelos:
+            conteo = registry.contar_tokens_modelo("Hola mundo, esto es una prueba.", modelo, catalogo)
+            self.assertIsNotNone(conteo, modelo)
+            lote = registry.contar_tokens_modelo_batch(["Hola mundo", ""], modelo, catalogo)
+            self.assertEqual(len(lote), 2)
+
+    def test_modelo_fuera_del_catalogo(self):
+        self.assertIsNone(registry.contar_tokens_modelo("Hola", "Modelo Inexistente", obtener_catalogo()))
+
+    def test_conteo_deduplicado(self):
+        catalogo = obtener_catalogo()
+        deduplicacion = registry.ConteoDeduplicado(max_textos=3)
+        textos = ["hola", "x" * 500, "hola", "", "x" * 500]
+        esperado = registry.contar_tokens_modelo_batch(textos, "GPT-4o", catalogo).tolist()
+        self.assertEqual(deduplicacion.contar(textos, "GPT-4o", catalogo).tolist(), esperado)
+        self.assertEqual(deduplicacion.tokenizados, 3)
+        # En un lote posterior los textos ya contados no se vuelven a tokenizar.
+        self.assertEqual(deduplicacion.contar(textos[:2], "GPT-4o", catalogo).tolist(), esperado[:2])
+        self.assertEqual(deduplicacion.a_dict(), {"textos": 7, "textos_tokenizados": 3, "ratio_deduplicacion": 7 / 3,
+                                                    "caracteres": 1512, "caracteres_codificados": 504})
+        # Al superar `max_textos` la memoria se vacía sin afectar al resultado.
+        self.assertEqual(deduplicacion.contar(["a", "b", "hola"], "GPT-4o", catalogo).tolist(),
+                         registry.contar_tokens_modelo_batch(["a", "b", "hola"], "GPT-4o", catalogo).tolist())
+        self.assertIsNone(deduplicacion.contar(textos, "Modelo Inexistente", catalogo))
+
+    def test_prefijos_compartidos(self):
+        catalogo = obtener_catalogo()
+        sistema = "Eres un asistente que responde en español con frases cortas. " * 10
+        textos = [sistema + f"Pregunta {i}: ¿cuánto cuesta?" for i in range(3)] + ["otro texto " * 30]
+        # Con los analizadores de tiktoken los segmentos repetidos no se vuelven a codificar.
+        for modelo, reutiliza in (("GPT-4o", True), ("Claude 3 Haiku", True), ("Gemini 1.5 Flash", False)):
+            deduplicacion = registry.ConteoDeduplicado(tamano_segmento=64)
+            esperado = registry.contar_tokens_modelo_batch(textos, modelo, catalogo).tolist()
+            conteos, prefijos = deduplicacion.contar_con_prefijos(textos, modelo, catalogo)
+            self.assertEqual(conteos.tolist(), esperado, modelo)
+            # El primer texto aún no comparte nada; los siguientes repiten casi todo el prompt de sistema.
+            self.assertEqual(prefijos[0], 0)
+            self.assertTrue(0.8 * esperado[0] < prefijos[1] <= esperado[1], modelo)
+            self.assertEqual(prefijos[3], 0)
+            self.assertEqual(deduplicacion.caracteres_codificados < deduplicacion.caracteres, reutiliza, modelo)
+
+    def test_sin_encoding_el_texto_se_cuenta_entero(self):
+        # Si la codificación de Anthropic no está disponible, el analizador estima y los segmentos no se suman.
+        catalogo = obtener_catalogo()
+        sistema = "Eres un asistente que responde en español con frases cortas. " * 10
+        textos = [sistema + f"Pregunta {i}." for i in range(3)]
+        sin_encoding = ValueError("sin encoding")
+        with mock.patch("src.analyzers.anthropic_analyzer._encoding_anthropic", side_effect=sin_encoding):
+            deduplicacion = registry.ConteoDeduplicado(tamano_segmento=64)
+            esperado = registry.contar_tokens_modelo_batch(textos, "Claude 3 Haiku", catalogo).tolist()
+            conteos = deduplicacion.contar(textos, "Claude 3 Haiku", catalogo)
+        self.assertEqual(conteos.tolist(), esperado)
+        self.assertEqual(deduplicacion.caracteres_codificados, deduplicacion.caracteres)
+
+    def test_prefijos_por_columna_y_tokenizer(self):
+        catalogo = obtener_catalogo()
+        sistema = "Eres un asistente que responde en español con frases cortas. " * 10
+        deduplicacion = registry.ConteoDeduplicado(tamano_segmento=64)
+        # Una respuesta que empieza como el prompt siguiente no es un prefijo repetido de los prompts.
+        deduplicacion.contar_con_prefijos([sistema + "Respuesta."], "GPT-4o", catalogo, columna="respuesta")
+        _, prefijos = deduplicacion.contar_con_prefijos([sistema + "Pregunta."], "GPT-4o", catalogo, columna="prompt")
+        self.assertEqual(prefijos.tolist(), [0])
+        # Ni lo es el prompt de otro modelo con otro tokenizer.
+        _, prefijos = deduplicacion.contar_con_prefijos([sistema + "Otra."], "Claude 3 Haiku", catalogo,
+                                                        columna="prompt")
+        self.assertEqual(prefijos.tolist(), [0])
+        _, prefijos = deduplicacion.contar_con_prefijos([sistema + "Otra."], "GPT-4o", catalogo, columna="prompt")
+        self.assertGreater(prefijos[0], 0)
+
+class TestBatch(unittest.TestCase):
+
+    def test_procesa_jsonl_y_acumula_totales(self):
+        salida = io.StringIO()
+        totales = batch.ejecutar_batch(io.StringIO(registros_jsonl), salida, tamano_bloque=2)
+        filas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+
+        self.assertEqual([fila["id"] for fila in filas], [1, 2, 3])
+        self.assertNotIn("prompt", filas[0])
+        self.assertEqual(filas[0]["Modelo"], "GPT-4o")
+        self.assertGreater(filas[0]["Tokens Entrada"], 0)
+        self.assertIsNone(filas[2]["Costo Total (USD)"])
+        self.assertEqual(totales.filas, 3)
+        self.assertEqual(totales.filas_sin_precio, 1)
+        self.assertAlmostEqual(totales.costo_total, filas[0]["Costo Total (USD)"] + filas[1]["Costo Total (USD)"])
+
+    def test_csv_con_modelo_por_defecto(self):
+        entrada = io.StringIO("id,prompt,respuesta\n1,Hola mundo,Adiós\n")
+        salida = io.StringIO()
+        batch.ejecutar_batch(entrada, salida, formato_entrada="csv", formato_salida="csv", modelo_por_defecto="GPT-4")
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual(lineas[0].split(",")[:2], ["id", "Modelo"])
+        self.assertTrue(lineas[1].startswith("1,GPT-4,"))
+
+    def test_textos_en_archivos(self):
+        texto = "Cuenta los tokens de este archivo sin cargarlo entero. 中文 " * 30
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "prompt.txt")
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write(texto)
+            registros = [{"modelo": "GPT-4o", "prompt": ruta, "respuesta": ""},
+                         {"modelo": "Modelo Inexistente", "prompt": ruta, "respuesta": ""}]
+            filas = list(batch.procesar_registros(registros, textos_en_archivos=True))
+            esperado = registry.contar_tokens_modelo(texto, "GPT-4o", obtener_catalogo())
+            self.assertEqual(filas[0]["Tokens Entrada"], esperado)
+            self.assertEqual(filas[0]["Tokens Salida"], 0)
+            self.assertIsNone(filas[1]["Tokens Entrada"])
+            with self.assertRaises(FileNotFoundError):
+                list(batch.procesar_registros([{"modelo": "GPT-4o", "prompt": ruta + ".no"}], textos_en_archivos=True))
+
+    def test_deduplicacion_no_cambia_los_resultados(self):
+        registros = [{"modelo": modelo, "prompt": f"pregunta {i % 3} " * 50, "respuesta": "sí"}
+                     for i, modelo in enumerate(["GPT-4o", "Claude 3 Haiku"] * 20)]
+        deduplicados, totales = batch.TotalesAcumulados(), batch.TotalesAcumulados()
+        filas = list(batch.procesar_registros(registros, totales=deduplicados, tamano_bloque=7))
+        self.assertEqual(filas, list(batch.procesar_registros(registros, totales=totales, deduplicar=False)))
+        self.assertNotIn("deduplicacion", totales.a_dict())
+        self.assertEqual(deduplicados.a_dict()["deduplicacion"]["textos"], 80)
+        self.assertEqual(deduplicados.a_dict()["deduplicacion"]["textos_tokenizados"], 8)
+
+    def test_prompt_de_sistema(self):
+        sistema = "Responde siempre en formato JSON y sin explicaciones. " * 20
+        registros = [{"modelo": "GPT-4o", "sistema": sistema, "prompt": f"Pregunta {i}", "respuesta": "{}"}
+                     for i in range(4)]
+        totales = batch.TotalesAcumulados()
+        filas = list(batch.procesar_registros(registros, totales=totales))
+        self.assertNotIn("sistema", filas[0])
+        tokens_sistema = registry.contar_tokens_modelo(sistema, "GPT-4o", obtener_catalogo())
+        tokens_prompt = registry.contar_tokens_modelo("Pregunta 0", "GPT-4o", obtener_catalogo())
+        self.assertEqual(filas[0]["Tokens Entrada"], tokens_sistema + tokens_prompt)
+        prefijo = totales.a_dict()["prefijo_repetido"]
+        self.assertEqual(prefijo["tokens"], 4 * tokens_sistema)
+        self.assertTrue(0 < prefijo["fraccion_costo"] < 1)
+
+    def test_procesar_registros_es_perezoso(self):
+        def registros():
+            for i in range(10):
+                yield {"modelo": "GPT-4", "prompt": f"texto {i}", "respuesta": ""}
+            raise AssertionError("se leyó más allá del primer bloque")
+        filas = batch.procesar_registros(registros(), tamano_bloque=10)
+        self.assertEqual(len([next(filas) for _ in range(10)]), 10)
+
+    def test_trabajadores_conservan_el_orden_y_los_resultados(self):
+        registros = [{"id": i, "modelo": ["GPT-4o", "Claude 3 Haiku", "Gemini 1.5 Flash"][i % 3],
+                      "prompt": "hola mundo " * (i % 7), "respuesta": "respuesta"} for i in range(50)]
+        secuencial = list(batch.procesar_registros(iter(registros), tamano_bloque=7))
+        estadisticas = parallel.EstadisticasTrabajadores()
+        totales = batch.TotalesAcumulados()
+        paralelo = list(batch.procesar_registros(iter(registros), tamano_bloque=7, trabajadores=2, totales=totales,
+                                                 estadisticas_trabajadores=estadisticas))
+        self.assertEqual(paralelo, secuencial)
+        self.assertEqual(totales.filas, 50)
+        trabajadores = estadisticas.a_dict()["trabajadores"]
+        self.assertEqual(sum(datos["filas"] for datos in trabajadores.values()), 50)
+
+    def test_precarga_antes_de_fork_solo_carga_tiktoken(self):
+        from src.utils.tokenizer_pool import POOL
+        with mock.patch.object(POOL, "obtener", wraps=POOL.obtener) as obtener, \
+                mock.patch("src.analyzers.registry.contar_tokens_modelo_batch") as contar:
+            batch._precargar_catalogo()
+        contar.assert_not_called()
+        tipos = {llamada.args[0][0] for llamada in obtener.call_args_list}
+        self.assertEqual(tipos, {"tiktoken"})
+
+    def test_mapear_en_procesos_se_puede_detener_antes_de_tiempo(self):
+        resultados = parallel.mapear_en_procesos(abs, iter(range(-1000, 0)), 2, max_pendientes=2)
+        self.assertEqual([next(resultados)[2] for _ in range(3)], [1000, 999, 998])
+        resultados.close()
+
+    def test_cli_batch(self):
+        parser = cli.construir_parser()
+        args = parser.parse_args(["batch", "registros.csv", "--modelo", "GPT-4o", "--intervalo-totales", "10", "--workers", "4"])
+        self.assertEqual(args.comando, "batch")
+        self.assertEqual(batch.detectar_formato(args.entrada, args.formato_entrada), "csv")
+        self.assertEqual(args.intervalo_totales, 10)
+        self.assertEqual(args.workers, 4)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+@unittest.skipIf(pa is None, "pyarrow no está instalado")
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.entrada = os.path.join(self.directorio.name, "registros.parquet")
+        self.salida = os.path.join(self.directorio.name, "resultados.parquet")
+        registros = [json.loads(linea) for linea in registros_jsonl.splitlines()]
+        tabla = pa.table({
+            "timestamp": pa.array([1_700_000_000_000 + i for i in range(3)], pa.timestamp("ms")),
+            "modelo": [registro["modelo"] for registro in registros],
+            "prompt": [registro["prompt"] for registro in registros],
+            "respuesta": [registro["respuesta"] for registro in registros],
+            "sin_usar": ["x"] * 3,
+        })
+        pq.write_table(tabla, self.entrada, row_group_size=2)
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def test_solo_lee_las_columnas_necesarias(self):
+        lector = columnar.LectorColumnar(self.entrada, "parquet", ["modelo", "prompt", "respuesta"])
+        self.assertEqual(lector.columnas, ["modelo", "prompt", "respuesta", "timestamp"])
+        self.assertNotIn("sin_usar", next(iter(lector)))
+        with self.assertRaises(ValueError):
+            columnar.LectorColumnar(self.entrada, "parquet", ["modelo"], conservar=["no_existe"])
+
+    def test_parquet_a_parquet_con_columnas_numericas(self):
+        totales = batch.ejecutar_batch(self.entrada, self.salida, "parquet", "parquet", tamano_bloque=2)
+        tabla = pq.read_table(self.salida)
+
+        self.assertEqual(tabla.column_names, ["timestamp"] + list(columnar.esquema_resultados().names))
+        self.assertEqual(tabla.schema.field("timestamp").type, pa.timestamp("ms"))
+        self.assertEqual(tabla.schema.field("Tokens Entrada").type, pa.int64())
+        self.assertEqual(tabla.schema.field("CO2 (kg)").type, pa.float64())
+        self.assertEqual(tabla.column("Modelo").to_pylist(), ["GPT-4o", "Claude 3 Haiku", "Modelo Inexistente"])
+        self.assertIsNone(tabla.column("Costo Total (USD)")[2].as_py())
+        self.assertAlmostEqual(pa.compute.sum(tabla.column("Costo Total (USD)")).as_py(), totales.costo_total)
+
+    def test_jsonl_a_parquet_y_sin_filas(self):
+        batch.ejecutar_batch(io.StringIO(registros_jsonl), self.salida, "jsonl", "parquet")
+        self.assertEqual(pq.read_table(self.salida).column("id").to_pylist(), [1, 2, 3])
+
+        batch.ejecutar_batch(io.StringIO(""), self.salida, "jsonl", "parquet")
+        self.assertEqual(pq.read_table(self.salida).column_names, list(columnar.esquema_resultados().names))
+
+    def test_detecta_formatos_columnares(self):
+        self.assertEqual(batch.detectar_formato("datos.parquet"), "parquet")
+        self.assertEqual(batch.detectar_formato("datos.feather"), "arrow")
+        self.assertEqual(batch.detectar_formato("datos.jsonl"), "jsonl")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from benchmarks import corpus
+from benchmarks import run_benchmarks
+
+class TestCorpus(unittest.TestCase):
+
+    def test_textos_del_tamano_pedido_y_deterministas(self):
+        for script in corpus.SCRIPTS:
+            for tamano in (100, 10_000, 2 * corpus.TAMANO_BLOQUE_BASE + 7):
+                texto = corpus.generar_texto(script, tamano)
+                # Como mucho 3 bytes menos, para no partir un carácter multibyte.
+                self.assertLessEqual(tamano - len(texto.encode("utf-8")), 3, (script, tamano))
+        self.assertEqual(corpus.generar_texto("es", 1000), corpus.generar_texto("es", 1000))
+        self.assertNotEqual(corpus.generar_texto("es", 1000), corpus.generar_texto("en", 1000))
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_parsear_tamano(self):
+        self.assertEqual(run_benchmarks.parsear_tamano("100B"), 100)
+        self.assertEqual(run_benchmarks.parsear_tamano("10KB"), 10_000)
+        self.assertEqual(run_benchmarks.parsear_tamano("100MB"), 100_000_000)
+        self.assertEqual(run_benchmarks.formatear_tamano(1_000_000), "1MB")
+
+    def test_comparar_detecta_regresiones(self):
+        resultados = {"a": {"unidades_por_segundo": 70.0}, "b": {"unidades_por_segundo": 90.0}, "c": {"unidades_por_segundo": 1.0}}
+        referencia = {"a": {"unidades_por_segundo": 100.0}, "b": {"unidades_por_segundo": 100.0}}
+        comparacion = {fila["caso"]: fila for fila in run_benchmarks.comparar(resultados, referencia, umbral=0.25)}
+        self.assertTrue(comparacion["a"]["regresion"])
+        self.assertFalse(comparacion["b"]["regresion"])
+        self.assertNotIn("c", comparacion)
+
+    def test_ejecuta_todos_los_analizadores(self):
+        resultados = run_benchmarks.ejecutar([100], [10], scripts=["zh"], repeticiones=1)
+        self.assertIn("contar_tokens[gpt-4o]|zh|100B", resultados)
+        for _, (_, contar, contar_batch, _) in run_benchmarks.ANALIZADORES.items():
+            self.assertTrue(any(caso.startswith(contar + "[") for caso in resultados), contar)
+            self.assertTrue(any(caso.startswith(contar_batch + "[") for caso in resultados), contar_batch)
+        self.assertGreater(resultados["estimar_gasto_energetico_vectorizado|filas|10"]["unidades_por_segundo"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,11 @@
 import unittest
-from src.calculators import token_costs
-from src.calculators import energy_estimation
+from calculators import token_costs
+from calculators import energy_estimation
 import json
 
 # Cargar datos de precios y energía para las pruebas
 with open("src/config/model_prices.json", "r") as f:
-    precios_energia_data = json.load()
+    precios_energia_data = json.load(f)
     precios_modelos = precios_energia_data
     datos_energia = precios_energia_data.get("energia", {})
 
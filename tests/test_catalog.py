@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+from calculators import catalog
+
+datos_catalogo = {
+    "GPT-4": {"entrada": 0.002, "salida": 0.008},
+    "Claude 3 Haiku": {"entrada": 0.00025, "salida": 0.00125},
+    "energia": {"gpt-4": {"electricidad_por_1k_tokens": 0.25, "agua_por_1k_tokens": 0.9}},
+    "tokenizers": {"GPT-4": {"proveedor": "openai", "modelo_tokenizer": "gpt-4"}},
+}
+
+class TestCatalogo(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "catalogo.json")
+        self.escribir(datos_catalogo)
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def escribir(self, datos, mtime_ns=None):
+        with open(self.ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        if mtime_ns is not None:
+            os.utime(self.ruta, ns=(mtime_ns, mtime_ns))
+
+    def test_catalogo_del_repositorio_es_valido(self):
+        catalogo = catalog.cargar_catalogo(catalog.RUTA_CATALOGO_POR_DEFECTO)
+        self.assertIn("GPT-4", catalogo.modelos)
+        self.assertNotIn("energia", catalogo.modelos)
+        for modelo in catalogo.modelos:
+            self.assertIsNotNone(catalogo.tokenizer(modelo), modelo)
+
+    def test_catalogo_es_inmutable_y_compilado(self):
+        catalogo = catalog.cargar_catalogo(self.ruta)
+        with self.assertRaises(TypeError):
+            catalogo.precios["GPT-4"]["entrada"] = 1
+        self.assertEqual(catalogo.matriz_precios.modelos, ("GPT-4", "Claude 3 Haiku"))
+        self.assertEqual(catalogo.indice_energia.factores("GPT-4"), (0.25, 0.9))
+        self.assertEqual(catalogo.tokenizer("GPT-4"), catalog.TokenizerModelo("openai", "gpt-4"))
+
+    def test_validacion_rechaza_datos_incorrectos(self):
+        invalidos = [
+            {"GPT-4": {"entrada": -1, "salida": 0.008}},
+            {"GPT-4": {"entrada": "0.002", "salida": 0.008}},
+            {"GPT-4": {"entrada": 0.002}},
+            {"GPT-4": {"entrada": 0.002, "salida": 0.008}, "energia": {"gpt-4": {"agua_por_1k_tokens": 0.9}}},
+            {"GPT-4": {"entrada": 0.002, "salida": 0.008}, "tokenizers": {"GPT-5": {"proveedor": "openai", "modelo_tokenizer": "gpt-5"}}},
+            {"GPT-4": {"entrada": 0.002, "salida": 0.008}, "tokenizers": {"GPT-4": {"proveedor": "otro", "modelo_tokenizer": "gpt-4"}}},
+        ]
+        for datos in invalidos:
+            with self.assertRaises(ValueError):
+                catalog.construir_catalogo(datos)
+
+    def test_recarga_al_cambiar_el_archivo(self):
+        intervalo = catalog.INTERVALO_VERIFICACION
+        catalog.INTERVALO_VERIFICACION = 0
+        try:
+            primero = catalog.obtener_catalogo(self.ruta)
+            self.assertIs(catalog.obtener_catalogo(self.ruta), primero)
+
+            nuevos = dict(datos_catalogo, **{"GPT-4": {"entrada": 0.003, "salida": 0.009}})
+            self.escribir(nuevos, primero.mtime_ns + 1_000_000_000)
+            segundo = catalog.obtener_catalogo(self.ruta)
+            self.assertEqual(segundo.precios["GPT-4"]["entrada"], 0.003)
+
+            # Un archivo inválido no reemplaza al catálogo vigente.
+            self.escribir({"GPT-4": {"entrada": -1, "salida": 0}}, segundo.mtime_ns + 1_000_000_000)
+            self.assertIs(catalog.obtener_catalogo(self.ruta), segundo)
+        finally:
+            catalog.INTERVALO_VERIFICACION = intervalo
+
+if __name__ == '__main__':
+    unittest.main()
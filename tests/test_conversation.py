@@ -0,0 +1,54 @@
+import unittest
+from calculators import conversation
+from src.analyzers import registry
+from calculators.catalog import obtener_catalogo
+
+MENSAJES = [
+    {"rol": "system", "contenido": "Eres un asistente que responde en español."},
+    {"rol": "user", "contenido": "¿Cuánto cuesta un token?"},
+    {"rol": "assistant", "contenido": "Depende del modelo y del proveedor."},
+    {"role": "user", "content": [{"type": "text", "text": "¿Y la energía?"}, {"type": "image_url"}]},
+    {"role": "assistant", "content": "También depende del modelo."},
+    {"rol": "user", "contenido": "Gracias."},
+]
+
+class TestConversacion(unittest.TestCase):
+
+    def test_entrada_es_el_historial_acumulado(self):
+        catalogo = obtener_catalogo()
+        simulacion = conversation.simular_conversacion(MENSAJES, ["GPT-4o"])["GPT-4o"]
+        textos = [texto for _, texto in conversation.normalizar_mensajes(MENSAJES)]
+        conteos = [registry.contar_tokens_modelo(texto, "GPT-4o", catalogo) for texto in textos]
+
+        self.assertEqual(len(simulacion), 2)
+        self.assertEqual(textos[3], "¿Y la energía?")
+        self.assertEqual(simulacion.tokens_entrada.tolist(), [sum(conteos[:2]), sum(conteos[:4])])
+        self.assertEqual(simulacion.tokens_salida.tolist(), [conteos[2], conteos[4]])
+        total = simulacion.total()
+        precios = catalogo.precios["GPT-4o"]
+        self.assertAlmostEqual(total.costo_entrada, (conteos[0] * 2 + conteos[1] * 2 + conteos[2] + conteos[3])
+                               / 1000 * precios["entrada"])
+        self.assertAlmostEqual(total.costo_total, float(simulacion.costo_total.sum()))
+        self.assertEqual([fila[conversation.COLUMNA_TURNO] for fila in simulacion.filas_turnos()], [1, 2])
+
+    def test_tokens_por_mensaje(self):
+        sin_formato = conversation.simular_conversacion(MENSAJES, ["Claude 3 Haiku"])["Claude 3 Haiku"]
+        con_formato = conversation.simular_conversacion(MENSAJES, ["Claude 3 Haiku"], tokens_por_mensaje=4)["Claude 3 Haiku"]
+        self.assertEqual((con_formato.tokens_entrada - sin_formato.tokens_entrada).tolist(), [8, 16])
+
+    def test_modelo_sin_precio_y_mensajes_invalidos(self):
+        self.assertIsNone(conversation.simular_conversacion(MENSAJES, ["Modelo Inexistente"])["Modelo Inexistente"])
+        with self.assertRaises(ValueError):
+            conversation.simular_conversacion([{"contenido": "sin rol"}], ["GPT-4o"])
+        vacia = conversation.simular_conversacion([], ["GPT-4o"])["GPT-4o"]
+        self.assertEqual(vacia.total().costo_total, 0)
+
+    def test_leer_mensajes(self):
+        self.assertEqual(conversation.leer_mensajes('{"messages": [{"role": "user", "content": "hola"}]}'),
+                         [{"role": "user", "content": "hola"}])
+        self.assertEqual(len(conversation.leer_mensajes('{"rol": "user"}\n{"rol": "assistant"}\n')), 2)
+        with self.assertRaises(ValueError):
+            conversation.leer_mensajes('"texto"')
+
+if __name__ == '__main__':
+    unittest.main()
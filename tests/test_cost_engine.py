@@ -0,0 +1,48 @@
+import unittest
+from types import MappingProxyType
+import numpy as np
+from calculators import cost_engine
+from calculators import token_costs
+
+precios_modelos = {
+    "GPT-4": {"entrada": 0.002, "salida": 0.008},
+    "Claude 3 Sonnet": {"entrada": 0.003, "salida": 0.015},
+    "energia": {"gpt-4": {"electricidad_por_1k_tokens": 0.25, "agua_por_1k_tokens": 0.9}},
+}
+
+class TestCostEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.matriz = cost_engine.compilar_matriz_precios(precios_modelos)
+
+    def test_compilar_ignora_secciones_que_no_son_modelos(self):
+        self.assertEqual(self.matriz.modelos, ("GPT-4", "Claude 3 Sonnet"))
+
+    def test_compilar_acepta_tarifas_de_solo_lectura(self):
+        # Las tarifas del catálogo son MappingProxyType, no dict.
+        solo_lectura = MappingProxyType({modelo: MappingProxyType(tarifas) for modelo, tarifas in precios_modelos.items()})
+        self.assertEqual(cost_engine.compilar_matriz_precios(solo_lectura).modelos, ("GPT-4", "Claude 3 Sonnet"))
+
+    def test_vectorizado_coincide_con_calcular_costo_tokens(self):
+        entrada = np.array([1000, 2000, 0])
+        salida = np.array([500, 1000, 300])
+        costos = cost_engine.calcular_costos_vectorizado(entrada, salida, self.matriz)
+        self.assertEqual(costos.costo_total.shape, (3, 2))
+        for i in range(3):
+            for j, modelo in enumerate(self.matriz.modelos):
+                esperado = token_costs.calcular_costo_tokens(entrada[i], salida[i], modelo, precios_modelos)
+                self.assertAlmostEqual(costos.costo_total[i, j], float(esperado["costo_total_USD"]), places=6)
+
+    def test_costos_por_fila_modelo_desconocido_es_nan(self):
+        costos = cost_engine.calcular_costos_por_fila([1000, 1000], [500, 500], ["GPT-4", "Modelo Inexistente"], self.matriz)
+        self.assertAlmostEqual(costos.costo_total[0], 0.006)
+        self.assertTrue(np.isnan(costos.costo_total[1]))
+
+    def test_totales_por_grupo(self):
+        etiquetas, costos = cost_engine.totales_por_grupo([1000, 1000, 2000], [0, 0, 1000], ["a", "a", "b"], self.matriz)
+        self.assertEqual(list(etiquetas), ["a", "b"])
+        self.assertAlmostEqual(costos.costo_total[0, 0], 0.004)
+        self.assertAlmostEqual(costos.costo_total[1, 1], 0.021)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from calculators import energy_estimation
+from calculators.energy_estimation import IndiceEnergia
+
+datos_energia = {
+    "gpt-4": {"electricidad_por_1k_tokens": 0.25, "agua_por_1k_tokens": 0.9},
+    "gpt-4o-mini": {"electricidad_por_1k_tokens": 0.05, "agua_por_1k_tokens": 0.2},
+    "llama": {"electricidad_por_1k_tokens": 0.1, "agua_por_1k_tokens": 0.4},
+}
+
+class TestIndiceEnergia(unittest.TestCase):
+
+    def setUp(self):
+        self.indice = IndiceEnergia(datos_energia)
+
+    def test_coincidencia_exacta_tiene_prioridad(self):
+        self.assertEqual(self.indice.factores("GPT-4o-mini"), (0.05, 0.2))
+        self.assertEqual(self.indice.factores("GPT-4"), (0.25, 0.9))
+
+    def test_subcadena_respeta_el_orden_de_la_tabla(self):
+        # "gpt-4" aparece antes que "llama" en la tabla, aunque "llama" esté antes en el nombre.
+        self.assertEqual(self.indice.factores("llama vs gpt-4 turbo"), (0.25, 0.9))
+        self.assertEqual(self.indice.factores("Llama 3.1 8B"), (0.1, 0.4))
+
+    def test_reglas_de_respaldo_y_por_defecto(self):
+        indice = IndiceEnergia({})
+        self.assertEqual(indice.factores("Claude 3 Opus"), (0.25, 0.9))
+        self.assertEqual(indice.factores("Claude 3 Sonnet"), (0.1, 0.4))
+        self.assertEqual(indice.factores("Qwen-Max"), (0.15, 0.6))
+        self.assertEqual(indice.factores("Llama 3.70B"), (0.1, 0.4))
+        # Solo los Llama de 70B, no cualquier nombre que contenga "70b".
+        self.assertEqual(indice.factores("Modelo-170B"), energy_estimation.FACTORES_POR_DEFECTO)
+        self.assertEqual(indice.factores("Modelo Desconocido"), energy_estimation.FACTORES_POR_DEFECTO)
+
+    def test_estimar_gasto_energetico_sin_coincidencia_no_falla(self):
+        electricidad, agua = energy_estimation.estimar_gasto_energetico("Modelo Desconocido", 1000, datos_energia)
+        self.assertAlmostEqual(electricidad, 0.04)
+        self.assertAlmostEqual(agua, 0.15)
+
+    def test_vectorizado_coincide_con_escalar(self):
+        modelos = ["GPT-4", "Llama 3.1 8B", "Modelo Desconocido", "GPT-4"]
+        tokens = np.array([1000, 2500, 300, 0])
+        electricidad, agua = energy_estimation.estimar_gasto_energetico_vectorizado(modelos, tokens, datos_energia)
+        for i, modelo in enumerate(modelos):
+            esperado = energy_estimation.estimar_gasto_energetico(modelo, tokens[i], datos_energia)
+            self.assertAlmostEqual(electricidad[i], esperado[0])
+            self.assertAlmostEqual(agua[i], esperado[1])
+
+if __name__ == '__main__':
+    unittest.main()
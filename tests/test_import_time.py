@@ -0,0 +1,32 @@
+import unittest
+from benchmarks import import_time
+
+SALIDA_IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |       5300 | calculators.token_costs
+import time:      5000 |       5000 |   dataclasses
+import time:        40 |         40 |     copy
+"""
+
+# Margen sobre el presupuesto ajustado: el test solo detecta regresiones grandes sin fallar por ruido.
+MARGEN_PRESUPUESTO = 2
+
+class TestImportTime(unittest.TestCase):
+
+    def test_parsear_importtime(self):
+        entradas = import_time.parsear_importtime(SALIDA_IMPORTTIME)
+        self.assertEqual(entradas, [("_io", 1, 120), ("calculators.token_costs", 0, 5300), ("dataclasses", 1, 5000),
+                                    ("copy", 2, 40)])
+        self.assertEqual(import_time.cargados(entradas, ("dataclasses", "numpy", "cop")), ["dataclasses"])
+        self.assertEqual(import_time.cargados([("numpy.linalg", 1, 10)], ("numpy",)), ["numpy"])
+
+    def test_presupuestos(self):
+        # Cada grupo se importa en un intérprete nuevo: falla si al importarse carga una dependencia pesada que
+        # solo hace falta en algunos usos, o si tarda más del doble de su presupuesto. Los presupuestos se ajustan
+        # a la velocidad de la máquina midiendo en la misma ejecución unos módulos de la biblioteca estándar.
+        for grupo, resultado in import_time.comprobar(repeticiones=2, escalar=True).items():
+            self.assertEqual(resultado["prohibidos_cargados"], [], grupo)
+            self.assertLessEqual(resultado["milisegundos"], MARGEN_PRESUPUESTO * resultado["presupuesto_ms"], grupo)
+
+if __name__ == '__main__':
+    unittest.main()
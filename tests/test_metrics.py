@@ -0,0 +1,66 @@
+import io
+import unittest
+from calculators import batch
+from src.utils import metrics
+from tests.test_batch import registros_jsonl
+
+class TestMetricas(unittest.TestCase):
+
+    def setUp(self):
+        metrics.METRICAS.reiniciar()
+
+    def tearDown(self):
+        metrics.desactivar_metricas()
+        metrics.METRICAS.reiniciar()
+
+    def test_desactivadas_no_registran_nada(self):
+        metrics.desactivar_metricas()
+        self.assertIs(metrics.medir("codificacion", modelo="gpt-4"), metrics.medir("precio"))
+        with metrics.medir("codificacion", modelo="gpt-4"):
+            pass
+        metrics.incrementar("tokens", 10, modelo="gpt-4")
+        self.assertEqual(metrics.exportar_json(), {"histogramas": [], "contadores": []})
+        self.assertIsNone(metrics.extraer_instantanea())
+
+    def test_histogramas_y_contadores_por_etiquetas(self):
+        metrics.activar_metricas()
+        for _ in range(3):
+            with metrics.medir("codificacion", unidades=2, proveedor="openai", modelo="gpt-4"):
+                pass
+        with metrics.medir("codificacion", proveedor="google", modelo="gemini"):
+            pass
+        metrics.incrementar("tokens", 7, proveedor="openai", modelo="gpt-4")
+
+        datos = {tuple(h["etiquetas"].values()): h for h in metrics.exportar_json()["histogramas"]}
+        self.assertEqual(datos[("gpt-4", "openai")]["cuenta"], 3)
+        self.assertEqual(datos[("gpt-4", "openai")]["unidades"], 6)
+        self.assertEqual(sum(datos[("gpt-4", "openai")]["cubetas"]), 3)
+        self.assertEqual(datos[("gemini", "google")]["cuenta"], 1)
+
+        texto = metrics.exportar_prometheus()
+        self.assertIn('# TYPE calculadora_operacion_segundos histogram', texto)
+        self.assertIn('calculadora_operacion_segundos_bucket{operacion="codificacion",modelo="gpt-4",proveedor="openai",le="+Inf"} 3', texto)
+        self.assertIn('calculadora_operacion_segundos_count{operacion="codificacion",modelo="gpt-4",proveedor="openai"} 3', texto)
+        self.assertIn('calculadora_tokens_total{modelo="gpt-4",proveedor="openai"} 7', texto)
+
+    def test_combinar_instantaneas(self):
+        metrics.activar_metricas()
+        with metrics.medir("precio", unidades=5, modelo="GPT-4"):
+            pass
+        instantanea = metrics.extraer_instantanea()
+        self.assertEqual(metrics.exportar_json()["histogramas"], [])
+        metrics.METRICAS.combinar(instantanea)
+        metrics.METRICAS.combinar(instantanea)
+        self.assertEqual(metrics.METRICAS.resumen()[0]["llamadas"], 2)
+        self.assertEqual(metrics.METRICAS.resumen()[0]["unidades"], 10)
+
+    def test_batch_mide_codificacion_precio_y_energia(self):
+        metrics.activar_metricas()
+        batch.ejecutar_batch(io.StringIO(registros_jsonl), io.StringIO())
+        operaciones = {(h["operacion"], h["etiquetas"].get("modelo")) for h in metrics.exportar_json()["histogramas"]}
+        self.assertIn(("codificacion", "gpt-4o"), operaciones)
+        self.assertIn(("precio", "GPT-4o"), operaciones)
+        self.assertIn(("energia", "Claude 3 Haiku"), operaciones)
+
+if __name__ == '__main__':
+    unittest.main()
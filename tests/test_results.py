@@ -0,0 +1,24 @@
+import unittest
+from calculators import token_costs
+from calculators.results import ResultadoModelo, resultados_a_dataframe
+
+class TestResultados(unittest.TestCase):
+
+    def test_costo_numerico_y_formateado_coinciden(self):
+        precios = {"GPT-4": {"entrada": 0.002, "salida": 0.008}}
+        costo = token_costs.calcular_costo_tokens_numerico(1000, 500, "GPT-4", precios)
+        self.assertAlmostEqual(costo.costo_total, 0.006)
+        self.assertEqual(costo.formatear("EUR"), token_costs.calcular_costo_tokens(1000, 500, "GPT-4", precios, "EUR"))
+        self.assertIsNone(token_costs.calcular_costo_tokens_numerico(1000, 500, "Modelo Inexistente", precios))
+
+    def test_dataframe_numerico_ordena_por_valor(self):
+        resultados = [
+            ResultadoModelo("A", 100, 50, 0.5, 0.25, 0.75),
+            ResultadoModelo("B", 10, 5, 10.0, 0.0, 10.0),
+        ]
+        df = resultados_a_dataframe(resultados)
+        self.assertEqual(df.sort_values("Costo Total (USD)")["Modelo"].tolist(), ["A", "B"])
+        self.assertEqual(resultados[1].formatear()["Costo Total (USD)"], "10.000000")
+
+if __name__ == '__main__':
+    unittest.main()
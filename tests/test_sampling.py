@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from calculators import batch
+from calculators import cli
+from calculators import sampling
+
+def registros_corpus(cantidad, semilla=0):
+    aleatorio = random.Random(semilla)
+    palabras = ["hola", "mundo", "tokens", "costo", "模型", "energía", "def", "x = 1"]
+    for i in range(cantidad):
+        largo = aleatorio.randint(1, 40)
+        yield {
+            "id": i,
+            "modelo": aleatorio.choice(["GPT-4o", "Claude 3 Haiku", "Modelo Inexistente"]),
+            "prompt": " ".join(aleatorio.choice(palabras) for _ in range(largo)),
+            "respuesta": " ".join(aleatorio.choice(palabras) for _ in range(largo // 2)),
+        }
+
+class TestMuestreo(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "corpus.jsonl")
+        self.registros = list(registros_corpus(1500))
+        with open(self.ruta, "w", encoding="utf-8") as f:
+            for registro in self.registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.write("\n")
+        with open(self.ruta, encoding="utf-8") as f:
+            self.totales = batch.ejecutar_batch(f, io.StringIO())
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def test_cada_registro_esta_en_un_solo_bloque(self):
+        for tamano in (1, 37, 1000, 10 ** 7):
+            unidades = sampling.UnidadesJsonl(self.ruta, tamano)
+            leidos = unidades.leer(range(unidades.total))
+            ids = [registro["id"] for indice in range(unidades.total) for registro in leidos[indice]]
+            with self.subTest(tamano=tamano):
+                self.assertEqual(ids, list(range(len(self.registros))))
+
+    def test_muestra_completa_es_exacta(self):
+        unidades = sampling.UnidadesJsonl(self.ruta, 4096)
+        estimacion = sampling.estimar_por_muestreo(unidades, error_objetivo=0.0, semilla=1)
+        self.assertTrue(estimacion.exacta)
+        datos = estimacion.a_dict()
+        self.assertEqual(datos["estimaciones"]["filas"]["estimacion"], self.totales.filas)
+        self.assertEqual(datos["estimaciones"]["filas_sin_precio"]["estimacion"], self.totales.filas_sin_precio)
+        self.assertEqual(datos["estimaciones"]["tokens_entrada"]["estimacion"], self.totales.tokens_entrada)
+        self.assertAlmostEqual(datos["estimaciones"]["costo_total_USD"]["estimacion"], self.totales.costo_total)
+        self.assertEqual(datos["estimaciones"]["tokens_total"]["error_estandar"], 0)
+
+    def test_intervalo_contiene_el_total_real(self):
+        unidades = sampling.UnidadesJsonl(self.ruta, 512)
+        estimacion = sampling.estimar_por_muestreo(unidades, error_objetivo=0.05, semilla=7)
+        datos = estimacion.a_dict()
+        self.assertTrue(datos["convergio"])
+        self.assertFalse(datos["exacta"])
+        self.assertLess(datos["unidades_muestreadas"], unidades.total)
+        self.assertLessEqual(datos["errores_relativos"]["tokens_total"], 0.05)
+        inferior, superior = datos["estimaciones"]["tokens_total"]["intervalo"]
+        self.assertLessEqual(inferior, self.totales.tokens_entrada + self.totales.tokens_salida)
+        self.assertGreaterEqual(superior, self.totales.tokens_entrada + self.totales.tokens_salida)
+
+    def test_limites_de_muestra(self):
+        unidades = sampling.UnidadesJsonl(self.ruta, 256)
+        estimacion = sampling.estimar_por_muestreo(unidades, error_objetivo=0.0001, semilla=1, max_unidades=40)
+        self.assertEqual(estimacion.unidades_muestreadas, 40)
+        self.assertFalse(estimacion.convergio())
+        misma = sampling.estimar_por_muestreo(unidades, error_objetivo=0.0001, semilla=1, max_unidades=40)
+        self.assertEqual(misma.a_dict()["estimaciones"], estimacion.a_dict()["estimaciones"])
+
+    def test_formatos_no_admitidos(self):
+        with self.assertRaises(ValueError):
+            sampling.abrir_unidades(self.ruta, "csv")
+        with self.assertRaises(ValueError):
+            sampling.abrir_unidades("-", "jsonl")
+
+    def test_cli_muestreo(self):
+        salida = io.StringIO()
+        with redirect_stdout(salida), redirect_stderr(io.StringIO()):
+            cli.main(["batch", self.ruta, "--muestreo", "--error-objetivo", "0.1", "--tamano-unidad", "1024",
+                      "--semilla", "3"])
+        datos = json.loads(salida.getvalue())
+        self.assertEqual(datos["metodo"], "bloques_bytes")
+        self.assertIn("costo_total_USD", datos["estimaciones"])
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+@unittest.skipIf(pa is None, "pyarrow no está instalado")
+class TestMuestreoColumnar(unittest.TestCase):
+
+    def test_grupos_de_filas_y_lotes(self):
+        registros = list(registros_corpus(100))
+        tabla = pa.Table.from_pylist(registros)
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta_parquet = os.path.join(directorio, "corpus.parquet")
+            pq.write_table(tabla, ruta_parquet, row_group_size=30)
+            ruta_arrow = os.path.join(directorio, "corpus.arrow")
+            with pa.ipc.new_file(ruta_arrow, tabla.schema) as escritor:
+                for lote in tabla.to_batches(max_chunksize=25):
+                    escritor.write_batch(lote)
+
+            for ruta, formato, unidades_esperadas in ((ruta_parquet, "parquet", 4), (ruta_arrow, "arrow", 4)):
+                unidades = sampling.abrir_unidades(ruta, formato)
+                self.assertEqual(unidades.total, unidades_esperadas)
+                leidos = unidades.leer(range(unidades.total))
+                filas = [registro for indice in range(unidades.total) for registro in leidos[indice]]
+                self.assertEqual(len(filas), 100)
+                self.assertNotIn("id", filas[0])
+                estimacion = sampling.estimar_por_muestreo(unidades, semilla=0)
+                self.assertTrue(estimacion.exacta)
+                self.assertEqual(estimacion.a_dict()["estimaciones"]["filas"]["estimacion"], 100)
+
+if __name__ == "__main__":
+    unittest.main()
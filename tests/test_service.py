@@ -0,0 +1,137 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+from calculators.service import ServicioEstimacion
+
+async def _peticion(puerto, metodo, ruta, cuerpo=b""):
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    escritor.write(
+        f"{metodo} {ruta} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode()
+        + cuerpo
+    )
+    await escritor.drain()
+    respuesta = await lector.read()
+    escritor.close()
+    cabeceras, _, cuerpo = respuesta.partition(b"\r\n\r\n")
+    estado = int(cabeceras.split(b" ", 2)[1])
+    if b"Transfer-Encoding: chunked" in cabeceras:
+        partes = []
+        while True:
+            tamano, _, cuerpo = cuerpo.partition(b"\r\n")
+            if int(tamano, 16) == 0:
+                break
+            partes.append(cuerpo[:int(tamano, 16)])
+            cuerpo = cuerpo[int(tamano, 16) + 2:]
+        cuerpo = b"".join(partes)
+    return estado, cuerpo
+
+class TestServicioEstimacion(unittest.TestCase):
+
+    def ejecutar(self, prueba, **opciones):
+        async def principal():
+            servicio = ServicioEstimacion(**opciones)
+            servidor = await servicio.iniciar("127.0.0.1", 0)
+            puerto = servidor.sockets[0].getsockname()[1]
+            try:
+                return await prueba(servicio, puerto)
+            finally:
+                servidor.close()
+                await servidor.wait_closed()
+        return asyncio.run(principal())
+
+    def test_peticiones_concurrentes_se_agrupan(self):
+        async def prueba(servicio, puerto):
+            cuerpos = [json.dumps({"id": i, "modelo": "GPT-4o", "prompt": "hola " * i, "respuesta": "ok"}).encode()
+                       for i in range(40)]
+            respuestas = await asyncio.gather(*(_peticion(puerto, "POST", "/estimar", cuerpo) for cuerpo in cuerpos))
+            return servicio, respuestas, await _peticion(puerto, "GET", "/metricas")
+
+        servicio, respuestas, (estado_metricas, metricas) = self.ejecutar(prueba, ventana_ms=50)
+        for i, (estado, cuerpo) in enumerate(respuestas):
+            self.assertEqual(estado, 200)
+            fila = json.loads(cuerpo)
+            self.assertEqual(fila["id"], i)
+            self.assertEqual(fila["Modelo"], "GPT-4o")
+        self.assertLess(servicio.agrupador.lotes, 40)
+        metricas = json.loads(metricas)
+        self.assertEqual(metricas["rutas"]["/estimar"]["peticiones"], 40)
+        self.assertIn("p99", metricas["rutas"]["/estimar"]["latencia_ms"])
+
+    def test_lote_ndjson_en_streaming(self):
+        registros = [{"id": i, "modelo": "Claude 3 Haiku", "prompt": "texto", "respuesta": "respuesta"} for i in range(25)]
+        cuerpo = "\n".join(json.dumps(registro) for registro in registros).encode()
+
+        async def prueba(servicio, puerto):
+            return await _peticion(puerto, "POST", "/estimar/lote", cuerpo)
+
+        estado, respuesta = self.ejecutar(prueba, tamano_bloque=10)
+        lineas = [json.loads(linea) for linea in respuesta.decode().splitlines()]
+        self.assertEqual(estado, 200)
+        self.assertEqual([linea["id"] for linea in lineas[:-1]], list(range(25)))
+        self.assertEqual(lineas[-1]["totales"]["filas"], 25)
+
+    def test_conversacion(self):
+        peticion = {"modelos": ["GPT-4o", "Modelo Inexistente"], "moneda": "EUR", "mensajes": [
+            {"role": "user", "content": "hola"}, {"role": "assistant", "content": "hola, ¿qué tal?"},
+            {"role": "user", "content": "bien"}, {"role": "assistant", "content": "me alegro"},
+        ]}
+
+        async def prueba(servicio, puerto):
+            return [
+                await _peticion(puerto, "POST", "/conversacion", json.dumps(peticion).encode()),
+                await _peticion(puerto, "POST", "/conversacion", b'{"mensajes": []}'),
+            ]
+
+        (estado, cuerpo), (estado_error, _) = self.ejecutar(prueba)
+        respuesta = json.loads(cuerpo)
+        self.assertEqual((estado, estado_error), (200, 400))
+        self.assertIsNone(respuesta["modelos"]["Modelo Inexistente"])
+        turnos = respuesta["modelos"]["GPT-4o"]["turnos"]
+        self.assertEqual([turno["Turno"] for turno in turnos], [1, 2])
+        self.assertGreater(turnos[1]["Tokens Entrada"], turnos[0]["Tokens Entrada"] + turnos[0]["Tokens Salida"])
+        self.assertIn("Costo Total (EUR)", respuesta["modelos"]["GPT-4o"]["total"])
+
+    def test_errores(self):
+        async def prueba(servicio, puerto):
+            return [
+                await _peticion(puerto, "POST", "/estimar", b"{no es json"),
+                await _peticion(puerto, "GET", "/estimar"),
+                await _peticion(puerto, "GET", "/otra"),
+                await _peticion(puerto, "GET", "/salud"),
+            ]
+
+        estados = [estado for estado, _ in self.ejecutar(prueba)]
+        self.assertEqual(estados, [400, 405, 404, 200])
+
+    def test_error_en_lote_cierra_el_stream_y_la_conexion(self):
+        # Sin "Connection: close": tras el error el resto del cuerpo no debe leerse como otra petición.
+        cuerpo = b'{"id": 1, "modelo": "GPT-4o", "prompt": "hola"}\n{no es json\nGET /salud HTTP/1.1\r\n\r\n'
+
+        async def prueba(servicio, puerto):
+            lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+            escritor.write(f"POST /estimar/lote HTTP/1.1\r\nContent-Length: {len(cuerpo)}\r\n\r\n".encode() + cuerpo)
+            await escritor.drain()
+            respuesta = await asyncio.wait_for(lector.read(), 5)
+            escritor.close()
+            return respuesta
+
+        respuesta = self.ejecutar(prueba, tamano_bloque=1)
+        self.assertEqual(respuesta.count(b"HTTP/1.1"), 1)
+        self.assertTrue(respuesta.endswith(b"0\r\n\r\n"))
+        self.assertIn(b'"error": "JSON inv', respuesta)
+
+    def test_excepcion_en_lote_se_informa_en_el_stream(self):
+        cuerpo = b'{"id": 1, "modelo": "GPT-4o", "prompt": "hola"}'
+
+        async def prueba(servicio, puerto):
+            return await _peticion(puerto, "POST", "/estimar/lote", cuerpo)
+
+        with mock.patch("calculators.service.enriquecer_bloque", side_effect=RuntimeError("fallo")):
+            estado, respuesta = self.ejecutar(prueba)
+        self.assertEqual(estado, 200)
+        self.assertNotIn(b"HTTP/1.1", respuesta)
+        self.assertEqual(json.loads(respuesta.decode().splitlines()[-1])["error"], "RuntimeError: fallo")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from src.utils import token_cache
+from src.utils.token_cache import CacheConteoTokens
+
+def _ruta_cache_en_hijo(_):
+    cache = token_cache.obtener_cache_tokens()
+    cache.guardar("texto del hijo", 7, "prueba", "1")
+    return cache.ruta, id(cache)
+
+class TestCacheConteoTokens(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "conteos.sqlite")
+
+    def tearDown(self):
+        token_cache.desactivar_cache_tokens()
+        self.directorio.cleanup()
+
+    def test_guarda_y_recupera_conteos_entre_instancias(self):
+        cache = CacheConteoTokens(self.ruta)
+        self.assertIsNone(cache.obtener("hola mundo", "tiktoken:cl100k_base", "0.9.0"))
+        cache.guardar("hola mundo", 3, "tiktoken:cl100k_base", "0.9.0")
+        cache.cerrar()
+
+        cache = CacheConteoTokens(self.ruta)
+        self.assertEqual(cache.obtener("hola mundo", "tiktoken:cl100k_base", "0.9.0"), 3)
+        self.assertIsNone(cache.obtener("hola mundo", "tiktoken:o200k_base", "0.9.0"))
+        estadisticas = cache.estadisticas()
+        self.assertEqual(estadisticas["aciertos"], 1)
+        self.assertEqual(estadisticas["fallos"], 1)
+        cache.cerrar()
+
+    def test_cambio_de_version_invalida_el_tokenizer(self):
+        cache = CacheConteoTokens(self.ruta)
+        cache.guardar("hola mundo", 3, "tiktoken:cl100k_base", "0.9.0")
+        cache.cerrar()
+
+        cache = CacheConteoTokens(self.ruta)
+        self.assertIsNone(cache.obtener("hola mundo", "tiktoken:cl100k_base", "1.0.0"))
+        self.assertEqual(cache.estadisticas()["invalidaciones"], 1)
+        self.assertEqual(cache.estadisticas()["entradas"], 0)
+        cache.cerrar()
+
+    def test_desaloja_al_superar_el_maximo(self):
+        cache = CacheConteoTokens(self.ruta, max_entradas=10)
+        cache.guardar_muchos([f"texto {i}" for i in range(15)], list(range(15)), "hf:ernie", "4.40.0")
+        self.assertLessEqual(cache.estadisticas()["entradas"], 10)
+        self.assertGreater(cache.estadisticas()["desalojos"], 0)
+        cache.cerrar()
+
+    def test_contar_lote_con_cache_solo_cuenta_pendientes(self):
+        token_cache.activar_cache_tokens(self.ruta)
+        contados = []
+        def contar_lote(textos):
+            contados.extend(textos)
+            return [len(texto) for texto in textos]
+        a, b, c = ("a" * token_cache.LONGITUD_MINIMA_CACHE, "b" * token_cache.LONGITUD_MINIMA_CACHE,
+                   "c" * token_cache.LONGITUD_MINIMA_CACHE)
+        self.assertEqual(token_cache.contar_lote_con_cache([a, b], "prueba", "1", contar_lote), [len(a), len(b)])
+        self.assertEqual(token_cache.contar_lote_con_cache([b, c], "prueba", "1", contar_lote), [len(b), len(c)])
+        self.assertEqual(contados, [a, b, c])
+
+    def test_contar_lote_con_cache_no_guarda_textos_cortos(self):
+        token_cache.activar_cache_tokens(self.ruta)
+        contados = []
+        def contar_lote(textos):
+            contados.extend(textos)
+            return [len(texto) for texto in textos]
+        largo = "x" * token_cache.LONGITUD_MINIMA_CACHE
+        for _ in range(2):
+            self.assertEqual(token_cache.contar_lote_con_cache(["corto", largo], "prueba", "1", contar_lote),
+                             [5, len(largo)])
+        self.assertEqual(contados, ["corto", largo, "corto"])
+        self.assertEqual(token_cache.obtener_cache_tokens().estadisticas()["entradas"], 1)
+
+    @unittest.skipUnless(hasattr(os, "register_at_fork"), "requiere fork")
+    def test_los_procesos_hijos_abren_su_propia_conexion(self):
+        cache = token_cache.activar_cache_tokens(self.ruta)
+        with multiprocessing.get_context("fork").Pool(1) as pool:
+            ruta, id_cache_hijo = pool.map(_ruta_cache_en_hijo, [0])[0]
+        self.assertEqual(ruta, self.ruta)
+        self.assertNotEqual(id_cache_hijo, id(cache))
+        self.assertEqual(cache.obtener("texto del hijo", "prueba", "1"), 7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+
+import numpy as np
+
+from benchmarks.corpus import generar_texto
+from src.utils import token_estimator
+from src.utils.token_estimator import CARACTERISTICAS, estimar_tokens, estimar_tokens_batch, extraer_caracteristicas
+
+# Margen generoso respecto al error medido en el docstring del módulo: los textos de prueba son sintéticos.
+ERROR_MAXIMO = 0.25
+# Conteos de referencia de tiktoken para `generar_texto(script, TAMANO_REFERENCIA)`, para que las pruebas de
+# precisión no dependan de poder cargar las codificaciones. `test_referencia_coincide_con_tiktoken` los vuelve
+# a comprobar cuando tiktoken y sus codificaciones están disponibles.
+TAMANO_REFERENCIA = 20000
+CONTEOS_REFERENCIA = {
+    "cl100k_base": {"en": 3725, "es": 5043, "zh": 7404, "code": 5468},
+    "o200k_base": {"en": 3590, "es": 4409, "zh": 5286, "code": 5357},
+}
+
+
+def _cargar_encoding(nombre):
+    # La codificación real de tiktoken, o None si tiktoken no está instalado o no puede cargarla (sin red).
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(nombre)
+    except Exception:
+        return None
+
+
+class TestEstimadorTokens(unittest.TestCase):
+
+    def test_texto_vacio(self):
+        self.assertEqual(estimar_tokens(""), 0)
+        self.assertEqual(estimar_tokens_batch(["", "hola"]).tolist()[0], 0)
+
+    def test_cerca_del_tokenizer_real(self):
+        for encoding, conteos in CONTEOS_REFERENCIA.items():
+            for script, real in conteos.items():
+                estimado = estimar_tokens(generar_texto(script, TAMANO_REFERENCIA), encoding)
+                with self.subTest(encoding=encoding, script=script):
+                    self.assertLess(abs(estimado - real) / real, ERROR_MAXIMO)
+
+    def test_referencia_coincide_con_tiktoken(self):
+        for encoding, conteos in CONTEOS_REFERENCIA.items():
+            tokenizer = _cargar_encoding(encoding)
+            if tokenizer is None:
+                self.skipTest(f"No se puede cargar la codificación de referencia {encoding}")
+            for script, real in conteos.items():
+                with self.subTest(encoding=encoding, script=script):
+                    self.assertEqual(len(tokenizer.encode_ordinary(generar_texto(script, TAMANO_REFERENCIA))), real)
+
+    def test_chino_no_se_subestima_como_con_palabras(self):
+        texto = generar_texto("zh", TAMANO_REFERENCIA)
+        real = CONTEOS_REFERENCIA["cl100k_base"]["zh"]
+        self.assertLess(len(texto.split()) * 0.75, real * 0.1)
+        self.assertGreater(estimar_tokens(texto, "cl100k_base"), real * (1 - ERROR_MAXIMO))
+
+    def test_fragmentos_no_cambian_las_caracteristicas(self):
+        texto = generar_texto("es", 3000) + "  \n\n  " + generar_texto("zh", 3000) + " 😀 (x) => x ** 2"
+        completo = extraer_caracteristicas(texto)
+        for tamano in (1, 7, 100, 1001):
+            with self.subTest(tamano=tamano):
+                np.testing.assert_array_equal(extraer_caracteristicas(texto, tamano), completo)
+
+    def test_caracteristicas(self):
+        caracteristicas = dict(zip(CARACTERISTICAS, extraer_caracteristicas("Año 2024:\n  北京 한국 ひら Привет!")))
+        self.assertEqual(caracteristicas["palabras"], 1)
+        self.assertEqual(caracteristicas["letras_extendidas"], 1)
+        self.assertEqual(caracteristicas["digitos"], 4)
+        self.assertEqual(caracteristicas["han"], 2)
+        self.assertEqual(caracteristicas["hangul"], 2)
+        self.assertEqual(caracteristicas["cjk_otros"], 2)
+        self.assertEqual(caracteristicas["otra_escritura"], 6)
+        self.assertEqual(caracteristicas["saltos_linea"], 1)
+        self.assertEqual(caracteristicas["espacios_extra"], 2)
+
+    def test_batch_igual_que_individual(self):
+        textos = ["hola mundo", "", "敏捷的棕色狐狸", "def f(x):\n    return x\n"]
+        esperado = [estimar_tokens(texto, "google") for texto in textos]
+        self.assertEqual(estimar_tokens_batch(iter(textos), "google").tolist(), esperado)
+
+    def test_perfiles_de_proveedor(self):
+        texto = "大型语言模型按照读取和生成的词元数量计费。"
+        for proveedor in token_estimator.PERFILES_PROVEEDOR:
+            self.assertGreater(estimar_tokens(texto, proveedor), 0)
+        # ERNIE (WordPiece) cuenta al menos un token por carácter chino.
+        self.assertGreaterEqual(estimar_tokens(texto, "baidu"), len(texto))
+        with self.assertRaises(KeyError):
+            estimar_tokens(texto, "proveedor-inexistente")
+
+    def test_estimacion_incremental_por_segmentos(self):
+        from src.utils.tokenizers import ConteoIncremental
+        conteo = ConteoIncremental(extraer_caracteristicas, tamano=200)
+        texto = generar_texto("es", 5000) + "\n\n" + generar_texto("zh", 2000)
+        for version in (texto, texto[:3000] + " 😀 (x) " + texto[3010:], "a" + texto):
+            with self.subTest(longitud=len(version)):
+                self.assertEqual(token_estimator.estimar_desde_caracteristicas(conteo.actualizar(version), "google"),
+                                 estimar_tokens(version, "google"))
+
+    def test_calibrar_recupera_coeficientes(self):
+        textos = [generar_texto(script, tamano, semilla=semilla) for script in ("en", "zh", "code")
+                  for tamano in (500, 2000) for semilla in range(3)]
+        coeficientes = token_estimator.coeficientes_perfil("o200k_base")
+        conteos = [float(extraer_caracteristicas(texto) @ coeficientes) for texto in textos]
+        calibrados = token_estimator.calibrar(textos, conteos)
+        estimados = [sum(calibrados[nombre] * valor for nombre, valor in zip(CARACTERISTICAS, extraer_caracteristicas(texto)))
+                     for texto in textos]
+        np.testing.assert_allclose(estimados, conteos, rtol=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from src.utils.tokenizer_pool import POOL, PoolTokenizers, ejecutar_precarga, ruta_local_tokenizer
+
+class TestPoolTokenizers(unittest.TestCase):
+
+    def test_reutiliza_tokenizer_por_clave(self):
+        pool = PoolTokenizers(presupuesto_mb=100)
+        cargas = []
+        def cargador():
+            cargas.append(1)
+            return object()
+        primero = pool.obtener(("hf", "nghuyong/ernie-3.0-base-zh"), cargador, peso_mb=10)
+        segundo = pool.obtener(("hf", "nghuyong/ernie-3.0-base-zh"), cargador, peso_mb=10)
+        self.assertIs(primero, segundo)
+        self.assertEqual(len(cargas), 1)
+        estadisticas = pool.estadisticas()
+        self.assertEqual(estadisticas["aciertos"], 1)
+        self.assertEqual(estadisticas["fallos"], 1)
+
+    def test_desaloja_el_menos_usado_al_superar_presupuesto(self):
+        pool = PoolTokenizers(presupuesto_mb=25)
+        pool.obtener(("tiktoken", "a"), object, peso_mb=10)
+        pool.obtener(("tiktoken", "b"), object, peso_mb=10)
+        pool.obtener(("tiktoken", "a"), object, peso_mb=10)  # "a" pasa a ser el más reciente
+        pool.obtener(("tiktoken", "c"), object, peso_mb=10)
+        self.assertTrue(pool.contiene(("tiktoken", "a")))
+        self.assertFalse(pool.contiene(("tiktoken", "b")))
+        self.assertTrue(pool.contiene(("tiktoken", "c")))
+        self.assertEqual(pool.estadisticas()["desalojos"], 1)
+
+    def test_error_de_carga_no_se_guarda(self):
+        pool = PoolTokenizers()
+        def cargador():
+            raise ValueError("Unknown encoding")
+        with self.assertRaises(ValueError):
+            pool.obtener(("tiktoken", "utf-8"), cargador)
+        self.assertFalse(pool.contiene(("tiktoken", "utf-8")))
+
+    def test_carga_concurrente_una_sola_vez(self):
+        pool = PoolTokenizers()
+        cargas = []
+        def cargador():
+            cargas.append(1)
+            time.sleep(0.05)
+            return object()
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(pool.obtener(("qwen", "QwenTokenizer"), cargador)))
+                 for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(cargas), 1)
+        self.assertEqual(len({id(r) for r in resultados}), 1)
+
+    def test_hilo_que_llega_al_terminar_la_carga_no_vuelve_a_cargar(self):
+        pool = PoolTokenizers()
+        cargas = []
+        def cargador():
+            cargas.append(1)
+            time.sleep(0.02)
+            return object()
+        cargado = threading.Event()
+
+        class PesosLentos(dict):
+            # Se consulta entre la carga y el guardado: ahí se lanza el segundo hilo.
+            def get(self, *args):
+                cargado.set()
+                time.sleep(0.1)
+                return super().get(*args)
+
+        resultados = []
+        with mock.patch("src.utils.tokenizer_pool.PESO_POR_TIPO_MB", PesosLentos()):
+            primero = threading.Thread(target=lambda: resultados.append(pool.obtener(("qwen", "QwenTokenizer"), cargador)))
+            primero.start()
+            cargado.wait(5)
+            segundo = threading.Thread(target=lambda: resultados.append(pool.obtener(("qwen", "QwenTokenizer"), cargador)))
+            segundo.start()
+            primero.join()
+            segundo.join()
+        self.assertEqual(len(cargas), 1)
+        self.assertEqual(len({id(r) for r in resultados}), 1)
+
+    def test_tras_una_carga_fallida_no_hay_dos_cargas_a_la_vez(self):
+        pool = PoolTokenizers()
+        activas, maximo, llamadas = [0], [0], []
+        candado = threading.Lock()
+        def cargador():
+            with candado:
+                llamadas.append(1)
+                activas[0] += 1
+                maximo[0] = max(maximo[0], activas[0])
+                falla = len(llamadas) == 1
+            try:
+                time.sleep(0.05 if falla else 0.1)
+                if falla:
+                    raise ValueError("fallo transitorio")
+                return object()
+            finally:
+                with candado:
+                    activas[0] -= 1
+
+        def obtener():
+            try:
+                pool.obtener(("qwen", "QwenTokenizer"), cargador)
+            except ValueError:
+                pass
+
+        # El segundo hilo espera la carga que falla; el tercero llega cuando ya falló y el segundo está cargando.
+        hilos = [threading.Thread(target=obtener) for _ in range(3)]
+        hilos[0].start()
+        time.sleep(0.01)
+        hilos[1].start()
+        time.sleep(0.07)
+        hilos[2].start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(maximo[0], 1)
+        self.assertTrue(pool.contiene(("qwen", "QwenTokenizer")))
+
+class TestCargaDiferida(unittest.TestCase):
+
+    def test_importar_analizadores_hf_no_carga_tokenizers(self):
+        from src.analyzers import baidu_analyzer, mistral_analyzer  # noqa: F401
+        for nombre in list(baidu_analyzer.ERNIE_TOKENIZER_MAPPING.values()) + list(mistral_analyzer.MISTRAL_TOKENIZER_MAPPING.values()):
+            self.assertFalse(POOL.contiene(("hf", nombre)))
+
+    def test_ruta_local_tokenizer(self):
+        with mock.patch.dict(os.environ, {"CALCULADORA_TOKENIZERS_DIR": "/modelos"}):
+            self.assertEqual(ruta_local_tokenizer("nghuyong/ernie-3.0-base-zh"),
+                             os.path.join("/modelos", "nghuyong", "ernie-3.0-base-zh"))
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(ruta_local_tokenizer("nghuyong/ernie-3.0-base-zh"))
+
+    def test_precarga_en_segundo_plano(self):
+        cargados = []
+        hilo = ejecutar_precarga(lambda: cargados.append(1))
+        hilo.join(timeout=5)
+        self.assertEqual(cargados, [1])
+        self.assertIsNone(ejecutar_precarga(lambda: cargados.append(2), en_segundo_plano=False))
+        self.assertEqual(cargados, [1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from src.utils import tokenizers
 
@@ -39,5 +41,127 @@ class TestTokenizers(unittest.TestCase):
         self.assertIsInstance(tokens, int)
         self.assertGreater(tokens, 0)
 
+    def test_contar_tokens_batch_coincide_con_conteo_individual(self):
+        textos = ["Este es un texto de prueba.", "", "Otro texto, un poco más largo que el anterior.", "中国的首都是北京。"]
+        conteos = tokenizers.contar_tokens_batch(iter(textos), "gpt-4")
+        self.assertEqual(list(conteos), [tokenizers.contar_tokens(texto, "gpt-4") for texto in textos])
+
+    def test_contar_tokens_batch_modelo_no_existente(self):
+        self.assertIsNone(tokenizers.contar_tokens_batch(["hola"], "modelo-que-no-existe"))
+
+    def test_contar_tokens_funcion_batch(self):
+        conteos = tokenizers.contar_tokens_funcion_batch(lambda texto: len(texto.split()), ["a b", "c", ""])
+        self.assertEqual(list(conteos), [2, 1, 0])
+
+    def test_contar_tokens_por_fragmentos_es_exacto(self):
+        from src.utils.tokenizer_pool import obtener_encoding
+        encoding = obtener_encoding("cl100k_base")
+        texto = "Hola mundo!\n\nI'm   testing   123456 tokens.\n中国的首都是北京。 (fin) " * 50
+        self.assertEqual(tokenizers.contar_tokens_encoding(encoding, texto, tamano=37),
+                         len(encoding.encode_ordinary(texto)))
+
+    def test_conteo_hf_por_fragmentos_es_aproximado(self):
+        class TokenizerSentencepiece:
+            # Como sentencepiece: antepone "▁" al texto, así que un texto que empieza por espacio cuenta uno más.
+            name_or_path = "prueba-sentencepiece"
+
+            def num_special_tokens_to_add(self):
+                return 1
+
+            def __len__(self):
+                return 1000
+
+            def encode(self, texto, add_special_tokens=True):
+                return ["<s>"] * add_special_tokens + ["▁"] * texto.startswith(" ") + texto.split()
+
+        tokenizer = TokenizerSentencepiece()
+        texto = "uno dos tres cuatro " * 20
+        exacto = len(tokenizer.encode(texto))
+        # Hasta `tamano` caracteres el texto se codifica entero.
+        self.assertEqual(tokenizers.contar_tokens_hf(tokenizer, texto, tamano=len(texto)), exacto)
+        # Por fragmentos se desvía como mucho un token por fragmento.
+        fragmentos = len(list(tokenizers.iterar_fragmentos_seguros(texto, 50)))
+        self.assertLessEqual(abs(tokenizers.contar_tokens_hf(tokenizer, texto, tamano=50) - exacto), fragmentos)
+
+    def test_version_de_la_cache_depende_de_los_archivos_del_tokenizer(self):
+        from src.utils.tokenizer_pool import obtener_encoding
+        encoding = obtener_encoding("cl100k_base")
+        self.assertTrue(tokenizers.identidad_encoding(encoding)[1].endswith(f":{encoding.n_vocab}"))
+
+        class TokenizerLocal:
+            def __init__(self, ruta):
+                self.name_or_path = ruta
+
+            def __len__(self):
+                return 1000
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            with open(os.path.join(carpeta, "tokenizer.json"), "w") as f:
+                f.write('{"vocab": 1}')
+            identidad, version = tokenizers.identidad_tokenizer_hf(TokenizerLocal(carpeta))
+            # Mismo nombre (la carpeta de CALCULADORA_TOKENIZERS_DIR), otros archivos: otra versión.
+            with open(os.path.join(carpeta, "tokenizer.json"), "w") as f:
+                f.write('{"vocab": 2}')
+            identidad_nueva, version_nueva = tokenizers.identidad_tokenizer_hf(TokenizerLocal(carpeta))
+        self.assertEqual(identidad, identidad_nueva)
+        self.assertNotEqual(version, version_nueva)
+
+    def test_fragmentos_seguros_reconstruyen_el_texto(self):
+        texto = "uno  dos\ntres!\n cuatro" * 20
+        fragmentos = list(tokenizers.iterar_fragmentos_seguros(texto, tamano=10))
+        self.assertGreater(len(fragmentos), 1)
+        self.assertEqual("".join(fragmentos), texto)
+        self.assertEqual(tokenizers.contar_palabras(texto, tamano=10), len(texto.split()))
+
+    def test_contar_tokens_archivo_por_memory_map(self):
+        import os
+        import pathlib
+        import tempfile
+        from src.utils.tokenizer_pool import obtener_encoding
+        encoding = obtener_encoding("cl100k_base")
+        # Caracteres de 2, 3 y 4 bytes para que las ventanas de bytes los corten por la mitad.
+        texto = "Año ñandú 中国的首都是北京。 😀🚀 x=1\n\n  fin. " * 40
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "texto.txt")
+            with open(ruta, "w", encoding="utf-8", newline="") as f:
+                f.write(texto)
+            for tamano in (1, 5, 64, 4096):
+                with self.subTest(tamano=tamano):
+                    self.assertEqual("".join(tokenizers.iterar_fragmentos_archivo(ruta, tamano)), texto)
+                    self.assertEqual(tokenizers.contar_tokens_encoding_archivo(encoding, ruta, tamano=tamano),
+                                     len(encoding.encode_ordinary(texto)))
+            self.assertEqual(tokenizers.contar_tokens(pathlib.Path(ruta), "gpt-4"),
+                             tokenizers.contar_tokens(texto, "gpt-4"))
+
+            vacio = os.path.join(directorio, "vacio.txt")
+            open(vacio, "w").close()
+            self.assertEqual(tokenizers.contar_tokens(pathlib.Path(vacio), "gpt-4"), 0)
+
+    def test_conteo_incremental_igual_al_conteo_completo(self):
+        import random
+        from src.utils.tokenizer_pool import obtener_encoding
+        encoding = obtener_encoding("cl100k_base")
+        conteo = tokenizers.ConteoIncremental(lambda texto: len(encoding.encode_ordinary(texto)), tamano=16)
+        aleatorio = random.Random(0)
+        piezas = [" ", "  ", "\n", "\n\n", "hola", "!", "中国", "12", "😀", " x", ".\n", "é"]
+        texto = ""
+        for _ in range(300):
+            inicio = aleatorio.randint(0, len(texto))
+            fin = aleatorio.randint(inicio, min(len(texto), inicio + 30))
+            texto = texto[:inicio] + "".join(aleatorio.choice(piezas) for _ in range(aleatorio.randint(0, 8))) + texto[fin:]
+            self.assertEqual(conteo.actualizar(texto), len(encoding.encode_ordinary(texto)))
+
+    def test_conteo_incremental_solo_recuenta_lo_editado(self):
+        conteo = tokenizers.ConteoIncremental(lambda texto: len(texto.split()), tamano=100)
+        texto = "una frase con varias palabras. " * 1000
+        self.assertEqual(conteo.actualizar(texto), 5000)
+        self.assertEqual(conteo.recontados, len(texto))
+        editado = texto[:15000] + "otra" + texto[15003:]
+        self.assertEqual(conteo.actualizar(editado), 5000)
+        self.assertLessEqual(conteo.recontados, 300)
+        self.assertEqual(conteo.actualizar(editado), 5000)
+        self.assertEqual(conteo.recontados, 0)
+        self.assertEqual(conteo.actualizar(""), 0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.utils import visualizations
+from calculators.catalog import obtener_catalogo
+
+COSTO = "Costo Total (USD)"
+
+
+class TestAgregacion(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        filas = 10_000
+        modelos = np.array(["GPT-4o", "Claude 3 Haiku"] + [f"modelo-{i}" for i in range(10)])
+        self.df = pd.DataFrame({
+            "Modelo": modelos[rng.integers(0, len(modelos), filas)],
+            "Tokens Entrada": rng.integers(1, 1000, filas),
+            COSTO: rng.random(filas),
+            # Marcas de tiempo en segundos a lo largo de unos 1000 días.
+            "timestamp": rng.integers(1_600_000_000, 1_600_000_000 + 1000 * 86400, filas),
+        })
+
+    def test_por_modelo_conserva_los_totales(self):
+        agregado = visualizations.agregar_resultados(self.df, [COSTO, "Tokens Entrada"])
+        self.assertEqual(len(agregado), self.df["Modelo"].nunique())
+        self.assertAlmostEqual(agregado[COSTO].sum(), self.df[COSTO].sum())
+        self.assertEqual(agregado["Tokens Entrada"].sum(), self.df["Tokens Entrada"].sum())
+
+    def test_categorias_menores_en_otros(self):
+        agregado = visualizations.agregar_resultados(self.df, [COSTO], max_categorias=5)
+        self.assertEqual(len(agregado), 5)
+        self.assertEqual(agregado["Modelo"].iloc[-1], visualizations.CATEGORIA_OTROS)
+        self.assertAlmostEqual(agregado[COSTO].sum(), self.df[COSTO].sum())
+
+    def test_por_proveedor(self):
+        agregado = visualizations.agregar_resultados(self.df, [COSTO], "Proveedor", catalogo=obtener_catalogo())
+        self.assertEqual(set(agregado["Proveedor"]), {"openai", "anthropic", "desconocido"})
+
+    def test_por_dia_limita_los_puntos(self):
+        agregado = visualizations.agregar_resultados(self.df, [COSTO], "Día", max_puntos=100)
+        self.assertLessEqual(len(agregado), 100)
+        self.assertTrue(agregado["Día"].is_monotonic_increasing)
+        self.assertAlmostEqual(agregado[COSTO].sum(), self.df[COSTO].sum())
+        # Con una serie por modelo el límite se reparte entre ellas.
+        por_modelo = visualizations.agregar_resultados(self.df, [COSTO], "Día", por_modelo=True, max_puntos=120,
+                                                       max_categorias=4)
+        self.assertEqual(por_modelo["Modelo"].nunique(), 4)
+        self.assertLessEqual(len(por_modelo), 120)
+
+    def test_agrupacion_no_valida(self):
+        with self.assertRaises(ValueError):
+            visualizations.agregar_resultados(self.df, [COSTO], "Semana")
+        with self.assertRaises(ValueError):
+            visualizations.agregar_resultados(self.df.drop(columns="timestamp"), [COSTO], "Día")
+
+    def test_histograma(self):
+        cubetas = visualizations.histograma(np.append(self.df[COSTO].to_numpy(), np.nan), cubetas=20)
+        self.assertEqual(len(cubetas), 20)
+        self.assertEqual(cubetas["Filas"].sum(), len(self.df))
+        self.assertTrue(visualizations.histograma([]).empty)
+
+
+if __name__ == '__main__':
+    unittest.main()